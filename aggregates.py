@@ -0,0 +1,216 @@
+import heapq
+import threading
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter, defaultdict
+from datetime import date, datetime, time, timedelta
+from operator import itemgetter
+from typing import Callable, Dict, List, Optional, Tuple
+from models import InventoryItem, Sale, Purchase, PayrollEntry
+from listeners import DatabaseListener
+
+MonthKey = Tuple[int, int]
+
+def month_key(moment: datetime) -> MonthKey:
+    return (moment.year, moment.month)
+
+def is_low_stock(item: InventoryItem) -> bool:
+    return item.quantity_in_stock <= item.reorder_level
+
+def split_days(start: datetime, end: datetime) -> Tuple[Optional[date], Optional[date], List[Tuple[datetime, datetime]]]:
+    """Split [start, end] into whole calendar days and the partial ranges at either end.
+    
+    Returns (first whole day, last whole day, partial ranges); the days are
+    None when no day is fully covered.
+    """
+    first_day = start.date() if start.time() == time.min else start.date() + timedelta(days=1)
+    last_day = end.date() if end.time() == time.max else end.date() - timedelta(days=1)
+    if first_day > last_day:
+        return None, None, [(start, end)] if start <= end else []
+    
+    partial = []
+    first_moment = datetime.combine(first_day, time.min)
+    if start < first_moment:
+        partial.append((start, first_moment - timedelta(microseconds=1)))
+    after_last = datetime.combine(last_day + timedelta(days=1), time.min)
+    if end >= after_last:
+        partial.append((after_last, end))
+    return first_day, last_day, partial
+
+class RunningAggregates(DatabaseListener):
+    """Dashboard figures maintained in O(1) per mutation.
+    
+    Revenue and expenses are bucketed by calendar month of ``created_at``;
+    inventory valuation, the low-stock count and the set of employees on
+    payroll are running totals over the current state.
+    """
+    
+    def __init__(self):
+        self.monthly_sales: Dict[MonthKey, int] = defaultdict(int)
+        self.monthly_revenue: Dict[MonthKey, float] = defaultdict(float)
+        self.monthly_expense_entries: Dict[MonthKey, int] = defaultdict(int)
+        self.monthly_expenses: Dict[MonthKey, float] = defaultdict(float)
+        
+        self.inventory_items = 0
+        self.inventory_value = 0.0
+        self.low_stock_count = 0
+        self.employee_refcount: Counter = Counter()
+    
+    # Monthly revenue / expense buckets
+    
+    def _add_revenue(self, moment: datetime, amount: float, sign: int):
+        key = month_key(moment)
+        self.monthly_sales[key] += sign
+        self.monthly_revenue[key] += sign * amount
+        if self.monthly_sales[key] == 0:
+            # Reset instead of keeping float residue from add/subtract pairs
+            del self.monthly_sales[key]
+            del self.monthly_revenue[key]
+    
+    def _add_expense(self, moment: datetime, amount: float, sign: int):
+        key = month_key(moment)
+        self.monthly_expense_entries[key] += sign
+        self.monthly_expenses[key] += sign * amount
+        if self.monthly_expense_entries[key] == 0:
+            del self.monthly_expense_entries[key]
+            del self.monthly_expenses[key]
+    
+    def sale_added(self, sale: Sale):
+        self._add_revenue(sale.created_at, sale.total_amount, 1)
+    
+    def sale_deleted(self, sale: Sale):
+        self._add_revenue(sale.created_at, sale.total_amount, -1)
+    
+    def purchase_added(self, purchase: Purchase):
+        self._add_expense(purchase.created_at, purchase.total_amount, 1)
+    
+    def purchase_deleted(self, purchase: Purchase):
+        self._add_expense(purchase.created_at, purchase.total_amount, -1)
+    
+    def payroll_saved(self, old: Optional[PayrollEntry], new: PayrollEntry):
+        if old is not None:
+            self.payroll_deleted(old)
+        self._add_expense(new.created_at, new.gross_pay, 1)
+        self.employee_refcount[new.employee_id] += 1
+    
+    def payroll_deleted(self, entry: PayrollEntry):
+        self._add_expense(entry.created_at, entry.gross_pay, -1)
+        self.employee_refcount[entry.employee_id] -= 1
+        if self.employee_refcount[entry.employee_id] <= 0:
+            del self.employee_refcount[entry.employee_id]
+    
+    # Inventory valuation and low stock
+    
+    def _add_item(self, item: InventoryItem, sign: int):
+        self.inventory_items += sign
+        self.inventory_value += sign * item.quantity_in_stock * item.unit_price
+        if is_low_stock(item):
+            self.low_stock_count += sign
+        if self.inventory_items == 0:
+            self.inventory_value = 0.0
+    
+    def inventory_saved(self, old: Optional[InventoryItem], new: InventoryItem):
+        if old is not None:
+            self._add_item(old, -1)
+        self._add_item(new, 1)
+    
+    def inventory_deleted(self, item: InventoryItem):
+        self._add_item(item, -1)
+    
+    def dashboard_stats(self, now: datetime) -> dict:
+        """Dashboard payload for the calendar month containing ``now``"""
+        key = month_key(now)
+        monthly_revenue = self.monthly_revenue.get(key, 0)
+        monthly_expenses = self.monthly_expenses.get(key, 0)
+        
+        return {
+            "monthly_sales": self.monthly_sales.get(key, 0),
+            "monthly_revenue": monthly_revenue,
+            "monthly_expenses": monthly_expenses,
+            "monthly_profit": monthly_revenue - monthly_expenses,
+            "total_inventory_items": self.inventory_items,
+            "total_inventory_value": self.inventory_value,
+            "low_stock_items": self.low_stock_count,
+            "total_employees": len(self.employee_refcount)
+        }
+
+
+class TopSellers(DatabaseListener):
+    """Quantity sold per inventory item, bucketed by calendar day of the sale.
+    
+    Keyed by item id, so renaming an item does not split its sales. A top-N
+    query merges the buckets of the whole days in range and counts the
+    partial days at either end from the sales themselves, so it costs days
+    plus distinct items rather than line items.
+    """
+    
+    def __init__(self):
+        self.daily: Dict[date, Counter] = {}
+        self.days: List[date] = []
+        # Latest name each item was sold under, for items since deleted
+        self.item_names: Dict[int, str] = {}
+        self._lock = threading.Lock()
+    
+    def _add_sale(self, sale: Sale, sign: int):
+        day = sale.created_at.date()
+        with self._lock:
+            bucket = self.daily.get(day)
+            if bucket is None:
+                bucket = self.daily[day] = Counter()
+                insort(self.days, day)
+            for item in sale.items:
+                bucket[item.inventory_item_id] += sign * item.quantity
+                if bucket[item.inventory_item_id] == 0:
+                    del bucket[item.inventory_item_id]
+            if not bucket:
+                del self.daily[day]
+                del self.days[bisect_left(self.days, day)]
+    
+    def sale_added(self, sale: Sale):
+        self._add_sale(sale, 1)
+        for item in sale.items:
+            self.item_names[item.inventory_item_id] = item.inventory_item_name
+    
+    def sale_deleted(self, sale: Sale):
+        self._add_sale(sale, -1)
+    
+    def top(self, start: datetime, end: datetime, limit: int,
+            count_range: Callable[[datetime, datetime], Dict[int, int]]) -> List[Tuple[int, int]]:
+        """(item id, quantity) pairs sold within [start, end], best sellers first.
+        
+        ``count_range`` returns the quantity per item id for a partial day.
+        """
+        first_day, last_day, partial = split_days(start, end)
+        sold: Counter = Counter()
+        if first_day is not None:
+            with self._lock:
+                for day in self.days[bisect_left(self.days, first_day):bisect_right(self.days, last_day)]:
+                    sold.update(self.daily[day])
+        for range_start, range_end in partial:
+            sold.update(count_range(range_start, range_end))
+        return heapq.nlargest(limit, sold.items(), key=itemgetter(1))
+
+
+class LowStockIndex(DatabaseListener):
+    """Inventory items at or below their reorder level, kept current as stock changes.
+    
+    Every stock change (sales, purchases, edits) is saved through
+    ``inventory_saved``, so listing low-stock items costs their number
+    rather than a scan of the whole inventory.
+    """
+    
+    def __init__(self):
+        self.items: Dict[int, InventoryItem] = {}
+    
+    def inventory_saved(self, old: Optional[InventoryItem], new: InventoryItem):
+        if is_low_stock(new):
+            self.items[new.id] = new
+        else:
+            self.items.pop(new.id, None)
+    
+    def inventory_deleted(self, item: InventoryItem):
+        self.items.pop(item.id, None)
+    
+    def low_stock_items(self) -> List[InventoryItem]:
+        """Low-stock items by id"""
+        items = self.items.copy()
+        return [items[item_id] for item_id in sorted(items)]
@@ -1,16 +1,33 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Dict, Optional, Set, Tuple
 import jwt
 from passlib.context import CryptContext
 from fastapi import HTTPException, status
+from models import User
+from listeners import DatabaseListener
 
 # Configuration
 SECRET_KEY = "your-secret-key-here-change-in-production"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+TOKEN_CACHE_SIZE = 10000
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_CONCURRENCY = int(os.environ.get("PASSWORD_HASH_CONCURRENCY", "4"))
 
 # Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+# bcrypt releases the GIL, so a small dedicated pool runs hashes in parallel
+# without blocking the event loop or starving FastAPI's shared threadpool
+password_executor = ThreadPoolExecutor(
+    max_workers=PASSWORD_HASH_CONCURRENCY,
+    thread_name_prefix="password-hash"
+)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash"""
@@ -20,6 +37,16 @@ def get_password_hash(password: str) -> str:
     """Hash a password"""
     return pwd_context.hash(password)
 
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password on the password hashing pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(password_executor, verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    """Hash a password on the password hashing pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(password_executor, get_password_hash, password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create a JWT access token"""
     to_encode = data.copy()
@@ -34,6 +61,10 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
 
 def decode_access_token(token: str):
     """Decode and validate a JWT access token"""
+    return decode_access_token_payload(token)["sub"]
+
+def decode_access_token_payload(token: str) -> dict:
+    """Decode and validate a JWT access token, returning all of its claims"""
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
@@ -43,10 +74,71 @@ def decode_access_token(token: str):
                 detail="Could not validate credentials",
                 headers={"WWW-Authenticate": "Bearer"},
             )
-        return username
+        return payload
     except jwt.PyJWTError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
+
+class TokenCache(DatabaseListener):
+    """Bounded LRU cache of verified access tokens and the users they resolve to.
+    
+    Entries live until the token's ``exp`` claim and are dropped as soon as the
+    database reports a change to the user, e.g. activation or deactivation.
+    """
+    
+    def __init__(self, max_entries: int = TOKEN_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, User]]" = OrderedDict()
+        self._tokens_by_username: Dict[str, Set[str]] = {}
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def get(self, token: str) -> Optional[User]:
+        entry = self._entries.get(token)
+        if entry is None:
+            return None
+        
+        expires_at, user = entry
+        if expires_at <= time.time():
+            self._evict(token)
+            return None
+        
+        self._entries.move_to_end(token)
+        return user
+    
+    def put(self, token: str, expires_at: float, user: User):
+        if token in self._entries:
+            self._evict(token)
+        self._entries[token] = (expires_at, user)
+        self._tokens_by_username.setdefault(user.username, set()).add(token)
+        
+        while len(self._entries) > self.max_entries:
+            self._evict(next(iter(self._entries)))
+    
+    def invalidate_user(self, username: str):
+        for token in self._tokens_by_username.pop(username, set()):
+            self._entries.pop(token, None)
+    
+    def clear(self):
+        self._entries.clear()
+        self._tokens_by_username.clear()
+    
+    def _evict(self, token: str):
+        _, user = self._entries.pop(token)
+        tokens = self._tokens_by_username.get(user.username)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens_by_username[user.username]
+    
+    def user_saved(self, old: Optional[User], new: User):
+        self.invalidate_user(new.username)
+    
+    def table_changed(self, table: str):
+        # Another worker changed users; we cannot tell whose tokens are stale
+        if table == "users":
+            self.clear()
@@ -0,0 +1,141 @@
+import csv
+import io
+import json
+import tempfile
+from collections import defaultdict
+from typing import Any, AsyncIterator, BinaryIO, Dict, Iterator, List, Sequence, Tuple
+from fastapi import HTTPException, Request, status
+from pydantic import TypeAdapter, ValidationError
+
+NDJSON_MEDIA_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+
+# Yielded in place of an NDJSON line that is not valid JSON
+INVALID_JSON = object()
+
+# Uploads larger than this are spooled to a temporary file rather than held in memory
+CSV_SPOOL_BYTES = 1024 * 1024
+
+async def read_batch_rows(request: Request) -> AsyncIterator[Tuple[int, Any]]:
+    """Yield (index, decoded row) from a JSON array body or an NDJSON stream.
+    
+    NDJSON bodies are decoded line by line as they arrive; a line that is not
+    valid JSON is yielded as ``INVALID_JSON`` so only that row is rejected.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    
+    if content_type in NDJSON_MEDIA_TYPES:
+        index = 0
+        buffer = b""
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if line.strip():
+                    yield index, decode_line(line)
+                    index += 1
+        if buffer.strip():
+            yield index, decode_line(buffer)
+        return
+    
+    try:
+        rows = await request.json()
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Request body must be a JSON array or NDJSON"
+        )
+    if not isinstance(rows, list):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Request body must be a JSON array or NDJSON"
+        )
+    for index, row in enumerate(rows):
+        yield index, row
+
+def decode_line(line: bytes) -> Any:
+    try:
+        return json.loads(line)
+    except ValueError:
+        return INVALID_JSON
+
+def row_error(payload: Any, error: ValidationError = None) -> str:
+    """Single-line description of why a batch row was rejected"""
+    if payload is INVALID_JSON:
+        return "Invalid JSON"
+    return validation_message(error)
+
+def validation_message(error: ValidationError) -> str:
+    """Flatten a Pydantic error into a single line for per-row reports"""
+    return "; ".join(
+        f"{'.'.join(str(part) for part in detail['loc']) or 'row'}: {detail['msg']}"
+        for detail in error.errors()
+    )
+
+async def read_csv_upload(request: Request) -> BinaryIO:
+    """The CSV file of a multipart upload (field ``file``) or a raw text/csv body.
+    
+    Either way the upload ends up in a spooled temporary file, so a large
+    file is not held in memory.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    
+    if content_type == "multipart/form-data":
+        form = await request.form()
+        upload = form.get("file")
+        if upload is None or isinstance(upload, str):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Upload the CSV as the 'file' field"
+            )
+        return upload.file
+    
+    spool = tempfile.SpooledTemporaryFile(max_size=CSV_SPOOL_BYTES)
+    async for chunk in request.stream():
+        spool.write(chunk)
+    spool.seek(0)
+    return spool
+
+def read_csv_rows(file: BinaryIO, required: Sequence[str]) -> Iterator[Tuple[int, Dict[str, str]]]:
+    """Yield (index, row) for each data row of a UTF-8 CSV file with a header row.
+    
+    Empty cells are left out of the row, so they count as missing fields.
+    Raises 400 if a ``required`` column is absent or the file is not CSV.
+    """
+    text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+    try:
+        reader = csv.DictReader(text)
+        missing = [column for column in required if column not in (reader.fieldnames or [])]
+        if missing:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Missing CSV columns: {', '.join(missing)}"
+            )
+        for index, row in enumerate(reader):
+            yield index, {column: value for column, value in row.items() if column is not None and value}
+    except (UnicodeDecodeError, csv.Error) as error:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid CSV: {error}"
+        )
+
+def validate_rows(adapter: TypeAdapter, rows: List[Tuple[int, Any]]) -> Tuple[List[Tuple[int, Any]], List[Tuple[int, str]]]:
+    """Validate a batch of (index, payload) rows with a List[Model] adapter.
+    
+    The whole batch goes through pydantic-core in one call. If rows fail,
+    their errors are collected and the remaining rows are validated again.
+    Returns ((index, model) for valid rows, (index, message) for the rest).
+    """
+    try:
+        return list(zip((index for index, _ in rows), adapter.validate_python([payload for _, payload in rows]))), []
+    except ValidationError as error:
+        messages: Dict[int, List[str]] = defaultdict(list)
+        for detail in error.errors():
+            position, *location = detail["loc"]
+            messages[position].append(f"{'.'.join(str(part) for part in location) or 'row'}: {detail['msg']}")
+    
+    invalid = [(rows[position][0], "; ".join(parts)) for position, parts in sorted(messages.items())]
+    remaining = [row for position, row in enumerate(rows) if position not in messages]
+    if not remaining:
+        return [], invalid
+    valid, more_invalid = validate_rows(adapter, remaining)
+    return valid, sorted(invalid + more_invalid)
@@ -0,0 +1,451 @@
+"""Benchmark every API router in-process or over uvicorn, with machine-readable results.
+
+Run from the project root (requires httpx):
+
+    python benchmarks/bench_api.py [--transport asgi|uvicorn] [--sales 100000] [--requests 300]
+                                   [--concurrency 8] [--scenarios 'reports.*'] [--output run.json]
+                                   [--compare baseline.json]
+
+InMemoryDB is seeded directly, not through the API, with ``--users``,
+``--inventory``, ``--sales``, ``--purchases`` and ``--payroll`` records spread
+over the past year. Each scenario then sends ``--requests`` requests from
+``--concurrency`` concurrent clients: through httpx's ASGI transport in this
+process (``asgi``), or over HTTP to a uvicorn server in a child process that
+seeds itself the same way (``uvicorn``; the load generator shares one core,
+so compare runs of the same transport only).
+
+The results are JSON, written to ``--output`` or stdout: throughput and
+p50/p95/p99/max latency per scenario, the server's peak RSS, the volumes
+and the git commit. A readable table goes to stderr. ``--compare`` adds the
+change against an earlier results file.
+"""
+import argparse
+import asyncio
+import fnmatch
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Callable, NamedTuple, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import httpx
+
+YEAR_SECONDS = 365 * 24 * 3600
+ADMIN = {"username": "admin", "password": "admin123"}
+
+
+def server_environment():
+    # The suite measures the memory backend from an empty start
+    os.environ["DATABASE_BACKEND"] = "memory"
+    os.environ.pop("JOURNAL_DIR", None)
+
+
+def seed(db, args) -> dict:
+    """Fill the database; returns the ids scenarios pick from"""
+    from auth import get_password_hash
+    from models import (InventoryItem, PayrollEntry, Purchase, PurchaseItem, Sale, SaleItem, User,
+                        UserRole)
+
+    rng = random.Random(args.seed)
+    now = datetime.now()
+    year_ago = now - timedelta(days=365)
+
+    def moment(index, count):
+        return year_ago + timedelta(seconds=(index + 1) * YEAR_SECONDS / (count + 1))
+
+    password = get_password_hash("bench-password")
+    user_ids = list(db.allocate_ids("users", args.users))
+    for index, user_id in enumerate(user_ids):
+        db.add_user(User(
+            id=user_id, username=f"bench{user_id}", email=f"bench{user_id}@company.com",
+            full_name=f"Bench User {user_id}", role=UserRole.STAFF, is_active=True,
+            created_at=moment(index, args.users)
+        ))
+        db.set_user_password(f"bench{user_id}", password)
+
+    item_ids = list(db.allocate_ids("inventory", args.inventory))
+    stocked_ids = []
+    for index, item_id in enumerate(item_ids):
+        # Every 20th item sits at its reorder level, so low-stock lists are not empty
+        low = index % 20 == 0
+        if not low:
+            stocked_ids.append(item_id)
+        db.save_inventory_item(InventoryItem(
+            id=item_id, name=f"Bench item {item_id}", sku=f"BENCH-{item_id}",
+            unit_price=round(rng.uniform(1, 100), 2), quantity_in_stock=10 if low else 10 ** 9,
+            reorder_level=10, category=f"category-{index % 10}",
+            created_at=moment(index, args.inventory), updated_at=moment(index, args.inventory)
+        ))
+
+    def lines(model, price_field):
+        return [
+            model(id=line, inventory_item_id=item_id, inventory_item_name=f"Bench item {item_id}",
+                  quantity=rng.randint(1, 5), **{price_field: round(rng.uniform(1, 100), 2)})
+            for line, item_id in enumerate(rng.sample(stocked_ids, min(args.lines, len(stocked_ids))), 1)
+        ]
+
+    sale_ids = list(db.allocate_ids("sales", args.sales))
+    for first in range(0, len(sale_ids), 10000):
+        sales = []
+        for index in range(first, min(first + 10000, len(sale_ids))):
+            items = lines(SaleItem, "unit_price")
+            sales.append(Sale(
+                id=sale_ids[index], customer_name=f"Customer {index % 2000}", items=items,
+                total_amount=sum(item.quantity * item.unit_price for item in items),
+                created_by=1, created_at=moment(index, args.sales)
+            ))
+        db.add_sales(sales)
+
+    purchase_ids = list(db.allocate_ids("purchases", args.purchases))
+    for first in range(0, len(purchase_ids), 10000):
+        purchases = []
+        for index in range(first, min(first + 10000, len(purchase_ids))):
+            items = lines(PurchaseItem, "unit_cost")
+            purchases.append(Purchase(
+                id=purchase_ids[index], supplier_name=f"Supplier {index % 100}", items=items,
+                total_amount=sum(item.quantity * item.unit_cost for item in items),
+                created_by=1, created_at=moment(index, args.purchases)
+            ))
+        db.add_purchases(purchases)
+
+    payroll_ids = list(db.allocate_ids("payroll", args.payroll))
+    for index, payroll_id in enumerate(payroll_ids):
+        created_at = moment(index, args.payroll)
+        db.save_payroll_entry(PayrollEntry(
+            id=payroll_id, employee_name=f"Employee {index % 50}", employee_id=f"E{index % 50}",
+            base_salary=3000, pay_period_start=created_at - timedelta(days=14), pay_period_end=created_at,
+            gross_pay=3000, net_pay=2400, created_by=1, created_at=created_at
+        ))
+
+    return {"users": user_ids, "inventory": item_ids, "stocked": stocked_ids, "sales": sale_ids,
+            "purchases": purchase_ids, "payroll": payroll_ids}
+
+
+class Scenario(NamedTuple):
+    name: str
+    method: str
+    # Builds (path, JSON body or None) for one request
+    request: Callable[[random.Random], Tuple[str, Optional[dict]]]
+    # Scenarios that cannot run --requests times (slow or consuming) cap it
+    max_requests: Optional[int] = None
+
+
+def get(path: str) -> Callable[[random.Random], Tuple[str, None]]:
+    return lambda rng: (path, None)
+
+
+def random_period(rng, days):
+    start = datetime.now() - timedelta(days=365) + timedelta(seconds=rng.randrange(YEAR_SECONDS - days * 86400))
+    return f"start_date={start.isoformat()}&end_date={(start + timedelta(days=days)).isoformat()}"
+
+
+def scenarios(ids: dict, args) -> Tuple[list, list]:
+    """All scenarios, plus the list inventory.create fills with ids for inventory.delete"""
+    created_items = []
+    deletable_sales = list(ids["sales"][-args.requests:])
+    fixed_period = random_period(random.Random(args.seed), 30)
+
+    def record(table):
+        return lambda rng: (f"/api/{table}/{rng.choice(ids[table])}", None)
+
+    def create_item(rng):
+        return "/api/inventory/", {"name": "New item", "sku": f"BENCH-NEW-{rng.getrandbits(64):x}", "unit_price": 5.5,
+                                   "quantity_in_stock": 100, "reorder_level": 10, "category": "new"}
+
+    def update_item(rng):
+        item_id = rng.choice(ids["stocked"])
+        return f"/api/inventory/{item_id}", {"name": f"Bench item {item_id}", "sku": f"BENCH-{item_id}",
+                                             "unit_price": 12.5, "quantity_in_stock": 10 ** 9,
+                                             "reorder_level": 10, "category": "updated"}
+
+    def delete_item(rng):
+        return f"/api/inventory/{created_items.pop() if created_items else 0}", None
+
+    def create_sale(rng):
+        return "/api/sales/", {"customer_name": "Bench customer", "items": [
+            {"inventory_item_id": rng.choice(ids["stocked"]), "quantity": 1, "unit_price": 9.5}
+        ]}
+
+    def create_purchase(rng):
+        return "/api/purchases/", {"supplier_name": "Bench supplier", "items": [
+            {"inventory_item_id": rng.choice(ids["stocked"]), "quantity": 2, "unit_cost": 4.0}
+        ]}
+
+    def create_payroll(rng):
+        end = datetime.now()
+        return "/api/payroll/", {"employee_name": "Bench employee", "employee_id": f"E{rng.randrange(50)}",
+                                 "base_salary": 3000, "pay_period_start": (end - timedelta(days=14)).isoformat(),
+                                 "pay_period_end": end.isoformat()}
+
+    def report(path, days=None, extra=""):
+        if days is None:
+            return get(f"/api/reports/{path}?{fixed_period}{extra}")
+        return lambda rng: (f"/api/reports/{path}?{random_period(rng, days)}{extra}", None)
+
+    return [
+        Scenario("health", "GET", get("/api/health")),
+        Scenario("auth.login", "POST", lambda rng: ("/api/auth/login", ADMIN), args.login_requests),
+        Scenario("auth.me", "GET", get("/api/auth/me")),
+        Scenario("inventory.list", "GET", get("/api/inventory/?limit=100")),
+        Scenario("inventory.get", "GET", record("inventory")),
+        Scenario("inventory.create", "POST", create_item),
+        Scenario("inventory.update", "PUT", update_item),
+        Scenario("inventory.delete", "DELETE", delete_item),
+        Scenario("inventory.low_stock", "GET", get("/api/inventory/low-stock/items")),
+        Scenario("sales.list", "GET", get("/api/sales/?limit=100")),
+        Scenario("sales.list_week", "GET", lambda rng: (f"/api/sales/?{random_period(rng, 7)}", None)),
+        Scenario("sales.get", "GET", record("sales")),
+        Scenario("sales.create", "POST", create_sale),
+        Scenario("sales.delete", "DELETE", lambda rng: (f"/api/sales/{deletable_sales.pop()}", None),
+                 len(deletable_sales)),
+        Scenario("purchases.list", "GET", get("/api/purchases/?limit=100")),
+        Scenario("purchases.get", "GET", record("purchases")),
+        Scenario("purchases.create", "POST", create_purchase),
+        Scenario("payroll.list", "GET", get("/api/payroll/?limit=100")),
+        Scenario("payroll.get", "GET", record("payroll")),
+        Scenario("payroll.create", "POST", create_payroll),
+        Scenario("users.list", "GET", get("/api/users/?limit=100")),
+        Scenario("users.get", "GET", record("users")),
+        # Fixed parameters are answered from the report cache; random periods are computed
+        Scenario("reports.financial_summary.cached", "GET", report("financial-summary")),
+        Scenario("reports.financial_summary", "GET", report("financial-summary", 30)),
+        Scenario("reports.sales_report", "GET", report("sales-report", 30)),
+        Scenario("reports.timeseries", "GET", report("timeseries", 90, "&granularity=day")),
+        Scenario("reports.inventory_report", "GET", get("/api/reports/inventory-report")),
+        Scenario("reports.dashboard_stats", "GET", get("/api/reports/dashboard-stats")),
+    ], created_items
+
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def run_scenario(client, headers, scenario, args, created_items):
+    count = args.requests if scenario.max_requests is None else min(args.requests, scenario.max_requests)
+    rng = random.Random(f"{args.seed}-{scenario.name}")
+    latencies = []
+    errors = 0
+    remaining = iter(range(count))
+
+    async def worker():
+        nonlocal errors
+        for _ in remaining:
+            path, body = scenario.request(rng)
+            started = time.perf_counter()
+            response = await client.request(scenario.method, path, json=body, headers=headers)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+            elif scenario.name == "inventory.create":
+                created_items.append(response.json()["id"])
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+    if not latencies:
+        return None
+
+    ordered = sorted(latencies)
+    return {
+        "requests": len(ordered),
+        "errors": errors,
+        "throughput_rps": round(len(ordered) / elapsed, 1),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+        "p50_ms": round(percentile(ordered, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(ordered, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 0.99) * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+async def run_suite(client, ids, args) -> dict:
+    response = await client.post("/api/auth/login", json=ADMIN)
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    selected, created_items = scenarios(ids, args)
+    if args.scenarios:
+        selected = [scenario for scenario in selected
+                    if any(fnmatch.fnmatch(scenario.name, pattern) for pattern in args.scenarios)]
+        # Deletes consume what the matching create made
+        if any(scenario.name == "inventory.delete" for scenario in selected):
+            names = {scenario.name for scenario in selected}
+            if "inventory.create" not in names:
+                print("inventory.delete needs inventory.create; skipping it", file=sys.stderr)
+                selected = [scenario for scenario in selected if scenario.name != "inventory.delete"]
+
+    results = {}
+    for scenario in selected:
+        # One untimed request warms caches that every later request would find warm anyway
+        if scenario.method == "GET":
+            await client.get(scenario.request(random.Random(0))[0], headers=headers)
+        result = await run_scenario(client, headers, scenario, args, created_items)
+        if result is not None:
+            results[scenario.name] = result
+            print(f"{scenario.name:<36} {result['throughput_rps']:>9.1f} req/s  p50 {result['p50_ms']:>8.2f} ms  "
+                  f"p95 {result['p95_ms']:>8.2f} ms  p99 {result['p99_ms']:>8.2f} ms  errors {result['errors']}",
+                  file=sys.stderr)
+    return results
+
+
+def peak_rss_bytes(pid: Optional[int] = None) -> Optional[int]:
+    """Peak resident set size of this process, or of ``pid`` while it runs (Linux only)"""
+    if pid is None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on Linux, bytes on macOS
+        return peak if sys.platform == "darwin" else peak * 1024
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+
+def seed_arguments(args) -> list:
+    return [f"--{name}={getattr(args, name)}" for name in ("users", "inventory", "sales", "purchases",
+                                                            "payroll", "lines", "seed")]
+
+
+def serve(args):
+    """Child process of the uvicorn transport: seed, report the ids, serve"""
+    server_environment()
+    import uvicorn
+    import main
+    from database import get_database
+
+    ids = seed(get_database(), args)
+    print("READY " + json.dumps(ids), flush=True)
+    uvicorn.run(main.app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+async def run_asgi(args) -> dict:
+    server_environment()
+    import main
+    from database import get_database
+
+    started = time.perf_counter()
+    ids = seed(get_database(), args)
+    seed_seconds = time.perf_counter() - started
+    seeded_rss = peak_rss_bytes()
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        results = await run_suite(client, ids, args)
+    return {"seed_seconds": round(seed_seconds, 2), "seeded_peak_rss_bytes": seeded_rss,
+            "peak_rss_bytes": peak_rss_bytes(), "scenarios": results}
+
+
+async def run_uvicorn(args) -> dict:
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "--serve", f"--port={args.port}", *seed_arguments(args)],
+        cwd=ROOT, stdout=subprocess.PIPE, text=True
+    )
+    try:
+        line = server.stdout.readline()
+        while line and not line.startswith("READY "):
+            line = server.stdout.readline()
+        if not line:
+            raise RuntimeError("server exited before it was ready")
+        ids = json.loads(line[len("READY "):])
+        base_url = f"http://127.0.0.1:{args.port}"
+        async with httpx.AsyncClient(base_url=base_url, timeout=None) as client:
+            for _ in range(100):
+                try:
+                    await client.get("/api/health")
+                    break
+                except httpx.TransportError:
+                    await asyncio.sleep(0.1)
+            seed_seconds = time.perf_counter() - started
+            seeded_rss = peak_rss_bytes(server.pid)
+            results = await run_suite(client, ids, args)
+        return {"seed_seconds": round(seed_seconds, 2), "seeded_peak_rss_bytes": seeded_rss,
+                "peak_rss_bytes": peak_rss_bytes(server.pid), "scenarios": results}
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: dict, baseline: dict):
+    print(f"\nagainst {baseline.get('commit') or 'baseline'}:", file=sys.stderr)
+    for setting in ("transport", "concurrency", "volumes", "cpu_count"):
+        if baseline.get(setting) != results[setting]:
+            print(f"  warning: {setting} differs ({baseline.get(setting)} vs {results[setting]})", file=sys.stderr)
+    for name, result in results["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if before is None:
+            continue
+        throughput = result["throughput_rps"] / before["throughput_rps"] if before["throughput_rps"] else float("nan")
+        p95 = result["p95_ms"] / before["p95_ms"] if before["p95_ms"] else float("nan")
+        print(f"{name:<36} throughput {throughput:>6.2f}x  p95 {p95:>6.2f}x", file=sys.stderr)
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--transport", choices=["asgi", "uvicorn"], default="asgi")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--inventory", type=int, default=1000)
+    parser.add_argument("--sales", type=int, default=100000)
+    parser.add_argument("--purchases", type=int, default=10000)
+    parser.add_argument("--payroll", type=int, default=2000)
+    parser.add_argument("--lines", type=int, default=3, help="line items per sale and purchase")
+    parser.add_argument("--requests", type=int, default=300, help="requests per scenario")
+    parser.add_argument("--login-requests", type=int, default=20, help="logins hash passwords, so fewer")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--scenarios", nargs="+", help="glob patterns of scenario names, e.g. 'reports.*'")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--port", type=int, default=8799)
+    parser.add_argument("--output", help="write the JSON results here instead of stdout")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+
+    run = run_asgi if args.transport == "asgi" else run_uvicorn
+    measured = asyncio.run(run(args))
+    results = {
+        "commit": git_commit(),
+        "created_at": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "transport": args.transport,
+        "concurrency": args.concurrency,
+        "volumes": {name: getattr(args, name) for name in ("users", "inventory", "sales", "purchases",
+                                                           "payroll", "lines")},
+        **measured,
+    }
+    if args.compare:
+        with open(args.compare) as baseline:
+            compare(results, json.load(baseline))
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,76 @@
+"""Compare single-row and batch ingestion throughput for sales and purchases.
+
+Run from the project root (requires httpx):
+
+    python benchmarks/bench_batch.py [--rows 2000]
+
+Every request goes through the in-process ASGI app, including auth and
+validation, so the numbers include the per-request overhead batching saves.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient
+
+import main
+
+
+def sale_row(item_ids, i):
+    return {
+        "customer_name": f"Customer {i}",
+        "items": [{"inventory_item_id": item_ids[i % len(item_ids)], "quantity": 1, "unit_price": 9.5}]
+    }
+
+
+def purchase_row(item_ids, i):
+    return {
+        "supplier_name": f"Supplier {i}",
+        "items": [{"inventory_item_id": item_ids[i % len(item_ids)], "quantity": 2, "unit_cost": 4.0}]
+    }
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=2000)
+    args = parser.parse_args()
+
+    client = TestClient(main.app)
+    token = client.post("/api/auth/login", json={"username": "admin", "password": "admin123"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    item_ids = []
+    for i in range(50):
+        response = client.post("/api/inventory/", headers=headers, json={
+            "name": f"Bench item {i}", "sku": f"BENCH-{time.time_ns()}-{i}", "unit_price": 10,
+            "quantity_in_stock": args.rows * 10, "reorder_level": 1, "category": "bench"
+        })
+        item_ids.append(response.json()["id"])
+
+    for name, path, build in (("sales", "/api/sales/", sale_row), ("purchases", "/api/purchases/", purchase_row)):
+        rows = [build(item_ids, i) for i in range(args.rows)]
+
+        started = time.perf_counter()
+        for row in rows:
+            client.post(path, json=row, headers=headers)
+        single = args.rows / (time.perf_counter() - started)
+
+        started = time.perf_counter()
+        client.post(path + "batch", json=rows, headers=headers)
+        batch = args.rows / (time.perf_counter() - started)
+
+        body = "\n".join(json.dumps(row) for row in rows)
+        started = time.perf_counter()
+        client.post(path + "batch", content=body, headers={**headers, "Content-Type": "application/x-ndjson"})
+        ndjson = args.rows / (time.perf_counter() - started)
+
+        print(f"{name:>9}: single {single:>8.0f} rows/s  batch {batch:>8.0f} rows/s ({batch / single:.1f}x)  "
+              f"ndjson {ndjson:>8.0f} rows/s ({ndjson / single:.1f}x)")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,71 @@
+"""Measure ledger export throughput and memory at growing ledger sizes.
+
+Run from the project root:
+
+    python benchmarks/bench_export.py [--sales 30000 300000] [--lines 3]
+
+Sales are written straight into the in-memory database (or the configured
+DATABASE_BACKEND), then the sales ledger is exported as CSV, gzipped CSV and,
+with pyarrow installed, Parquet by draining the streaming response's body
+generator directly. Peak memory is what tracemalloc saw allocated during the export;
+it should stay flat as the ledger grows.
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import exports
+from database import get_database
+from storage import LEDGER_COLUMNS
+from bench_json import populate
+
+
+def body(db, format, gzip):
+    """The chunks ledger_export streams, without the ASGI response around them"""
+    rows = db.iter_ledger_lines("sales")
+    if format == "parquet":
+        return exports.parquet_chunks(LEDGER_COLUMNS["sales"], rows)
+    chunks = exports.csv_chunks(LEDGER_COLUMNS["sales"], rows)
+    return exports.gzip_chunks(chunks) if gzip else chunks
+
+
+def drain(db, format, gzip):
+    tracemalloc.start()
+    started = time.perf_counter()
+    size = sum(len(chunk) for chunk in body(db, format, gzip))
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, size, peak
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sales", type=int, nargs="+", default=[30000, 300000])
+    parser.add_argument("--lines", type=int, default=3)
+    args = parser.parse_args()
+
+    db = get_database()
+    formats = [("csv", False), ("csv", True)]
+    if exports.pyarrow is not None:
+        formats.append(("parquet", False))
+
+    loaded = 0
+    for sales in sorted(args.sales):
+        populate(db, sales - loaded, args.lines, loaded + 1)
+        loaded = sales
+        lines = sales * args.lines
+        print(f"{sales} sales, {lines} line items")
+        for format, gzip in formats:
+            elapsed, size, peak = drain(db, format, gzip)
+            name = format + (".gz" if gzip else "")
+            print(f"  {name:>8}: {lines / elapsed:>9.0f} lines/s  {size / 2 ** 20:>7.1f} MiB  "
+                  f"peak {peak / 2 ** 20:>6.1f} MiB")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,88 @@
+"""Measure journal write overhead, snapshot time and restart (recovery) time.
+
+Run from the project root:
+
+    python benchmarks/bench_journal.py [--records 1000000] [--tail 50000]
+
+Sales are written straight to an InMemoryDB with a Journal attached, once
+with group commit (the default sync interval) and once with an fsync per
+record on a smaller sample. Recovery loads the snapshot of ``--records``
+sales and replays a journal tail of ``--tail`` more.
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import InMemoryDB
+from journal import Journal
+from models import Sale, SaleItem
+
+
+def make_sale(sale_id, now):
+    return Sale(
+        id=sale_id, customer_name=f"Customer {sale_id % 500}", items=[
+            SaleItem(id=1, inventory_item_id=1 + sale_id % 50, inventory_item_name="Item", quantity=2, unit_price=9.5)
+        ], total_amount=19.0, created_by=1, created_at=now
+    )
+
+
+def write_sales(db, count):
+    now = datetime.now()
+    started = time.perf_counter()
+    for sale_id in db.allocate_ids("sales", count):
+        db.add_sale(make_sale(sale_id, now))
+    return time.perf_counter() - started
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=1000000)
+    parser.add_argument("--tail", type=int, default=50000)
+    parser.add_argument("--fsync-sample", type=int, default=2000)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    try:
+        plain = InMemoryDB()
+        elapsed = write_sales(plain, args.tail)
+        print(f"no journal:        {args.tail / elapsed:>9.0f} sales/s")
+
+        sample_dir = os.path.join(directory, "fsync")
+        os.makedirs(sample_dir)
+        db = InMemoryDB()
+        journal = Journal.open(db, sample_dir, sync_interval=0, snapshot_records=10 ** 9)
+        elapsed = write_sales(db, args.fsync_sample)
+        journal.close()
+        print(f"fsync per record:  {args.fsync_sample / elapsed:>9.0f} sales/s")
+
+        main_dir = os.path.join(directory, "group")
+        db = InMemoryDB()
+        journal = Journal.open(db, main_dir, snapshot_records=10 ** 9)
+        elapsed = write_sales(db, args.records)
+        print(f"group commit:      {args.records / elapsed:>9.0f} sales/s")
+
+        started = time.perf_counter()
+        journal.snapshot(wait=True)
+        print(f"snapshot:          {time.perf_counter() - started:>9.2f} s for {args.records} sales "
+              f"({os.path.getsize(os.path.join(main_dir, 'snapshot.pkl')) / 2 ** 20:.0f} MiB)")
+
+        write_sales(db, args.tail)
+        journal.close()
+
+        started = time.perf_counter()
+        recovered = InMemoryDB()
+        Journal.open(recovered, main_dir).close()
+        print(f"recovery:          {time.perf_counter() - started:>9.2f} s for {len(recovered.sales)} sales")
+        assert len(recovered.sales) == args.records + args.tail
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main_cli()
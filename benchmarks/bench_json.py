@@ -0,0 +1,96 @@
+"""Compare list endpoint throughput on the default and FAST_JSON serialization paths.
+
+Run from the project root (requires httpx):
+
+    python benchmarks/bench_json.py [--rows 10000 100000] [--lines 3] [--repeat 3]
+
+Sales are written straight into the in-memory database, then GET /api/sales/
+is requested through the in-process ASGI app as a JSON array and as NDJSON.
+"default" is FastAPI validating and serializing the response_model; "fast
+cold" is the FAST_JSON path with an empty record cache, "fast warm" the same
+path once the cache holds every record. Bodies are checked to be equal.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient
+
+import main
+import pagination
+from database import get_database
+from models import Sale, SaleItem
+
+
+def populate(db, rows, lines, first_id):
+    rng = random.Random(3)
+    started = datetime(2025, 1, 1)
+    for sale_id in range(first_id, first_id + rows):
+        items = [
+            SaleItem(id=line, inventory_item_id=rng.randint(1, 500), inventory_item_name=f"Item {rng.randint(1, 500)}",
+                     quantity=rng.randint(1, 5), unit_price=round(rng.uniform(1, 100), 2))
+            for line in range(1, lines + 1)
+        ]
+        db.add_sale(Sale(
+            id=sale_id, customer_name=f"Customer {sale_id % 2000}", items=items,
+            total_amount=sum(item.quantity * item.unit_price for item in items),
+            created_by=1, created_at=started + timedelta(seconds=sale_id)
+        ))
+
+
+def timed(client, headers, params, fast, cold, repeat):
+    pagination.FAST_JSON = fast
+    best = None
+    for _ in range(repeat):
+        if cold:
+            pagination.record_json_cache.table_changed("sales")
+        started = time.perf_counter()
+        response = client.get("/api/sales/", params=params, headers=headers)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, response.content
+
+
+def parse(body, ndjson):
+    if ndjson:
+        return [json.loads(line) for line in body.splitlines()]
+    return json.loads(body)
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--lines", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    client = TestClient(main.app)
+    token = client.post("/api/auth/login", json={"username": "admin", "password": "admin123"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    db = get_database()
+
+    loaded = 0
+    for rows in sorted(args.rows):
+        populate(db, rows - loaded, args.lines, loaded + 1)
+        loaded = rows
+        print(f"{rows} sales, {rows * args.lines} line items")
+        for name, params in (("json", {}), ("ndjson", {"format": "ndjson"})):
+            default_time, expected = timed(client, headers, params, False, False, args.repeat)
+            cold_time, cold = timed(client, headers, params, True, True, args.repeat)
+            warm_time, warm = timed(client, headers, params, True, False, args.repeat)
+            ndjson = name == "ndjson"
+            assert parse(expected, ndjson) == parse(cold, ndjson) == parse(warm, ndjson), "bodies differ"
+            print(f"  {name:>6}: default {rows / default_time:>9.0f} rows/s  "
+                  f"fast cold {rows / cold_time:>9.0f} rows/s ({default_time / cold_time:.1f}x)  "
+                  f"fast warm {rows / warm_time:>9.0f} rows/s ({default_time / warm_time:.1f}x)  "
+                  f"{len(warm) / 2 ** 20:.1f} MiB")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,81 @@
+"""Benchmark username and SKU lookups as the tables grow.
+
+Run from the project root:
+
+    python benchmarks/bench_lookups.py
+
+Each row reports the mean lookup latency through the secondary indexes and,
+for comparison, through a linear scan of the same table.
+"""
+import os
+import sys
+import timeit
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import InMemoryDB
+from models import User, InventoryItem, UserRole
+
+SIZES = [1_000, 10_000, 100_000]
+LOOKUPS = 2_000
+
+
+def seed(db: InMemoryDB, size: int):
+    now = datetime.now()
+    for i in range(size):
+        db.add_user(User(
+            id=db.get_next_user_id(),
+            username=f"user{i}",
+            email=f"user{i}@company.com",
+            full_name=f"User {i}",
+            role=UserRole.STAFF,
+            is_active=True,
+            created_at=now
+        ))
+        db.save_inventory_item(InventoryItem(
+            id=db.get_next_inventory_id(),
+            name=f"Item {i}",
+            sku=f"SKU-{i:07d}",
+            unit_price=1.0,
+            quantity_in_stock=10,
+            reorder_level=1,
+            category="bench",
+            created_at=now,
+            updated_at=now
+        ))
+
+
+def mean_us(func, number: int) -> float:
+    return timeit.timeit(func, number=number) / number * 1_000_000
+
+
+def main():
+    print(f"{'rows':>8} {'user idx':>10} {'user scan':>10} {'sku idx':>10} {'sku scan':>10}  (us/lookup)")
+    for size in SIZES:
+        db = InMemoryDB()
+        seed(db, size)
+        username = f"user{size - 1}"
+        sku = f"SKU-{size - 1:07d}"
+
+        def user_index():
+            return db.users.get(db.username_index.get(username))
+
+        def user_scan():
+            return next(u for u in db.users.values() if u.username == username)
+
+        def sku_index():
+            return db.inventory.get(db.sku_index.get(sku))
+
+        def sku_scan():
+            return next(i for i in db.inventory.values() if i.sku == sku)
+
+        scan_number = max(1, LOOKUPS * 1_000 // size)
+        print(
+            f"{size:>8} {mean_us(user_index, LOOKUPS):>10.3f} {mean_us(user_scan, scan_number):>10.1f} "
+            f"{mean_us(sku_index, LOOKUPS):>10.3f} {mean_us(sku_scan, scan_number):>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
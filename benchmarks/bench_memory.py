@@ -0,0 +1,94 @@
+"""Compare the memory held by stored sales as Pydantic models vs. columns.
+
+Run from the project root:
+
+    python benchmarks/bench_memory.py [--sales 200000] [--lines 3]
+
+"models" is the previous layout: a dict of Sale objects plus a TimeIndex of
+(created_at, id) keys. "columnar" is the TransactionStore InMemoryDB now
+uses. Sizes are measured with tracemalloc after building each one.
+"""
+import argparse
+import gc
+import os
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from columnar import TransactionStore
+from database import TimeIndex
+from models import Sale, SaleItem
+
+ITEM_NAMES = [f"Inventory item {n}" for n in range(500)]
+CUSTOMERS = [f"Customer {n}" for n in range(2000)]
+
+
+def generate(count, lines):
+    rng = random.Random(7)
+    started = datetime(2025, 1, 1)
+    for sale_id in range(1, count + 1):
+        items = []
+        for line in range(1, lines + 1):
+            item_id = rng.randrange(len(ITEM_NAMES))
+            # Names are fresh strings, as they are when parsed from a request
+            items.append(SaleItem(
+                id=line, inventory_item_id=item_id + 1, inventory_item_name="".join(ITEM_NAMES[item_id]),
+                quantity=rng.randint(1, 5), unit_price=round(rng.uniform(1, 100), 2)
+            ))
+        yield Sale(
+            id=sale_id, customer_name="".join(rng.choice(CUSTOMERS)), items=items,
+            total_amount=sum(item.quantity * item.unit_price for item in items),
+            created_by=1, created_at=started + timedelta(seconds=sale_id * 30)
+        )
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    held = build()
+    elapsed = time.perf_counter() - started
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return held, size, elapsed
+
+
+def build_models(args):
+    sales, index = {}, TimeIndex()
+    for sale in generate(args.sales, args.lines):
+        sales[sale.id] = sale
+        index.add(sale.created_at, sale.id)
+    return sales, index
+
+
+def build_columnar(args):
+    store = TransactionStore(Sale, "customer", "unit_price")
+    for sale in generate(args.sales, args.lines):
+        store.add(sale)
+    return store
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sales", type=int, default=200000)
+    parser.add_argument("--lines", type=int, default=3)
+    args = parser.parse_args()
+
+    held, models_size, models_time = measure(lambda: build_models(args))
+    del held
+    held, columnar_size, columnar_time = measure(lambda: build_columnar(args))
+
+    line_items = args.sales * args.lines
+    print(f"{args.sales} sales, {line_items} line items")
+    print(f"  models:   {models_size / 2 ** 20:>8.1f} MiB ({models_size / line_items:>6.0f} B/line)  built in {models_time:.1f}s")
+    print(f"  columnar: {columnar_size / 2 ** 20:>8.1f} MiB ({columnar_size / line_items:>6.0f} B/line)  built in {columnar_time:.1f}s")
+    print(f"  reduction: {models_size / columnar_size:.1f}x")
+
+
+if __name__ == "__main__":
+    main_cli()
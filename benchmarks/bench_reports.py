@@ -0,0 +1,140 @@
+"""Compare the sales and financial reports as Python loops vs. the NumPy engine.
+
+Run from the project root (requires numpy):
+
+    python benchmarks/bench_reports.py [--sales 333334] [--lines 3] [--repeat 5]
+
+"loops" are the report computations as routers/reports.py used to run them:
+materialize every sale in range, then sum totals and count item quantities
+in a dict. "columnar" is the TransactionStore column loops, and "numpy" is
+the ReportEngine; both take top sellers from the per-day TopSellers index. Each query covers a random month of a
+year of data; results are checked to be equal before timing is printed.
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import InMemoryDB
+from models import PayrollEntry, Purchase, PurchaseItem, Sale, SaleItem
+
+STARTED = datetime(2025, 1, 1)
+YEAR_SECONDS = 365 * 24 * 3600
+
+
+def populate(db, args):
+    rng = random.Random(11)
+    step = YEAR_SECONDS / args.sales
+    for sale_id in range(1, args.sales + 1):
+        items = [
+            SaleItem(id=line, inventory_item_id=item_id, inventory_item_name=f"Item {item_id}",
+                     quantity=rng.randint(1, 5), unit_price=round(rng.uniform(1, 100), 2))
+            for line, item_id in enumerate(rng.sample(range(args.items), args.lines), 1)
+        ]
+        db.add_sale(Sale(
+            id=sale_id, customer_name="Customer", items=items,
+            total_amount=sum(item.quantity * item.unit_price for item in items),
+            created_by=1, created_at=STARTED + timedelta(seconds=sale_id * step)
+        ))
+        if sale_id % 10 == 0:
+            db.add_purchase(Purchase(
+                id=sale_id, supplier_name="Supplier", total_amount=250.0, created_by=1,
+                items=[PurchaseItem(id=1, inventory_item_id=1, inventory_item_name="Item 1", quantity=25, unit_cost=10)],
+                created_at=STARTED + timedelta(seconds=sale_id * step)
+            ))
+    for entry_id in range(1, 13 * 50):
+        db.save_payroll_entry(PayrollEntry(
+            id=entry_id, employee_name="Employee", employee_id=f"E{entry_id % 50}", base_salary=3000,
+            pay_period_start=STARTED, pay_period_end=STARTED, gross_pay=3000, net_pay=2500, created_by=1,
+            created_at=STARTED + timedelta(days=entry_id * 365 / (13 * 50))
+        ))
+
+
+def report_loops(db, start, end):
+    total_revenue = total_expenses = 0.0
+    total_sales = 0
+    item_sales = {}
+    for sale in db.sales_between(start, end):
+        total_sales += 1
+        total_revenue += sale.total_amount
+        for item in sale.items:
+            item_sales[item.inventory_item_name] = item_sales.get(item.inventory_item_name, 0) + item.quantity
+    for purchase in db.purchases_between(start, end):
+        total_expenses += purchase.total_amount
+    for entry in db.payroll_between(start, end):
+        total_expenses += entry.gross_pay
+    top_selling_items = sorted(item_sales.items(), key=lambda pair: pair[1], reverse=True)[:5]
+    return (total_revenue, total_expenses), (total_sales, total_revenue), top_selling_items
+
+
+def report_columnar(db, start, end):
+    top_selling_items = [(name, quantity) for _, name, quantity in db.top_selling_items(start, end, 5)]
+    total_revenue = db.sales.total_between(start, end)
+    total_expenses = db.purchases.total_between(start, end)
+    total_expenses += sum(entry.gross_pay for entry in db.payroll_between(start, end))
+    return (total_revenue, total_expenses), (db.sales.count_between(start, end), total_revenue), top_selling_items
+
+
+def report_engine_calls(db, start, end):
+    top_selling_items = [(name, quantity) for _, name, quantity in db.top_selling_items(start, end, 5)]
+    return db.financial_totals(start, end), db.sales_totals(start, end), top_selling_items
+
+
+def same(first, second):
+    (revenue, expenses), (count, total), top = first
+    (other_revenue, other_expenses), (other_count, other_total), other_top = second
+    return (
+        count == other_count and top == other_top
+        and all(math.isclose(a, b, rel_tol=1e-9) for a, b in
+                ((revenue, other_revenue), (expenses, other_expenses), (total, other_total)))
+    )
+
+
+def timed(run, db, periods):
+    started = time.perf_counter()
+    results = [run(db, start, end) for start, end in periods]
+    return (time.perf_counter() - started) / len(periods), results
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sales", type=int, default=333334)
+    parser.add_argument("--lines", type=int, default=3)
+    parser.add_argument("--items", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    db = InMemoryDB()
+    populate(db, args)
+    rng = random.Random(5)
+    periods = []
+    for _ in range(args.repeat):
+        start = STARTED + timedelta(days=rng.randrange(0, 335))
+        periods.append((start, start + timedelta(days=30)))
+    # The whole year, where loops are slowest
+    periods.append((STARTED, STARTED + timedelta(days=366)))
+    print(f"{args.sales} sales, {args.sales * args.lines} line items, {len(periods)} report periods")
+
+    loops_time, expected = timed(report_loops, db, periods)
+    columnar_time, columnar = timed(report_columnar, db, periods)
+    # The first call builds the prefix sums; time it separately from warm calls
+    started = time.perf_counter()
+    report_engine_calls(db, *periods[0])
+    cold_time = time.perf_counter() - started
+    numpy_time, vectorized = timed(report_engine_calls, db, periods)
+
+    assert all(same(a, b) for a, b in zip(expected, columnar)), "columnar results differ"
+    assert all(same(a, b) for a, b in zip(expected, vectorized)), "numpy results differ"
+    print(f"  loops:    {loops_time * 1000:>9.1f} ms/report")
+    print(f"  columnar: {columnar_time * 1000:>9.1f} ms/report ({loops_time / columnar_time:.0f}x)")
+    print(f"  numpy:    {numpy_time * 1000:>9.1f} ms/report ({loops_time / numpy_time:.0f}x), "
+          f"first call after a write {cold_time * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,117 @@
+"""Measure read throughput as uvicorn worker processes are added.
+
+Run from the project root (requires httpx):
+
+    python benchmarks/bench_workers.py [--workers 1 2 4] [--clients 8] [--seconds 10]
+
+For each worker count a fresh server is started on a shared SQLite file
+(DATABASE_BACKEND=sqlite, WEB_CONCURRENCY=N), seeded once, and hit by
+``--clients`` load-generating processes on read-heavy endpoints. On a machine
+with at least workers + clients cores, requests/s should grow roughly
+linearly with the worker count.
+"""
+import argparse
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PATHS = ["/api/inventory/?limit=50", "/api/sales/?limit=50", "/api/reports/dashboard-stats"]
+
+
+def wait_until_up(base_url, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(base_url + "/").status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("server did not start")
+
+
+def seed(client, headers, items, sales):
+    item_ids = []
+    for i in range(items):
+        response = client.post("/api/inventory/", headers=headers, json={
+            "name": f"Bench item {i}", "sku": f"WORKERS-{i}", "unit_price": 10,
+            "quantity_in_stock": sales * 10, "reorder_level": 5, "category": "bench"
+        })
+        item_ids.append(response.json()["id"])
+    rows = [
+        {"customer_name": f"Customer {i}",
+         "items": [{"inventory_item_id": item_ids[i % items], "quantity": 1, "unit_price": 10}]}
+        for i in range(sales)
+    ]
+    client.post("/api/sales/batch", headers=headers, json=rows)
+
+
+def load(base_url, token, seconds, counter):
+    headers = {"Authorization": f"Bearer {token}"}
+    done = 0
+    with httpx.Client(base_url=base_url, headers=headers) as client:
+        deadline = time.time() + seconds
+        while time.time() < deadline:
+            response = client.get(PATHS[done % len(PATHS)])
+            assert response.status_code == 200, response.text
+            done += 1
+    with counter.get_lock():
+        counter.value += done
+
+
+def run(workers, args):
+    path = os.path.join(tempfile.mkdtemp(), "workers.db")
+    port = args.port
+    base_url = f"http://127.0.0.1:{port}"
+    env = {**os.environ, "DATABASE_BACKEND": "sqlite", "SQLITE_PATH": path, "WEB_CONCURRENCY": str(workers)}
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=env
+    )
+    try:
+        wait_until_up(base_url)
+        with httpx.Client(base_url=base_url) as client:
+            token = client.post("/api/auth/login", json={"username": "admin", "password": "admin123"}).json()["access_token"]
+            seed(client, {"Authorization": f"Bearer {token}"}, args.items, args.sales)
+
+        counter = multiprocessing.Value("l", 0)
+        clients = [
+            multiprocessing.Process(target=load, args=(base_url, token, args.seconds, counter))
+            for _ in range(args.clients)
+        ]
+        for process in clients:
+            process.start()
+        for process in clients:
+            process.join()
+        return counter.value / args.seconds
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--items", type=int, default=200)
+    parser.add_argument("--sales", type=int, default=5000)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} cores, {args.clients} client processes, endpoints: {', '.join(PATHS)}")
+    baseline = None
+    for workers in args.workers:
+        throughput = run(workers, args)
+        baseline = baseline or throughput
+        print(f"{workers:>3} workers: {throughput:>8.0f} req/s ({throughput / baseline:.2f}x)")
+
+
+if __name__ == "__main__":
+    main_cli()
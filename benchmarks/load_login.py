@@ -0,0 +1,77 @@
+"""Load test: latency of other endpoints while logins are hashing passwords.
+
+Run from the project root (requires httpx):
+
+    python benchmarks/load_login.py [--logins 40] [--probes 200] [--inline]
+
+Concurrent logins run against the in-process ASGI app while a second task
+polls /api/health and /api/inventory/. ``--inline`` verifies passwords on
+the event loop thread, as the login endpoint used to, for comparison.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+import auth
+import main
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def run(logins: int, probes: int):
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        response = await client.post("/api/auth/login", json={"username": "admin", "password": "admin123"})
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+        async def login():
+            await client.post("/api/auth/login", json={"username": "admin", "password": "admin123"})
+
+        async def probe(latencies):
+            for i in range(probes):
+                path = "/api/health" if i % 2 else "/api/inventory/"
+                started = time.perf_counter()
+                await client.get(path, headers=headers)
+                latencies.append((time.perf_counter() - started) * 1000)
+                await asyncio.sleep(0.005)
+
+        latencies = []
+        started = time.perf_counter()
+        await asyncio.gather(probe(latencies), *(login() for _ in range(logins)))
+        elapsed = time.perf_counter() - started
+
+    print(f"logins={logins} bcrypt_rounds={auth.BCRYPT_ROUNDS} pool={auth.PASSWORD_HASH_CONCURRENCY} wall={elapsed:.2f}s")
+    print(
+        f"probe latency ms: p50={statistics.median(latencies):.1f} "
+        f"p95={percentile(latencies, 0.95):.1f} p99={percentile(latencies, 0.99):.1f} "
+        f"max={max(latencies):.1f}"
+    )
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=40)
+    parser.add_argument("--probes", type=int, default=200)
+    parser.add_argument("--inline", action="store_true", help="verify passwords on the event loop thread")
+    args = parser.parse_args()
+
+    if args.inline:
+        async def verify_inline(plain_password, hashed_password):
+            return auth.verify_password(plain_password, hashed_password)
+        auth.verify_password_async = verify_inline
+
+    asyncio.run(run(args.logins, args.probes))
+
+
+if __name__ == "__main__":
+    main_cli()
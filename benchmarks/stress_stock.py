@@ -0,0 +1,155 @@
+"""Hammer a few SKUs with concurrent sales and check stock is never oversold.
+
+Run from the project root (requires httpx):
+
+    python benchmarks/stress_stock.py [--threads 16] [--sales 200] [--stock 300]
+
+Two phases:
+
+* API: many threads post sales through the ASGI app, each sale repeating the
+  same item on several lines. Every thread runs its requests on its own event
+  loop, so the stock checks really do race.
+* Storage: several engines on one SQLite file (one per simulated worker
+  process) call change_stock concurrently.
+
+Both phases fail loudly if any item goes negative or if the final stock does
+not equal the initial stock minus what the accepted sales took.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient
+
+import main
+from database import get_database
+from sqlite_storage import SQLiteDB
+from storage import InsufficientStockError
+from models import InventoryItem
+
+
+def run_threads(count, target):
+    threads = [threading.Thread(target=target, args=(n,)) for n in range(count)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started
+
+
+def check(label, initial, final, taken, attempts, accepted, elapsed):
+    for item_id in initial:
+        expected = initial[item_id] - taken[item_id]
+        assert final[item_id] >= 0, f"{label}: item {item_id} went negative ({final[item_id]})"
+        assert final[item_id] == expected, f"{label}: item {item_id} has {final[item_id]}, expected {expected}"
+    print(f"{label:>8}: {attempts} sales in {elapsed:.2f}s, {accepted} accepted, "
+          f"{attempts - accepted} refused, final stock {sorted(final.values())}")
+
+
+def stress_api(args):
+    client = TestClient(main.app)
+    token = client.post("/api/auth/login", json={"username": "admin", "password": "admin123"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    initial = {}
+    for i in range(3):
+        response = client.post("/api/inventory/", headers=headers, json={
+            "name": f"Stress item {i}", "sku": f"STRESS-{time.time_ns()}-{i}", "unit_price": 10,
+            "quantity_in_stock": args.stock, "reorder_level": 1, "category": "stress"
+        })
+        initial[response.json()["id"]] = args.stock
+    item_ids = list(initial)
+
+    taken = Counter()
+    lock = threading.Lock()
+    counts = Counter()
+
+    def worker(n):
+        rng = random.Random(n)
+        for _ in range(args.sales):
+            # The same item on several lines: each line alone may fit, the sum may not
+            item_id = rng.choice(item_ids)
+            lines = [{"inventory_item_id": item_id, "quantity": rng.randint(1, 3), "unit_price": 10}
+                     for _ in range(rng.randint(1, 3))]
+            lines.append({"inventory_item_id": rng.choice(item_ids), "quantity": 1, "unit_price": 10})
+            response = client.post("/api/sales/", headers=headers, json={"customer_name": "Stress", "items": lines})
+            with lock:
+                counts["attempts"] += 1
+                if response.status_code == 200:
+                    counts["accepted"] += 1
+                    for line in lines:
+                        taken[line["inventory_item_id"]] += line["quantity"]
+                else:
+                    assert response.status_code == 400, response.text
+
+    elapsed = run_threads(args.threads, worker)
+    db = get_database()
+    final = {item_id: db.inventory[item_id].quantity_in_stock for item_id in item_ids}
+    check("api", initial, final, taken, counts["attempts"], counts["accepted"], elapsed)
+
+
+def stress_sqlite(args):
+    path = os.path.join(tempfile.mkdtemp(), "stress.db")
+    engines = [SQLiteDB(path) for _ in range(args.threads)]
+
+    initial = {}
+    now = datetime.now()
+    for item_id in range(1, 4):
+        engines[0].save_inventory_item(InventoryItem(
+            id=item_id, name=f"Stress item {item_id}", sku=f"STRESS-{item_id}", unit_price=10,
+            quantity_in_stock=args.stock, reorder_level=1, category="stress",
+            created_at=now, updated_at=now
+        ))
+        initial[item_id] = args.stock
+
+    taken = Counter()
+    lock = threading.Lock()
+    counts = Counter()
+
+    def worker(n):
+        rng = random.Random(n)
+        for _ in range(args.sales):
+            demand = Counter()
+            for _ in range(rng.randint(1, 3)):
+                demand[rng.choice(list(initial))] -= rng.randint(1, 3)
+            try:
+                engines[n].change_stock(dict(demand))
+                accepted = True
+            except InsufficientStockError:
+                accepted = False
+            with lock:
+                counts["attempts"] += 1
+                if accepted:
+                    counts["accepted"] += 1
+                    for item_id, delta in demand.items():
+                        taken[item_id] -= delta
+
+    elapsed = run_threads(args.threads, worker)
+    final = {item_id: engines[0].inventory[item_id].quantity_in_stock for item_id in initial}
+    check("sqlite", initial, final, taken, counts["attempts"], counts["accepted"], elapsed)
+    for engine in engines:
+        engine.close()
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--sales", type=int, default=200, help="sales per thread")
+    parser.add_argument("--stock", type=int, default=300, help="initial stock per item")
+    args = parser.parse_args()
+
+    stress_api(args)
+    stress_sqlite(args)
+
+
+if __name__ == "__main__":
+    main_cli()
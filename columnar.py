@@ -0,0 +1,380 @@
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from datetime import datetime, timedelta
+from itertools import compress
+from typing import Dict, Iterator, List, Optional, Tuple, Type
+
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+
+def to_micros(moment: datetime) -> int:
+    return (moment - EPOCH) // MICROSECOND
+
+def from_micros(value: int) -> datetime:
+    return EPOCH + timedelta(microseconds=value)
+
+class StringPool:
+    """Interns repeated strings (item names, customers, emails) as small integer codes"""
+    
+    def __init__(self):
+        self.strings: List[Optional[str]] = [None]
+        self.codes: Dict[Optional[str], int] = {None: 0}
+    
+    def code(self, value: Optional[str]) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.strings)
+            self.strings.append(value)
+        return code
+
+class TransactionStore:
+    """Sales or purchases held as parallel typed arrays instead of model objects.
+    
+    Each transaction is one row of the header columns; its line items are a
+    contiguous run of the line columns starting at ``line_start[row]``.
+    Strings are interned in a shared pool, timestamps are microseconds since
+    the epoch, and Pydantic models are only built when a record is read.
+    
+    Rows are kept in (created_at, id) order, so the store doubles as the
+    table's time index. Deleted rows are tombstoned and compacted away once
+    they outnumber live ones. Supports the mapping subset routers rely on:
+    ``get``, ``values``, ``in`` and ``len``.
+    """
+    
+    def __init__(self, model: Type, party: str, price_field: str):
+        self.model = model
+        self.party_name_field = f"{party}_name"
+        self.party_email_field = f"{party}_email"
+        self.price_field = price_field
+        self._lock = threading.RLock()
+        self._strings = StringPool()
+        self._clear()
+    
+    def _clear(self):
+        # Header columns, one entry per transaction
+        self.ids = array("q")
+        self.created_at = array("q")
+        self.total_amount = array("d")
+        self.created_by = array("q")
+        self.party_name = array("l")
+        self.party_email = array("l")
+        self.line_start = array("q")
+        self.alive = bytearray()
+        # Notes are rare free text, kept sparsely by transaction id
+        self.notes: Dict[int, str] = {}
+        
+        # Line columns, one entry per line item
+        self.line_id = array("l")
+        self.item_id = array("q")
+        self.item_name = array("l")
+        self.quantity = array("q")
+        self.price = array("d")
+        
+        self._live = 0
+        # Bumped on every change, so derived arrays know when to rebuild
+        self.version = getattr(self, "version", 0) + 1
+        # Bumped when existing rows move or die (not on appends), so derived arrays can extend instead
+        self.layout_version = getattr(self, "layout_version", 0) + 1
+        self._ids_sorted = True
+        self._row_by_id: Optional[Dict[int, int]] = None
+    
+    def __len__(self) -> int:
+        return self._live
+    
+    def __contains__(self, record_id: int) -> bool:
+        with self._lock:
+            return self._find_row(record_id) is not None
+    
+    def __iter__(self) -> Iterator[int]:
+        return self.iter_ids()
+    
+    # Row lookup
+    
+    def _key(self, row: int) -> Tuple[int, int]:
+        return self.created_at[row], self.ids[row]
+    
+    def _find_row(self, record_id: int) -> Optional[int]:
+        # Ids are normally allocated in time order, so the id column is sorted too
+        if self._ids_sorted:
+            row = bisect_left(self.ids, record_id)
+            if row < len(self.ids) and self.ids[row] == record_id and self.alive[row]:
+                return row
+            return None
+        
+        if self._row_by_id is None:
+            self._row_by_id = {self.ids[row]: row for row in range(len(self.ids)) if self.alive[row]}
+        return self._row_by_id.get(record_id)
+    
+    def _line_bounds(self, row: int) -> Tuple[int, int]:
+        end = self.line_start[row + 1] if row + 1 < len(self.line_start) else len(self.line_id)
+        return self.line_start[row], end
+    
+    def _seek(self, start: Optional[datetime], end: Optional[datetime]) -> Tuple[int, int]:
+        """Row range with start <= created_at <= end"""
+        rows = range(len(self.ids))
+        low = 0 if start is None else bisect_left(rows, (to_micros(start),), key=self._key)
+        high = len(rows) if end is None else bisect_right(rows, (to_micros(end), float("inf")), key=self._key)
+        return low, max(low, high)
+    
+    # Reads
+    
+    def _materialize(self, row: int):
+        strings = self._strings.strings
+        first_line, last_line = self._line_bounds(row)
+        record_id = self.ids[row]
+        return self.model.model_validate({
+            "id": record_id,
+            self.party_name_field: strings[self.party_name[row]],
+            self.party_email_field: strings[self.party_email[row]],
+            "items": [
+                {
+                    "id": self.line_id[line],
+                    "inventory_item_id": self.item_id[line],
+                    "inventory_item_name": strings[self.item_name[line]],
+                    "quantity": self.quantity[line],
+                    self.price_field: self.price[line]
+                }
+                for line in range(first_line, last_line)
+            ],
+            "total_amount": self.total_amount[row],
+            "created_by": self.created_by[row],
+            "created_at": from_micros(self.created_at[row]),
+            "notes": self.notes.get(record_id)
+        })
+    
+    def get(self, record_id: int, default=None):
+        with self._lock:
+            row = self._find_row(record_id)
+            return default if row is None else self._materialize(row)
+    
+    def values(self) -> Iterator:
+        return self.between()
+    
+    def between(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> Iterator:
+        """Records created within [start, end], oldest first"""
+        for record_id in self.iter_ids(start, end):
+            record = self.get(record_id)
+            if record is not None:
+                yield record
+    
+    def ids_between(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> List[int]:
+        with self._lock:
+            low, high = self._seek(start, end)
+            return list(compress(self.ids[low:high], self.alive[low:high]))
+    
+    def iter_ids(self, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                 after: Optional[Tuple[datetime, int]] = None, batch_size: int = 256) -> Iterator[int]:
+        """Lazily yield live ids in time order; same contract as TimeIndex.iter_ids"""
+        end_key = None if end is None else (to_micros(end), float("inf"))
+        with self._lock:
+            position, _ = self._seek(start, None)
+            if after is not None:
+                after_key = (to_micros(after[0]), after[1])
+                position = max(position, bisect_right(range(len(self.ids)), after_key, key=self._key))
+        
+        while True:
+            with self._lock:
+                batch = [
+                    (self._key(row), self.ids[row], self.alive[row])
+                    for row in range(position, min(position + batch_size, len(self.ids)))
+                ]
+            if not batch:
+                return
+            for key, record_id, alive in batch:
+                if end_key is not None and key > end_key:
+                    return
+                if alive:
+                    yield record_id
+            with self._lock:
+                # Rows may have moved since the last batch, so seek again by key
+                position = bisect_right(range(len(self.ids)), batch[-1][0], key=self._key)
+    
+    def iter_lines(self, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                   batch_size: int = 256) -> Iterator[tuple]:
+        """Line items of records created within [start, end], read straight from the columns.
+        
+        Each line is a storage.LEDGER_COLUMNS tuple. Rows are batched and
+        re-sought by key like ``iter_ids``, so exports hold no more than a
+        batch and writers are not blocked for the whole scan.
+        """
+        end_key = None if end is None else (to_micros(end), float("inf"))
+        with self._lock:
+            position, _ = self._seek(start, None)
+        
+        while True:
+            lines = []
+            with self._lock:
+                strings = self._strings.strings
+                rows = range(position, min(position + batch_size, len(self.ids)))
+                if not rows:
+                    return
+                last_key = self._key(rows[-1])
+                finished = end_key is not None and last_key > end_key
+                for row in rows:
+                    if finished and self._key(row) > end_key:
+                        break
+                    if not self.alive[row]:
+                        continue
+                    record_id = self.ids[row]
+                    header = (record_id, from_micros(self.created_at[row]), strings[self.party_name[row]],
+                              strings[self.party_email[row]], self.created_by[row], self.notes.get(record_id),
+                              self.total_amount[row])
+                    first_line, last_line = self._line_bounds(row)
+                    for line in range(first_line, last_line):
+                        lines.append(header + (self.line_id[line], self.item_id[line], strings[self.item_name[line]],
+                                               self.quantity[line], self.price[line]))
+            yield from lines
+            if finished:
+                return
+            with self._lock:
+                position = bisect_right(range(len(self.ids)), last_key, key=self._key)
+    
+    # Column aggregates for reports
+    
+    def count_between(self, start: datetime, end: datetime) -> int:
+        with self._lock:
+            low, high = self._seek(start, end)
+            return sum(self.alive[low:high])
+    
+    def total_between(self, start: datetime, end: datetime) -> float:
+        """Sum of total_amount in time order, matching a sum over the records"""
+        with self._lock:
+            low, high = self._seek(start, end)
+            return sum(compress(self.total_amount[low:high], self.alive[low:high]))
+    
+    def quantity_by_item_between(self, start: datetime, end: datetime) -> Dict[int, int]:
+        """Quantity per inventory item id"""
+        totals: Dict[int, int] = defaultdict(int)
+        with self._lock:
+            low, high = self._seek(start, end)
+            for row in compress(range(low, high), self.alive[low:high]):
+                first_line, last_line = self._line_bounds(row)
+                for line in range(first_line, last_line):
+                    totals[self.item_id[line]] += self.quantity[line]
+        return totals
+    
+    # Writes
+    
+    def add(self, record):
+        code = self._strings.code
+        created_at = to_micros(record.created_at)
+        items = record.items
+        line_ids = [item.id for item in items]
+        item_ids = [item.inventory_item_id for item in items]
+        item_names = [code(item.inventory_item_name) for item in items]
+        quantities = [item.quantity for item in items]
+        prices = [getattr(item, self.price_field) for item in items]
+        header = (
+            record.id, created_at, record.total_amount, record.created_by,
+            code(getattr(record, self.party_name_field)), code(getattr(record, self.party_email_field))
+        )
+        
+        with self._lock:
+            count = len(self.ids)
+            # Records are normally created in time order, so appending is the common case
+            if count == 0 or self._key(count - 1) <= (created_at, record.id):
+                self._ids_sorted = self._ids_sorted and (count == 0 or self.ids[-1] < record.id)
+                if self._row_by_id is not None:
+                    self._row_by_id[record.id] = count
+                for column, value in zip(self._header_columns(), header):
+                    column.append(value)
+                self.line_start.append(len(self.line_id))
+                self.alive.append(1)
+                self.line_id.extend(line_ids)
+                self.item_id.extend(item_ids)
+                self.item_name.extend(item_names)
+                self.quantity.extend(quantities)
+                self.price.extend(prices)
+            else:
+                self._insert(bisect_right(range(count), (created_at, record.id), key=self._key),
+                             header, (line_ids, item_ids, item_names, quantities, prices))
+            
+            if record.notes is not None:
+                self.notes[record.id] = record.notes
+            self._live += 1
+            self.version += 1
+        return record
+    
+    def _header_columns(self) -> tuple:
+        return self.ids, self.created_at, self.total_amount, self.created_by, self.party_name, self.party_email
+    
+    def _insert(self, row: int, header: tuple, lines: tuple):
+        """Insert a transaction before ``row``, shifting later rows and their lines"""
+        record_id = header[0]
+        self.layout_version += 1
+        self._ids_sorted = (
+            self._ids_sorted
+            and (row == 0 or self.ids[row - 1] < record_id)
+            and record_id < self.ids[row]
+        )
+        self._row_by_id = None
+        
+        first_line = self.line_start[row]
+        line_count = len(lines[0])
+        for later in range(row, len(self.line_start)):
+            self.line_start[later] += line_count
+        
+        for column, value in zip(self._header_columns(), header):
+            column.insert(row, value)
+        self.line_start.insert(row, first_line)
+        self.alive.insert(row, 1)
+        for column, values in zip((self.line_id, self.item_id, self.item_name, self.quantity, self.price), lines):
+            column[first_line:first_line] = array(column.typecode, values)
+    
+    def pop(self, record_id: int, default=None):
+        with self._lock:
+            row = self._find_row(record_id)
+            if row is None:
+                return default
+            record = self._materialize(row)
+            self.alive[row] = 0
+            self.layout_version += 1
+            self.notes.pop(record_id, None)
+            if self._row_by_id is not None:
+                del self._row_by_id[record_id]
+            self._live -= 1
+            self.version += 1
+            
+            if len(self.ids) - self._live > max(1024, self._live):
+                self._compact()
+            return record
+    
+    def _compact(self):
+        """Drop tombstoned rows and their line items"""
+        old = self.copy()
+        strings = self._strings
+        self._clear()
+        self._strings = strings
+        self.notes = old.notes
+        for row in compress(range(len(old.ids)), old.alive):
+            first_line, last_line = old._line_bounds(row)
+            self.ids.append(old.ids[row])
+            self.created_at.append(old.created_at[row])
+            self.total_amount.append(old.total_amount[row])
+            self.created_by.append(old.created_by[row])
+            self.party_name.append(old.party_name[row])
+            self.party_email.append(old.party_email[row])
+            self.line_start.append(len(self.line_id))
+            self.alive.append(1)
+            self.line_id.extend(old.line_id[first_line:last_line])
+            self.item_id.extend(old.item_id[first_line:last_line])
+            self.item_name.extend(old.item_name[first_line:last_line])
+            self.quantity.extend(old.quantity[first_line:last_line])
+            self.price.extend(old.price[first_line:last_line])
+        self._live = len(self.ids)
+        self._ids_sorted = all(self.ids[row - 1] < self.ids[row] for row in range(1, len(self.ids)))
+    
+    def copy(self) -> "TransactionStore":
+        """Point-in-time copy; the string pool only grows, so it is shared"""
+        with self._lock:
+            clone = TransactionStore.__new__(TransactionStore)
+            clone.__dict__.update(self.__dict__)
+            clone._lock = threading.RLock()
+            clone._row_by_id = None
+            clone.notes = dict(self.notes)
+            for column in ("ids", "created_at", "total_amount", "created_by", "party_name", "party_email",
+                           "line_start", "alive", "line_id", "item_id", "item_name", "quantity", "price"):
+                setattr(clone, column, getattr(self, column)[:])
+            return clone
@@ -0,0 +1,467 @@
+import heapq
+import threading
+from array import array
+from itertools import groupby, repeat
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from models import InventoryItem, Sale, Purchase
+from listeners import DatabaseListener
+
+# A ledger line: (item id, item name, quantity, unit price or cost)
+CostLine = Tuple[int, str, int, float]
+
+class ItemCosts:
+    """Cost state of one inventory item.
+    
+    Purchased units sit in FIFO layers and, for weighted average, in one
+    pool of the same quantity. Layers are typed columns in arrival order and
+    a layer's index never changes, so history can refer to it; ``head`` is
+    the first layer that may have units left. ``opening`` units were in
+    stock before any recorded purchase; they have no known cost and are
+    sold first.
+    """
+    
+    __slots__ = ("layer_quantity", "layer_cost", "layer_received", "head", "layered_quantity", "fifo_value",
+                 "average_value", "opening", "last_cost", "quantity_sold", "revenue", "fifo_cogs", "average_cogs",
+                 "uncosted_sold", "name")
+    
+    def __init__(self, name: str = ""):
+        # Units left, unit cost and units received, per layer
+        self.layer_quantity = array("q")
+        self.layer_cost = array("d")
+        self.layer_received = array("q")
+        self.head = 0
+        self.layered_quantity = 0
+        self.fifo_value = 0.0
+        self.average_value = 0.0
+        self.opening = 0
+        self.last_cost: Optional[float] = None
+        self.quantity_sold = 0
+        self.revenue = 0.0
+        self.fifo_cogs = 0.0
+        self.average_cogs = 0.0
+        self.uncosted_sold = 0
+        self.name = name
+    
+    def receive(self, quantity: int, unit_cost: float) -> int:
+        """Add a purchased layer and return its index, so a deleted purchase can find it"""
+        self.layer_quantity.append(quantity)
+        self.layer_cost.append(unit_cost)
+        self.layer_received.append(quantity)
+        self.layered_quantity += quantity
+        self.fifo_value += quantity * unit_cost
+        self.average_value += quantity * unit_cost
+        self.last_cost = unit_cost
+        return len(self.layer_quantity) - 1
+    
+    def unreceive(self, layer: int):
+        """Take back a deleted purchase line: what is left of its layer, then the newest stock"""
+        quantity = self.layer_received[layer]
+        removed = min(quantity, self.layer_quantity[layer])
+        fifo_cost = removed * self.layer_cost[layer]
+        self.layer_quantity[layer] -= removed
+        newest = len(self.layer_quantity) - 1
+        while removed < quantity and newest >= self.head:
+            used = min(quantity - removed, self.layer_quantity[newest])
+            fifo_cost += used * self.layer_cost[newest]
+            self.layer_quantity[newest] -= used
+            removed += used
+            newest -= 1
+        
+        average_cost = self.average_value * removed / self.layered_quantity if removed else 0.0
+        self.layered_quantity -= removed
+        self.fifo_value -= fifo_cost
+        self.average_value -= average_cost
+        # Units beyond recorded layers came out of opening stock
+        self.opening = max(0, self.opening - (quantity - removed))
+        if self.layered_quantity == 0:
+            self.head = len(self.layer_quantity)
+            self.fifo_value = self.average_value = 0.0
+    
+    def issue(self, quantity: int, unit_price: float, fallback_cost: float) -> Tuple[int, List[Tuple[int, int]], float, int]:
+        """Sell ``quantity`` units: opening stock first, then purchased layers.
+        
+        Returns how they were costed, for ``unissue``: units from opening
+        stock, (layer, units) taken from each layer, the average cost and
+        the uncosted units.
+        """
+        self.quantity_sold += quantity
+        self.revenue += quantity * unit_price
+        
+        from_opening = min(quantity, self.opening)
+        self.opening -= from_opening
+        from_layers = min(quantity - from_opening, self.layered_quantity)
+        # Units beyond recorded stock (e.g. after a manual stock edit) have no cost either
+        uncosted = quantity - from_layers
+        self.uncosted_sold += uncosted
+        
+        fifo_cost = 0.0
+        consumed = []
+        remaining = from_layers
+        while remaining:
+            used = min(remaining, self.layer_quantity[self.head])
+            if used:
+                fifo_cost += used * self.layer_cost[self.head]
+                consumed.append((self.head, used))
+                self.layer_quantity[self.head] -= used
+                remaining -= used
+            if not self.layer_quantity[self.head]:
+                self.head += 1
+        
+        average_cost = self.average_value * from_layers / self.layered_quantity if from_layers else 0.0
+        self.layered_quantity -= from_layers
+        self.fifo_value -= fifo_cost
+        self.average_value -= average_cost
+        if self.layered_quantity == 0:
+            # Reset instead of keeping float residue
+            self.fifo_value = self.average_value = 0.0
+        
+        self.fifo_cogs += fifo_cost + uncosted * fallback_cost
+        self.average_cogs += average_cost + uncosted * fallback_cost
+        return from_opening, consumed, average_cost, uncosted
+    
+    def unissue(self, quantity: int, unit_price: float, from_opening: int, consumed: Iterable[Tuple[int, int]],
+                average_cost: float, uncosted: int, fallback_cost: float):
+        """Reverse a deleted sale line: its units return to the layers they left, at the cost they left at"""
+        self.quantity_sold -= quantity
+        self.revenue -= quantity * unit_price
+        self.opening += from_opening
+        self.uncosted_sold -= uncosted
+        
+        fifo_cost = 0.0
+        for layer, used in consumed:
+            self.layer_quantity[layer] += used
+            self.head = min(self.head, layer)
+            self.layered_quantity += used
+            fifo_cost += used * self.layer_cost[layer]
+        self.fifo_value += fifo_cost
+        self.average_value += average_cost
+        
+        self.fifo_cogs -= fifo_cost + uncosted * fallback_cost
+        self.average_cogs -= average_cost + uncosted * fallback_cost
+    
+    def cogs(self, method: str) -> float:
+        return self.fifo_cogs if method == "fifo" else self.average_cogs
+    
+    def layered_value(self, method: str) -> float:
+        return self.fifo_value if method == "fifo" else self.average_value
+
+class RecordRuns:
+    """Per-record history rows in typed columns; each record id owns one contiguous run.
+    
+    Runs are found through start/length columns indexed by record id, which
+    stay dense because ids are allocated in sequence. Removed runs are left
+    in place and compacted away once they outnumber live rows, as in
+    ``TransactionStore``.
+    """
+    
+    def __init__(self, **typecodes: str):
+        self.typecodes = typecodes
+        self.columns = {name: array(code) for name, code in typecodes.items()}
+        self.start = array("q")
+        # Run length + 1, or 0 where the id has no run
+        self.length = array("i")
+        self.records = 0
+        self.live_rows = 0
+    
+    def __len__(self) -> int:
+        return self.records
+    
+    def __contains__(self, record_id: int) -> bool:
+        return record_id < len(self.length) and self.length[record_id] != 0
+    
+    def ids(self) -> List[int]:
+        return [record_id for record_id, length in enumerate(self.length) if length]
+    
+    def put(self, record_id: int, rows: List[tuple]):
+        """Store ``rows`` (tuples in column order) as the run of a record not yet stored"""
+        missing = record_id + 1 - len(self.length)
+        if missing > 0:
+            self.start.extend(repeat(0, missing))
+            self.length.extend(repeat(0, missing))
+        self.start[record_id] = len(next(iter(self.columns.values())))
+        self.length[record_id] = len(rows) + 1
+        for index, column in enumerate(self.columns.values()):
+            column.extend(row[index] for row in rows)
+        self.records += 1
+        self.live_rows += len(rows)
+    
+    def pop(self, record_id: int) -> List[tuple]:
+        """Remove a record's run and return its rows; no rows if it has none"""
+        if record_id not in self:
+            return []
+        start, length = self.start[record_id], self.length[record_id] - 1
+        columns = list(self.columns.values())
+        rows = list(zip(*(column[start:start + length] for column in columns)))
+        self.length[record_id] = 0
+        self.records -= 1
+        self.live_rows -= length
+        if len(columns[0]) > 2 * self.live_rows + 1024:
+            self._compact()
+        return rows
+    
+    def _compact(self):
+        columns = {name: array(code) for name, code in self.typecodes.items()}
+        for record_id in self.ids():
+            start, length = self.start[record_id], self.length[record_id] - 1
+            self.start[record_id] = len(next(iter(columns.values())))
+            for name, column in columns.items():
+                column.extend(self.columns[name][start:start + length])
+        self.columns = columns
+
+class CostLedger(DatabaseListener):
+    """FIFO and weighted-average cost of goods sold and inventory at cost.
+    
+    Purchases add a cost layer per line and sales consume them, each in
+    O(lines), so reports only walk the items. How each live sale's lines
+    were costed, and each live purchase's layers, are kept in typed columns,
+    so deleting one is reversed in O(lines) too: a sale's units return to
+    the layers they left. Rows another worker added are read from above an
+    id high-water mark at the next read, and its deletions are found by
+    comparing row counts. History is only replayed for the first read.
+    """
+    
+    def __init__(self, db):
+        self.db = db
+        self.lock = threading.RLock()
+        self._clear()
+        # Tables another worker changed since they were last read
+        self.pending: Set[str] = set()
+        self.stale = True
+    
+    def _clear(self):
+        self.items: Dict[int, ItemCosts] = {}
+        # Per sale line, what ItemCosts.issue reports: units from opening stock, average cost,
+        # uncosted units and their fallback cost, with how many of the sale's layer rows it took
+        self.sale_lines = RecordRuns(item="q", quantity="q", price="d", opening="q", average="d",
+                                     uncosted="q", fallback="d", layers="i")
+        # Per sale, the (layer, units) its lines took, in line order
+        self.sale_layers = RecordRuns(layer="i", quantity="q")
+        # Per purchase line: item and the layer it added
+        self.purchase_lines = RecordRuns(item="q", layer="i")
+        # Highest id read back from each table; rows above it may be new to this ledger.
+        # Local writes do not raise it, so a row another worker committed just before
+        # one of ours, with a lower id, is still read.
+        self.high_water = {"inventory": 0, "sales": 0, "purchases": 0}
+    
+    def _costs(self, item_id: int, name: str = "") -> ItemCosts:
+        costs = self.items.get(item_id)
+        if costs is None:
+            costs = self.items[item_id] = ItemCosts(name)
+        return costs
+    
+    def _fallback_cost(self, item_id: int, costs: ItemCosts) -> float:
+        """Cost of units with no purchase layer: the last purchase cost, else the item's price"""
+        if costs.last_cost is not None:
+            return costs.last_cost
+        item = self.db.inventory.get(item_id)
+        return item.unit_price if item is not None else 0.0
+    
+    def _receive(self, purchase_id: int, lines: Iterable[CostLine]):
+        if purchase_id in self.purchase_lines:
+            return
+        rows = [(item_id, self._costs(item_id, name).receive(quantity, unit_cost))
+                for item_id, name, quantity, unit_cost in lines]
+        self.purchase_lines.put(purchase_id, rows)
+    
+    def _issue(self, sale_id: int, lines: Iterable[CostLine]):
+        if sale_id in self.sale_lines:
+            return
+        line_rows, layer_rows = [], []
+        for item_id, name, quantity, unit_price in lines:
+            costs = self._costs(item_id, name)
+            costs.name = name
+            fallback_cost = self._fallback_cost(item_id, costs)
+            from_opening, consumed, average_cost, uncosted = costs.issue(quantity, unit_price, fallback_cost)
+            line_rows.append((item_id, quantity, unit_price, from_opening, average_cost, uncosted, fallback_cost,
+                              len(consumed)))
+            layer_rows += consumed
+        self.sale_lines.put(sale_id, line_rows)
+        self.sale_layers.put(sale_id, layer_rows)
+    
+    def _add_purchase(self, purchase: Purchase):
+        self._receive(purchase.id, ((line.inventory_item_id, line.inventory_item_name, line.quantity, line.unit_cost)
+                                    for line in purchase.items))
+    
+    def _add_sale(self, sale: Sale):
+        self._issue(sale.id, ((line.inventory_item_id, line.inventory_item_name, line.quantity, line.unit_price)
+                              for line in sale.items))
+    
+    def _remove_purchase(self, purchase_id: int):
+        for item_id, layer in reversed(self.purchase_lines.pop(purchase_id)):
+            self.items[item_id].unreceive(layer)
+    
+    def _remove_sale(self, sale_id: int):
+        lines = self.sale_lines.pop(sale_id)
+        layers = self.sale_layers.pop(sale_id)
+        end = len(layers)
+        for item_id, quantity, unit_price, from_opening, average_cost, uncosted, fallback_cost, used in reversed(lines):
+            self.items[item_id].unissue(quantity, unit_price, from_opening, layers[end - used:end], average_cost,
+                                        uncosted, fallback_cost)
+            end -= used
+    
+    def rebuild(self):
+        """Replay purchases and sales in time order over each item's opening stock"""
+        with self.lock:
+            self._clear()
+            self.pending = set()
+            # Opening stock is whatever current stock the recorded history does not explain
+            net_change: Dict[int, int] = {}
+            for table, sign in (("purchases", 1), ("sales", -1)):
+                for line in self.db.iter_ledger_lines(table):
+                    net_change[line[8]] = net_change.get(line[8], 0) + sign * line[10]
+            for item in self.db.inventory.values():
+                self._costs(item.id, item.name).opening = max(0, item.quantity_in_stock - net_change.get(item.id, 0))
+                self.high_water["inventory"] = max(self.high_water["inventory"], item.id)
+            
+            # Purchases sort before sales made at the same moment; a record's lines are adjacent
+            purchases = ((line[1], 0, line) for line in self.db.iter_ledger_lines("purchases"))
+            sales = ((line[1], 1, line) for line in self.db.iter_ledger_lines("sales"))
+            merged = heapq.merge(purchases, sales, key=lambda entry: entry[:2])
+            for (is_sale, record_id), entries in groupby(merged, key=lambda entry: (entry[1], entry[2][0])):
+                lines = [(line[8], line[9], line[10], line[11]) for _, _, line in entries]
+                if is_sale:
+                    self._issue(record_id, lines)
+                else:
+                    self._receive(record_id, lines)
+            self.high_water["sales"] = max(self.sale_lines.ids(), default=0)
+            self.high_water["purchases"] = max(self.purchase_lines.ids(), default=0)
+            self.stale = False
+    
+    def _catch_up(self):
+        """Apply what other workers changed: new rows first, then deletions"""
+        if self.stale:
+            self.rebuild()
+            return
+        if not self.pending:
+            return
+        tables, self.pending = self.pending, set()
+        
+        # Read both tables whatever changed: a write of our own that is still in progress
+        # is visible too, and the stock of a new item already counts it
+        new_purchases = list(self.db.iter_records_after_id("purchases", self.high_water["purchases"]))
+        new_sales = list(self.db.iter_records_after_id("sales", self.high_water["sales"]))
+        for table, records in (("purchases", new_purchases), ("sales", new_sales)):
+            if records:
+                self.high_water[table] = records[-1].id
+        if "inventory" in tables:
+            # Items created elsewhere start with the stock their new purchases and sales do not explain
+            net_change: Dict[int, int] = {}
+            for records, sign in ((new_purchases, 1), (new_sales, -1)):
+                for record in records:
+                    for line in record.items:
+                        net_change[line.inventory_item_id] = net_change.get(line.inventory_item_id, 0) + sign * line.quantity
+            for item in self.db.iter_records_after_id("inventory", self.high_water["inventory"]):
+                if item.id not in self.items:
+                    self._costs(item.id, item.name).opening = max(0, item.quantity_in_stock - net_change.get(item.id, 0))
+                self.high_water["inventory"] = max(self.high_water["inventory"], item.id)
+        
+        # Purchases sort before sales made at the same moment, as in rebuild()
+        added = [(purchase.created_at, 0, purchase) for purchase in new_purchases]
+        added += [(sale.created_at, 1, sale) for sale in new_sales]
+        for _, is_sale, record in sorted(added, key=lambda entry: (entry[0], entry[1], entry[2].id)):
+            if is_sale:
+                self._add_sale(record)
+            else:
+                self._add_purchase(record)
+        
+        # Only a deletion leaves fewer rows than this ledger knows of
+        for table, known, remove in (("purchases", self.purchase_lines, self._remove_purchase),
+                                     ("sales", self.sale_lines, self._remove_sale)):
+            if table in tables and len(getattr(self.db, table)) != len(known):
+                live = set(getattr(self.db, table))
+                for record_id in [record_id for record_id in known.ids() if record_id not in live]:
+                    remove(record_id)
+    
+    def snapshot(self) -> Dict[int, ItemCosts]:
+        """Current per-item costs, brought up to date first; hold ``lock`` while reading them"""
+        self._catch_up()
+        return self.items
+    
+    # Listener callbacks; while stale, the coming rebuild reads these changes from the database
+    
+    def inventory_saved(self, old: Optional[InventoryItem], new: InventoryItem):
+        with self.lock:
+            if old is None and not self.stale:
+                self._catch_up()
+                if new.id not in self.items:
+                    self._costs(new.id, new.name).opening = new.quantity_in_stock
+    
+    def purchase_added(self, purchase: Purchase):
+        with self.lock:
+            if not self.stale:
+                self._catch_up()
+                self._add_purchase(purchase)
+    
+    def sale_added(self, sale: Sale):
+        with self.lock:
+            if not self.stale:
+                self._catch_up()
+                self._add_sale(sale)
+    
+    def sale_deleted(self, sale: Sale):
+        with self.lock:
+            if not self.stale:
+                self._catch_up()
+                self._remove_sale(sale.id)
+    
+    def purchase_deleted(self, purchase: Purchase):
+        with self.lock:
+            if not self.stale:
+                self._catch_up()
+                self._remove_purchase(purchase.id)
+    
+    def table_changed(self, table: str):
+        with self.lock:
+            if table in ("inventory", "sales", "purchases"):
+                self.pending.add(table)
+
+def inventory_valuation(ledger: CostLedger, items: List[InventoryItem], method: str) -> dict:
+    """Stock of each item valued at cost; O(items).
+    
+    Stock not covered by purchase layers (opening stock, manual edits) is
+    valued at the fallback cost and reported as ``uncosted_quantity``.
+    """
+    rows = []
+    total_cost = total_price = 0.0
+    with ledger.lock:
+        costs_by_item = ledger.snapshot()
+        for item in items:
+            costs = costs_by_item.get(item.id) or ItemCosts(item.name)
+            stock = item.quantity_in_stock
+            layered = min(stock, costs.layered_quantity)
+            value = costs.layered_value(method)
+            if costs.layered_quantity > stock:
+                # Stock was edited down by hand; keep the average cost of what is left
+                value = value * stock / costs.layered_quantity if costs.layered_quantity else 0.0
+            uncosted = stock - layered
+            value += uncosted * ledger._fallback_cost(item.id, costs)
+            rows.append({
+                "item_id": item.id, "name": item.name, "sku": item.sku, "quantity_in_stock": stock,
+                "unit_cost": value / stock if stock else 0.0, "value_at_cost": value, "uncosted_quantity": uncosted
+            })
+            total_cost += value
+            total_price += stock * item.unit_price
+    return {"method": method, "total_value_at_cost": total_cost, "total_value_at_price": total_price, "items": rows}
+
+def gross_margin(ledger: CostLedger, method: str) -> dict:
+    """Revenue, cost of goods sold and gross margin per item sold; O(items)"""
+    rows = []
+    revenue = cogs = 0.0
+    with ledger.lock:
+        for item_id, costs in sorted(ledger.snapshot().items()):
+            if not costs.quantity_sold:
+                continue
+            item_cogs = costs.cogs(method)
+            margin = costs.revenue - item_cogs
+            rows.append({
+                "item_id": item_id, "name": costs.name, "quantity_sold": costs.quantity_sold,
+                "revenue": costs.revenue, "cost_of_goods_sold": item_cogs, "gross_margin": margin,
+                "margin_percent": margin / costs.revenue * 100 if costs.revenue else None,
+                "uncosted_quantity_sold": costs.uncosted_sold
+            })
+            revenue += costs.revenue
+            cogs += item_cogs
+    return {
+        "method": method, "revenue": revenue, "cost_of_goods_sold": cogs, "gross_margin": revenue - cogs,
+        "margin_percent": (revenue - cogs) / revenue * 100 if revenue else None, "items": rows
+    }
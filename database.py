@@ -1,16 +1,128 @@
+import os
+import threading
+from bisect import bisect_left, bisect_right, insort
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Dict, List, Optional
+from enum import Enum
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 from models import User, InventoryItem, Sale, Purchase, PayrollEntry, UserRole
 from auth import get_password_hash
+from storage import StorageBackend, InsufficientStockError, InventoryItemNotFoundError
+from aggregates import LowStockIndex, RunningAggregates, TopSellers
+from columnar import TransactionStore
+from report_engine import ReportEngine
+from rollups import BucketTotals, Rollups
+
+# Storage configuration: "memory" (default) or "sqlite"
+DATABASE_BACKEND = os.environ.get("DATABASE_BACKEND", "memory")
+SQLITE_PATH = os.environ.get("SQLITE_PATH", "accounting.db")
+# Directory for the memory backend's journal and snapshots; unset keeps data in memory only
+JOURNAL_DIR = os.environ.get("JOURNAL_DIR")
+
+class TimeIndex:
+    """Sorted (created_at, id) keys for O(log n + k) date range scans"""
+    
+    def __init__(self):
+        self._keys: List[Tuple[datetime, int]] = []
+    
+    def __len__(self) -> int:
+        return len(self._keys)
+    
+    def add(self, created_at: datetime, record_id: int):
+        key = (created_at, record_id)
+        # Records are normally created in time order, so appending is the common case
+        if not self._keys or self._keys[-1] < key:
+            self._keys.append(key)
+        else:
+            insort(self._keys, key)
+    
+    def remove(self, created_at: datetime, record_id: int):
+        key = (created_at, record_id)
+        position = bisect_left(self._keys, key)
+        if position < len(self._keys) and self._keys[position] == key:
+            del self._keys[position]
+    
+    def ids_between(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> List[int]:
+        """Return ids with start <= created_at <= end in time order (bounds are optional)"""
+        low = 0 if start is None else bisect_left(self._keys, (start,))
+        high = len(self._keys) if end is None else bisect_right(self._keys, (end, float("inf")))
+        return [record_id for _, record_id in self._keys[low:high]]
+    
+    def iter_ids(self, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                 after: Optional[Tuple[datetime, int]] = None, batch_size: int = 256) -> Iterator[int]:
+        """Lazily yield ids in time order, starting after the ``after`` key.
+        
+        The position is re-sought by key for every batch, so records inserted
+        or deleted while a caller is streaming do not shift the iteration.
+        """
+        position = 0 if start is None else bisect_left(self._keys, (start,))
+        if after is not None:
+            position = max(position, bisect_right(self._keys, after))
+        
+        while True:
+            batch = self._keys[position:position + batch_size]
+            if not batch:
+                return
+            for created_at, record_id in batch:
+                if end is not None and created_at > end:
+                    return
+                yield record_id
+            position = bisect_right(self._keys, batch[-1])
+
+# Auto-increment counter attribute for each table
+COUNTER_ATTRIBUTES = {
+    "users": "user_counter",
+    "inventory": "inventory_counter",
+    "sales": "sale_counter",
+    "purchases": "purchase_counter",
+    "payroll": "payroll_counter"
+}
 
 # In-memory database
-class InMemoryDB:
+class InMemoryDB(StorageBackend):
     def __init__(self):
+        super().__init__()
         self.users: Dict[int, User] = {}
         self.inventory: Dict[int, InventoryItem] = {}
-        self.sales: Dict[int, Sale] = {}
-        self.purchases: Dict[int, Purchase] = {}
+        # Transactions are stored column-wise; models are built only when read
+        self.sales = TransactionStore(Sale, "customer", "unit_price")
+        self.purchases = TransactionStore(Purchase, "supplier", "unit_cost")
         self.payroll: Dict[int, PayrollEntry] = {}
+        self.user_passwords: Dict[str, str] = {}
+        
+        # Secondary indexes, kept in sync by the add/save/delete methods below
+        self.username_index: Dict[str, int] = {}
+        self.sku_index: Dict[str, int] = {}
+        self.users_by_time = TimeIndex()
+        self.inventory_by_time = TimeIndex()
+        self.payroll_by_time = TimeIndex()
+        self.time_indexes: Dict[str, TimeIndex] = {
+            "users": self.users_by_time,
+            "inventory": self.inventory_by_time,
+            # The transaction stores keep their rows in time order themselves
+            "sales": self.sales,
+            "purchases": self.purchases,
+            "payroll": self.payroll_by_time
+        }
+        
+        # Held by transaction(); single writes are already atomic under the GIL
+        self._transaction_lock = threading.RLock()
+        
+        # One lock per inventory item, held while its stock is checked and changed
+        self._item_locks: Dict[int, threading.RLock] = {}
+        self._item_locks_guard = threading.Lock()
+        
+        # Derived structures notified after every mutation
+        self.aggregates = RunningAggregates()
+        self.add_listener(self.aggregates)
+        self.reports = ReportEngine(self)
+        self.add_listener(self.reports)
+        self.top_sellers = TopSellers()
+        self.add_listener(self.top_sellers)
+        self.rollups = Rollups()
+        self.add_listener(self.rollups)
+        self.low_stock = LowStockIndex()
+        self.add_listener(self.low_stock)
         
         # Counters for auto-incrementing IDs
         self.user_counter = 1
@@ -19,6 +131,11 @@ class InMemoryDB:
         self.purchase_counter = 1
         self.payroll_counter = 1
     
+    @contextmanager
+    def transaction(self):
+        with self._transaction_lock:
+            yield
+    
     def get_next_user_id(self) -> int:
         self.user_counter += 1
         return self.user_counter - 1
@@ -38,29 +155,319 @@ class InMemoryDB:
     def get_next_payroll_id(self) -> int:
         self.payroll_counter += 1
         return self.payroll_counter - 1
+    
+    def allocate_ids(self, table: str, count: int) -> range:
+        counter = COUNTER_ATTRIBUTES[table]
+        first_id = getattr(self, counter)
+        setattr(self, counter, first_id + count)
+        return range(first_id, first_id + count)
+    
+    def add_user(self, user: User) -> User:
+        """Store a user and index it by username"""
+        self.users[user.id] = user
+        self.username_index[user.username] = user.id
+        self.users_by_time.add(user.created_at, user.id)
+        self._notify("user_saved", None, user)
+        return user
+    
+    def set_user_active(self, user_id: int, is_active: bool) -> Optional[User]:
+        """Activate or deactivate a user; returns None if the user does not exist"""
+        existing_user = self.users.get(user_id)
+        if existing_user is None:
+            return None
+        
+        updated_user = existing_user.model_copy(update={"is_active": is_active})
+        self.users[user_id] = updated_user
+        self._notify("user_saved", existing_user, updated_user)
+        return updated_user
+    
+    def find_user_by_username(self, username: str) -> Optional[User]:
+        user_id = self.username_index.get(username)
+        if user_id is None:
+            return None
+        return self.users.get(user_id)
+    
+    def get_user_password(self, username: str) -> Optional[str]:
+        return self.user_passwords.get(username)
+    
+    def set_user_password(self, username: str, hashed_password: str):
+        self.user_passwords[username] = hashed_password
+        self._notify("password_saved", username, hashed_password)
+    
+    def _item_lock(self, item_id: int) -> threading.RLock:
+        with self._item_locks_guard:
+            lock = self._item_locks.get(item_id)
+            if lock is None:
+                lock = self._item_locks[item_id] = threading.RLock()
+            return lock
+    
+    def save_inventory_item(self, item: InventoryItem) -> InventoryItem:
+        """Insert or replace an inventory item and keep the SKU index in sync"""
+        with self._item_lock(item.id):
+            existing_item = self.inventory.get(item.id)
+            if existing_item is not None and existing_item.sku != item.sku:
+                self.sku_index.pop(existing_item.sku, None)
+            if existing_item is None or existing_item.created_at != item.created_at:
+                if existing_item is not None:
+                    self.inventory_by_time.remove(existing_item.created_at, item.id)
+                self.inventory_by_time.add(item.created_at, item.id)
+            
+            self.inventory[item.id] = item
+            self.sku_index[item.sku] = item.id
+            self._notify("inventory_saved", existing_item, item)
+        return item
+    
+    def save_inventory_items(self, items: List[InventoryItem]) -> List[InventoryItem]:
+        """Upsert items by SKU while holding their locks, so no stock change interleaves"""
+        with self._transaction_lock:
+            saved = []
+            for item in items:
+                existing_item = self.find_inventory_item_by_sku(item.sku)
+                if existing_item is not None and (existing_item.id, existing_item.created_at) != (item.id, item.created_at):
+                    item = item.model_copy(update={"id": existing_item.id, "created_at": existing_item.created_at})
+                saved.append(item)
+            
+            # Sorted acquisition, as in change_stock
+            locks = [self._item_lock(item_id) for item_id in sorted({item.id for item in saved})]
+            for lock in locks:
+                lock.acquire()
+            try:
+                for item in saved:
+                    self.save_inventory_item(item)
+            finally:
+                for lock in reversed(locks):
+                    lock.release()
+        return saved
+    
+    def change_stock(self, deltas: Dict[int, int], skip_missing: bool = False) -> List[InventoryItem]:
+        """Check every delta, then apply them all, while holding the items' locks"""
+        # Sorted acquisition keeps two multi-item changes from deadlocking
+        locks = [self._item_lock(item_id) for item_id in sorted(deltas)]
+        for lock in locks:
+            lock.acquire()
+        try:
+            current_items = []
+            for item_id in sorted(deltas):
+                item = self.inventory.get(item_id)
+                if item is None:
+                    if skip_missing:
+                        continue
+                    raise InventoryItemNotFoundError(item_id)
+                if deltas[item_id] < 0 and item.quantity_in_stock + deltas[item_id] < 0:
+                    raise InsufficientStockError(item, -deltas[item_id])
+                current_items.append(item)
+            
+            now = datetime.now()
+            return [
+                self.save_inventory_item(item.model_copy(update={
+                    "quantity_in_stock": item.quantity_in_stock + deltas[item.id],
+                    "updated_at": now
+                }))
+                for item in current_items
+            ]
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+    
+    def delete_inventory_item(self, item_id: int) -> Optional[InventoryItem]:
+        """Remove an inventory item and its SKU index entry"""
+        with self._item_lock(item_id):
+            item = self.inventory.pop(item_id, None)
+            if item is not None and self.sku_index.get(item.sku) == item_id:
+                del self.sku_index[item.sku]
+            if item is not None:
+                self.inventory_by_time.remove(item.created_at, item_id)
+                self._notify("inventory_deleted", item)
+        return item
+    
+    def find_inventory_item_by_sku(self, sku: str) -> Optional[InventoryItem]:
+        item_id = self.sku_index.get(sku)
+        if item_id is None:
+            return None
+        return self.inventory.get(item_id)
+    
+    def find_inventory_items_by_sku(self, skus: Iterable[str]) -> Dict[str, InventoryItem]:
+        items = {}
+        for sku in skus:
+            item = self.find_inventory_item_by_sku(sku)
+            if item is not None:
+                items[sku] = item
+        return items
+    
+    def add_sale(self, sale: Sale) -> Sale:
+        """Store a sale and index it by creation time"""
+        self.sales.add(sale)
+        self._notify("sale_added", sale)
+        return sale
+    
+    def add_sales(self, sales: List[Sale]) -> List[Sale]:
+        for sale in sales:
+            self.add_sale(sale)
+        return sales
+    
+    def delete_sale(self, sale_id: int) -> Optional[Sale]:
+        """Remove a sale and its time index entry"""
+        sale = self.sales.pop(sale_id)
+        if sale is not None:
+            self._notify("sale_deleted", sale)
+        return sale
+    
+    def add_purchase(self, purchase: Purchase) -> Purchase:
+        """Store a purchase and index it by creation time"""
+        self.purchases.add(purchase)
+        self._notify("purchase_added", purchase)
+        return purchase
+    
+    def add_purchases(self, purchases: List[Purchase]) -> List[Purchase]:
+        for purchase in purchases:
+            self.add_purchase(purchase)
+        return purchases
+    
+    def delete_purchase(self, purchase_id: int) -> Optional[Purchase]:
+        """Remove a purchase and its time index entry"""
+        purchase = self.purchases.pop(purchase_id)
+        if purchase is not None:
+            self._notify("purchase_deleted", purchase)
+        return purchase
+    
+    def save_payroll_entry(self, entry: PayrollEntry) -> PayrollEntry:
+        """Insert or replace a payroll entry and keep the time index in sync"""
+        existing_entry = self.payroll.get(entry.id)
+        if existing_entry is not None:
+            self.payroll_by_time.remove(existing_entry.created_at, entry.id)
+        
+        self.payroll[entry.id] = entry
+        self.payroll_by_time.add(entry.created_at, entry.id)
+        self._notify("payroll_saved", existing_entry, entry)
+        return entry
+    
+    def delete_payroll_entry(self, payroll_id: int) -> Optional[PayrollEntry]:
+        """Remove a payroll entry and its time index entry"""
+        entry = self.payroll.pop(payroll_id, None)
+        if entry is not None:
+            self.payroll_by_time.remove(entry.created_at, payroll_id)
+            self._notify("payroll_deleted", entry)
+        return entry
+    
+    def sales_between(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> Iterator[Sale]:
+        """Sales created within [start, end], oldest first"""
+        return self.sales.between(start, end)
+    
+    def purchases_between(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> Iterator[Purchase]:
+        """Purchases created within [start, end], oldest first"""
+        return self.purchases.between(start, end)
+    
+    def payroll_between(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> Iterator[PayrollEntry]:
+        """Payroll entries created within [start, end], oldest first"""
+        return (self.payroll[payroll_id] for payroll_id in self.payroll_by_time.ids_between(start, end))
+    
+    def iter_record_ids(self, table: str, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                        after: Optional[Tuple[datetime, int]] = None) -> Iterator[int]:
+        return self.time_indexes[table].iter_ids(start, end, after)
+    
+    def iter_ledger_lines(self, table: str, start: Optional[datetime] = None,
+                          end: Optional[datetime] = None) -> Iterator[tuple]:
+        return getattr(self, table).iter_lines(start, end)
+    
+    def iter_records(self, table: str, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                     after: Optional[Tuple[datetime, int]] = None, filters: Optional[Dict[str, str]] = None) -> Iterator:
+        records = getattr(self, table)
+        for record_id in self.time_indexes[table].iter_ids(start, end, after):
+            record = records.get(record_id)
+            # Skip records deleted while the caller was streaming
+            if record is None:
+                continue
+            if filters and not matches_filters(record, filters):
+                continue
+            yield record
+    
+    def financial_totals(self, start: datetime, end: datetime) -> Tuple[float, float]:
+        return self.reports.financial_totals(start, end)
+    
+    def sales_totals(self, start: datetime, end: datetime) -> Tuple[int, float]:
+        return self.reports.sales_totals(start, end)
+    
+    def top_selling_items(self, start: datetime, end: datetime, limit: int) -> List[Tuple[int, str, int]]:
+        top = self.top_sellers.top(start, end, limit, self.sales.quantity_by_item_between)
+        return [(item_id, self._item_name(item_id), quantity) for item_id, quantity in top]
+    
+    def _item_name(self, item_id: int) -> str:
+        item = self.inventory.get(item_id)
+        return item.name if item is not None else self.top_sellers.item_names[item_id]
+    
+    def low_stock_items(self) -> List[InventoryItem]:
+        return self.low_stock.low_stock_items()
+    
+    def table_sizes(self) -> Dict[str, int]:
+        return {"users": len(self.users), "inventory": len(self.inventory), "sales": len(self.sales),
+                "purchases": len(self.purchases), "payroll": len(self.payroll)}
+    
+    def inventory_summary(self) -> Tuple[int, float, List[InventoryItem]]:
+        return self.aggregates.inventory_items, self.aggregates.inventory_value, self.low_stock_items()
+    
+    def dashboard_stats(self, now: datetime) -> dict:
+        return self.aggregates.dashboard_stats(now)
+    
+    def rollup_buckets(self, level: str, first_key: str, last_key: str) -> Dict[str, BucketTotals]:
+        return self.rollups.fetch(level, first_key, last_key)
+
+def matches_filters(record, filters: Dict[str, str]) -> bool:
+    """Case-insensitive equality on every filtered field"""
+    for field, value in filters.items():
+        field_value = getattr(record, field)
+        if isinstance(field_value, Enum):
+            field_value = field_value.value
+        if str(field_value).lower() != value.lower():
+            return False
+    return True
+
+def create_database() -> StorageBackend:
+    """Create the storage engine selected by DATABASE_BACKEND"""
+    if DATABASE_BACKEND == "sqlite":
+        from sqlite_storage import SQLiteDB
+        return SQLiteDB(SQLITE_PATH)
+    if DATABASE_BACKEND != "memory":
+        raise ValueError(f"Unknown DATABASE_BACKEND: {DATABASE_BACKEND}")
+    
+    memory_db = InMemoryDB()
+    if JOURNAL_DIR:
+        from journal import Journal
+        Journal.open(memory_db, JOURNAL_DIR)
+    return memory_db
 
 # Global database instance
-db = InMemoryDB()
+db = create_database()
 
 def initialize_database():
     """Initialize the database with default admin user"""
-    # Create default admin user
-    admin_user = User(
-        id=db.get_next_user_id(),
-        username="admin",
-        email="admin@company.com",
-        full_name="System Administrator",
-        role=UserRole.MANAGER,
-        is_active=True,
-        created_at=datetime.now()
-    )
+    # Persistent backends keep the admin user across restarts
+    if db.find_user_by_username("admin"):
+        print("Database opened with existing admin user: admin")
+        return
     
-    # Store user with hashed password
-    db.users[admin_user.id] = admin_user
-    # Store password separately (in production, this would be in the user record)
-    if not hasattr(db, 'user_passwords'):
-        db.user_passwords = {}
-    db.user_passwords[admin_user.username] = get_password_hash("admin123")
+    hashed_password = get_password_hash("admin123")
+    
+    # Worker processes sharing one store start together; only the first creates the admin
+    with db.transaction():
+        if db.find_user_by_username("admin"):
+            print("Database opened with existing admin user: admin")
+            return
+        
+        # Create default admin user
+        admin_user = User(
+            id=db.get_next_user_id(),
+            username="admin",
+            email="admin@company.com",
+            full_name="System Administrator",
+            role=UserRole.MANAGER,
+            is_active=True,
+            created_at=datetime.now()
+        )
+        
+        # Store user with hashed password
+        db.add_user(admin_user)
+        # Store password separately (in production, this would be in the user record)
+        db.set_user_password(admin_user.username, hashed_password)
     
     print(f"Database initialized with admin user: {admin_user.username}")
 
@@ -71,17 +478,18 @@ def get_database():
 # User database functions
 def get_user_by_username(username: str) -> Optional[User]:
     """Get user by username"""
-    for user in db.users.values():
-        if user.username == username:
-            return user
-    return None
+    return db.find_user_by_username(username)
 
 def get_user_by_id(user_id: int) -> Optional[User]:
     """Get user by ID"""
     return db.users.get(user_id)
 
+def get_inventory_item_by_sku(sku: str) -> Optional[InventoryItem]:
+    """Get inventory item by SKU"""
+    return db.find_inventory_item_by_sku(sku)
+
 def create_user(user_data: dict) -> User:
-    """Create a new user"""
+    """Create a new user (the password must already be hashed)"""
     user_id = db.get_next_user_id()
     user = User(
         id=user_id,
@@ -93,21 +501,25 @@ def create_user(user_data: dict) -> User:
         created_at=datetime.now()
     )
     
-    db.users[user_id] = user
-    if not hasattr(db, 'user_passwords'):
-        db.user_passwords = {}
-    db.user_passwords[user.username] = get_password_hash(user_data["password"])
+    db.add_user(user)
+    db.set_user_password(user.username, user_data["hashed_password"])
     
     return user
 
 def verify_user_password(username: str, password: str) -> bool:
     """Verify user password"""
-    if not hasattr(db, 'user_passwords'):
-        return False
-    
-    hashed_password = db.user_passwords.get(username)
+    hashed_password = db.get_user_password(username)
     if not hashed_password:
         return False
     
     from auth import verify_password
     return verify_password(password, hashed_password)
+
+async def verify_user_password_async(username: str, password: str) -> bool:
+    """Verify user password without blocking the event loop"""
+    hashed_password = db.get_user_password(username)
+    if not hashed_password:
+        return False
+    
+    from auth import verify_password_async
+    return await verify_password_async(password, hashed_password)
@@ -0,0 +1,285 @@
+import asyncio
+import itertools
+import os
+import threading
+from datetime import datetime
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+from models import InventoryItem, Sale, Purchase, PayrollEntry
+from listeners import DatabaseListener
+from aggregates import is_low_stock
+from database import get_database
+from fast_json import dumps
+from rollups import bucket_key
+
+SSE_HEARTBEAT_SECONDS = float(os.environ.get("SSE_HEARTBEAT_SECONDS", "15"))
+# Events buffered per subscriber; a client that falls further behind is disconnected
+EVENT_QUEUE_SIZE = int(os.environ.get("EVENT_QUEUE_SIZE", "1000"))
+
+DASHBOARD_TOPIC = "dashboard"
+LOW_STOCK_TOPIC = "low-stock"
+TOPICS = (DASHBOARD_TOPIC, LOW_STOCK_TOPIC)
+
+class Event(NamedTuple):
+    id: int
+    topic: str
+    data: bytes
+
+def format_event(topic: str, data: bytes, event_id: Optional[int] = None) -> bytes:
+    """One server-sent event; ``data`` is compact JSON, so it has no newlines"""
+    head = b"id: %d\n" % event_id if event_id is not None else b""
+    return head + b"event: " + topic.encode() + b"\ndata: " + data + b"\n\n"
+
+class Subscription:
+    """A subscriber's event queue, owned by the event loop that subscribed"""
+    
+    def __init__(self, topics: Optional[frozenset], max_queue: int):
+        self.topics = topics
+        self.loop = asyncio.get_running_loop()
+        self.queue: asyncio.Queue = asyncio.Queue(max_queue)
+        self.overflowed = False
+    
+    def wants(self, topic: str) -> bool:
+        return self.topics is None or topic in self.topics
+    
+    def _put(self, event: Event):
+        # Runs on the subscriber's loop
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Rather than silently skip events, end the stream; clients reconnect and resync
+            self.overflowed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+class EventHub:
+    """In-process publish/subscribe from database listeners to streaming responses.
+    
+    ``publish`` may be called from any thread (listeners run inside the
+    mutating call); each event is serialized once, only if someone is
+    subscribed to its topic, and handed to the subscribers' loops.
+    """
+    
+    def __init__(self, max_queue: int = EVENT_QUEUE_SIZE):
+        self.max_queue = max_queue
+        self._subscriptions: Set[Subscription] = set()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+    
+    def __len__(self) -> int:
+        return len(self._subscriptions)
+    
+    def subscribe(self, topics: Optional[Iterable[str]] = None) -> Subscription:
+        """Start receiving ``topics`` (all topics if None); call from the event loop"""
+        subscription = Subscription(frozenset(topics) if topics is not None else None, self.max_queue)
+        with self._lock:
+            self._subscriptions.add(subscription)
+        return subscription
+    
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+    
+    def has_subscribers(self, topic: str) -> bool:
+        """Lets publishers skip building payloads nobody will receive"""
+        return any(subscription.wants(topic) for subscription in list(self._subscriptions))
+    
+    def publish(self, topic: str, data: Any):
+        with self._lock:
+            subscribers = [subscription for subscription in self._subscriptions if subscription.wants(topic)]
+            if not subscribers:
+                return
+            event = Event(next(self._ids), topic, dumps(data))
+        
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription._put, event)
+            except RuntimeError:
+                # The subscriber's loop has shut down
+                self.unsubscribe(subscription)
+
+# Shared by every streaming endpoint of this process
+event_hub = EventHub()
+
+def snapshot_events(db, topics: Iterable[str], now: Optional[datetime] = None) -> List[Tuple[str, Any]]:
+    """The current state each topic's incremental events apply to"""
+    events = []
+    for topic in topics:
+        if topic == DASHBOARD_TOPIC:
+            now = now or datetime.now()
+            events.append((topic, {"type": "snapshot", "month": bucket_key(now, "month"), "stats": db.dashboard_stats(now)}))
+        elif topic == LOW_STOCK_TOPIC:
+            events.append((topic, {"type": "snapshot", "items": db.low_stock_items()}))
+    return events
+
+def event_stream(request: Request, topics: Optional[Iterable[str]] = None,
+                 snapshot: Callable[[], Iterable[Tuple[str, Any]]] = lambda: (),
+                 hub: EventHub = event_hub) -> StreamingResponse:
+    """Server-sent events response for ``topics``.
+    
+    ``snapshot`` gives (topic, data) events describing the current state;
+    they are sent first, taken after subscribing so no change is missed in
+    between. A comment line goes out every SSE_HEARTBEAT_SECONDS to keep
+    proxies from timing out the connection.
+    """
+    async def stream() -> AsyncIterator[bytes]:
+        subscription = hub.subscribe(topics)
+        try:
+            yield b"retry: 5000\n\n"
+            for topic, data in snapshot():
+                yield format_event(topic, dumps(data))
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), SSE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    # Writes by other worker processes reach this process's listeners through sync()
+                    get_database().sync()
+                    yield b": keepalive\n\n"
+                    continue
+                if event is None:
+                    return
+                yield format_event(event.topic, event.data, event.id)
+        finally:
+            hub.unsubscribe(subscription)
+    
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+class LowStockAlerts(DatabaseListener):
+    """Publishes inventory items crossing their reorder level.
+    
+    Events on LOW_STOCK_TOPIC are {"type": "low" | "restocked" | "removed",
+    "item": item}. Changes made by other worker processes are found by
+    diffing the low-stock set when ``table_changed`` reports them.
+    """
+    
+    def __init__(self, db, hub: EventHub = event_hub):
+        self.db = db
+        self.hub = hub
+        self.low: Dict[int, InventoryItem] = {item.id: item for item in db.low_stock_items()}
+    
+    def _publish(self, kind: str, item: InventoryItem):
+        self.hub.publish(LOW_STOCK_TOPIC, {"type": kind, "item": item})
+    
+    def inventory_saved(self, old: Optional[InventoryItem], new: InventoryItem):
+        if is_low_stock(new):
+            was_low = new.id in self.low
+            self.low[new.id] = new
+            if not was_low:
+                self._publish("low", new)
+        elif self.low.pop(new.id, None) is not None:
+            self._publish("restocked", new)
+    
+    def inventory_deleted(self, item: InventoryItem):
+        if self.low.pop(item.id, None) is not None:
+            self._publish("removed", item)
+    
+    def table_changed(self, table: str):
+        if table != "inventory":
+            return
+        current = {item.id: item for item in self.db.low_stock_items()}
+        for item_id in self.low.keys() - current.keys():
+            item = self.db.inventory.get(item_id)
+            if item is None:
+                self._publish("removed", self.low[item_id])
+            else:
+                self._publish("restocked", item)
+        for item_id in current.keys() - self.low.keys():
+            self._publish("low", current[item_id])
+        self.low = current
+
+def record_summary(record) -> dict:
+    """The fields of a sale or purchase the dashboard's recent activity shows"""
+    party = "customer_name" if isinstance(record, Sale) else "supplier_name"
+    return {"id": record.id, party: getattr(record, party), "total_amount": record.total_amount,
+            "created_at": record.created_at}
+
+class DashboardFeed(DatabaseListener):
+    """Publishes dashboard changes as deltas on DASHBOARD_TOPIC.
+    
+    Each event is {"type": ..., "deltas": [...]} where every delta adds its
+    numbers to the matching dashboard-stats fields; deltas with a "month"
+    ("YYYY-MM") apply only to that month's figures. Sales and purchases
+    carry a "record" summary for recent activity, and payroll events the
+    new "totals" that are not sums. Another worker's writes only say the
+    table changed, so they are sent as {"type": "resync"}.
+    """
+    
+    def __init__(self, db, hub: EventHub = event_hub):
+        self.db = db
+        self.hub = hub
+    
+    def _publish(self, kind: str, deltas: List[dict], **extra):
+        self.hub.publish(DASHBOARD_TOPIC, {"type": kind, "deltas": deltas, **extra})
+    
+    def _transaction(self, kind: str, record, sign: int):
+        if not self.hub.has_subscribers(DASHBOARD_TOPIC):
+            return
+        amount = sign * record.total_amount
+        delta = {"month": bucket_key(record.created_at, "month")}
+        if isinstance(record, Sale):
+            delta.update(monthly_sales=sign, monthly_revenue=amount, monthly_profit=amount)
+        else:
+            delta.update(monthly_expenses=amount, monthly_profit=-amount)
+        self._publish(kind, [delta], record=record_summary(record))
+    
+    def sale_added(self, sale: Sale):
+        self._transaction("sale_added", sale, 1)
+    
+    def sale_deleted(self, sale: Sale):
+        self._transaction("sale_deleted", sale, -1)
+    
+    def purchase_added(self, purchase: Purchase):
+        self._transaction("purchase_added", purchase, 1)
+    
+    def purchase_deleted(self, purchase: Purchase):
+        self._transaction("purchase_deleted", purchase, -1)
+    
+    def _payroll(self, kind: str, old: Optional[PayrollEntry], new: Optional[PayrollEntry]):
+        if not self.hub.has_subscribers(DASHBOARD_TOPIC):
+            return
+        deltas = []
+        for entry, sign in ((old, -1), (new, 1)):
+            if entry is not None:
+                amount = sign * entry.gross_pay
+                deltas.append({"month": bucket_key(entry.created_at, "month"),
+                               "monthly_expenses": amount, "monthly_profit": -amount})
+        total_employees = self.db.dashboard_stats(datetime.now())["total_employees"]
+        self._publish(kind, deltas, totals={"total_employees": total_employees})
+    
+    def payroll_saved(self, old: Optional[PayrollEntry], new: PayrollEntry):
+        self._payroll("payroll_saved", old, new)
+    
+    def payroll_deleted(self, entry: PayrollEntry):
+        self._payroll("payroll_deleted", entry, None)
+    
+    def _inventory(self, kind: str, old: Optional[InventoryItem], new: Optional[InventoryItem]):
+        if not self.hub.has_subscribers(DASHBOARD_TOPIC):
+            return
+        delta = {"total_inventory_items": 0, "total_inventory_value": 0.0, "low_stock_items": 0}
+        for item, sign in ((old, -1), (new, 1)):
+            if item is not None:
+                delta["total_inventory_items"] += sign
+                delta["total_inventory_value"] += sign * item.quantity_in_stock * item.unit_price
+                delta["low_stock_items"] += sign * is_low_stock(item)
+        item = new or old
+        self._publish(kind, [delta], item={"id": item.id, "name": item.name, "quantity_in_stock": item.quantity_in_stock})
+    
+    def inventory_saved(self, old: Optional[InventoryItem], new: InventoryItem):
+        self._inventory("inventory_saved", old, new)
+    
+    def inventory_deleted(self, item: InventoryItem):
+        self._inventory("inventory_deleted", item, None)
+    
+    def table_changed(self, table: str):
+        if table in ("inventory", "sales", "purchases", "payroll") and self.hub.has_subscribers(DASHBOARD_TOPIC):
+            self._publish("resync", [])
@@ -0,0 +1,145 @@
+import csv
+import io
+import os
+import zlib
+from datetime import datetime
+from itertools import islice
+from typing import Iterable, Iterator, List, Optional, Sequence
+from fastapi.responses import StreamingResponse
+from storage import LEDGER_COLUMNS
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # Without the "parquet" extra only CSV is offered
+    pyarrow = None
+
+# Parquet is only offered when the "parquet" extra (pyarrow) is installed
+EXPORT_FORMATS = ("csv", "parquet") if pyarrow is not None else ("csv",)
+EXPORT_FORMAT_PATTERN = f"^({'|'.join(EXPORT_FORMATS)})$"
+
+# Bytes of output gathered per streamed chunk
+EXPORT_CHUNK_BYTES = int(os.environ.get("EXPORT_CHUNK_BYTES", str(64 * 1024)))
+# Line items per Parquet row group, which bounds the memory a Parquet export holds
+PARQUET_ROW_GROUP_ROWS = int(os.environ.get("PARQUET_ROW_GROUP_ROWS", "65536"))
+
+def csv_chunks(columns: Sequence[str], rows: Iterable[tuple], chunk_size: int = EXPORT_CHUNK_BYTES) -> Iterator[bytes]:
+    """CSV with a header row, in chunks of about ``chunk_size`` bytes; datetimes are written as ISO 8601"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(columns)
+    time_columns = [index for index, column in enumerate(columns) if column == "created_at"]
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, 1000))
+        if not batch:
+            break
+        if time_columns:
+            batch = [list(row) for row in batch]
+            for row in batch:
+                for index in time_columns:
+                    row[index] = row[index].isoformat()
+        writer.writerows(batch)
+        if buffer.tell() >= chunk_size:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+class _ChunkSink:
+    """Write-only file the Parquet writer fills; drained after every row group"""
+    
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.position = 0
+        self.closed = False
+    
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+    
+    def tell(self) -> int:
+        return self.position
+    
+    def flush(self):
+        pass
+    
+    def close(self):
+        self.closed = True
+    
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+def parquet_type(column: str):
+    if column == "created_at":
+        return pyarrow.timestamp("us")
+    if column.endswith("_id") or column in ("created_by", "quantity"):
+        return pyarrow.int64()
+    if column in ("total_amount", "unit_price", "unit_cost"):
+        return pyarrow.float64()
+    return pyarrow.string()
+
+def parquet_chunks(columns: Sequence[str], rows: Iterable[tuple], compression: str = "snappy",
+                   row_group_rows: int = PARQUET_ROW_GROUP_ROWS) -> Iterator[bytes]:
+    """A Parquet file written and sent one row group at a time (the footer comes last)"""
+    schema = pyarrow.schema([(column, parquet_type(column)) for column in columns])
+    sink = _ChunkSink()
+    writer = pyarrow.parquet.ParquetWriter(sink, schema, compression=compression)
+    rows = iter(rows)
+    try:
+        while True:
+            batch = list(islice(rows, row_group_rows))
+            if not batch:
+                break
+            writer.write_table(pyarrow.Table.from_arrays(
+                [pyarrow.array(values, type=field.type) for values, field in zip(zip(*batch), schema)],
+                schema=schema
+            ))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+def gzip_chunks(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Compress a stream on the fly into a single gzip member"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+def ledger_export(db, table: str, format: str, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                  gzip: bool = False) -> StreamingResponse:
+    """Stream the line items of ``table`` as a CSV or Parquet file download.
+    
+    Rows come from ``db.iter_ledger_lines`` and are encoded as they are
+    read, so memory use does not grow with the ledger. ``gzip`` compresses
+    CSV on the fly (a .csv.gz file); Parquet uses it as its column codec.
+    """
+    columns = LEDGER_COLUMNS[table]
+    rows = db.iter_ledger_lines(table, start, end)
+    filename = table
+    
+    if format == "parquet":
+        chunks = parquet_chunks(columns, rows, compression="gzip" if gzip else "snappy")
+        media_type = "application/vnd.apache.parquet"
+        filename += ".parquet"
+    else:
+        chunks = csv_chunks(columns, rows)
+        media_type = "text/csv"
+        filename += ".csv"
+        if gzip:
+            chunks = gzip_chunks(chunks)
+            media_type = "application/gzip"
+            filename += ".gz"
+    
+    return StreamingResponse(
+        chunks,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
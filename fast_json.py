@@ -0,0 +1,144 @@
+import json
+import os
+import threading
+from collections import Counter, OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Iterator, Optional, Tuple
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from models import User, InventoryItem, Sale, Purchase, PayrollEntry
+from listeners import DatabaseListener
+
+try:
+    import orjson
+except ImportError:  # Falls back to the standard library encoder
+    orjson = None
+
+# Opt-in: serve list endpoints from pre-serialized record bytes, without response_model re-validation
+FAST_JSON = os.environ.get("FAST_JSON", "0") == "1"
+RECORD_JSON_CACHE_BYTES = int(os.environ.get("RECORD_JSON_CACHE_BYTES", str(64 * 2 ** 20)))
+
+RecordKey = Tuple[datetime, int]
+
+def dumps(content: Any) -> bytes:
+    """Serialize plain data (dicts, lists, models) to compact JSON bytes"""
+    if isinstance(content, BaseModel):
+        return content.model_dump_json().encode()
+    if orjson is not None:
+        return orjson.dumps(content, default=jsonable_encoder)
+    return json.dumps(jsonable_encoder(content), ensure_ascii=False, separators=(",", ":")).encode()
+
+def record_json(record: BaseModel) -> bytes:
+    """A stored model's JSON, straight from its serializer; it was validated when saved"""
+    return type(record).__pydantic_serializer__.to_json(record)
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson when installed; bytes are sent as they are"""
+    
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return dumps(content)
+
+class RecordJSONCache(DatabaseListener):
+    """LRU cache of serialized records, keyed by (table, id) and capped by total bytes.
+    
+    Completed sales and purchases never change, so their bytes stay valid
+    until deleted; records of mutable tables are evicted whenever saved.
+    Entries keep the record's created_at so list pages can build cursors
+    without loading the record again.
+    """
+    
+    def __init__(self, max_bytes: int = RECORD_JSON_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        # Bumped on every eviction, so a record read before a concurrent save is not cached
+        self.versions: Counter = Counter()
+        self._entries: "OrderedDict[Tuple[str, int], Tuple[datetime, bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def get(self, table: str, record_id: int) -> Optional[Tuple[datetime, bytes]]:
+        with self._lock:
+            entry = self._entries.get((table, record_id))
+            if entry is not None:
+                self._entries.move_to_end((table, record_id))
+            return entry
+    
+    def put(self, table: str, record, version: Optional[int] = None) -> Tuple[datetime, bytes]:
+        """Serialize and cache a record read while ``table`` was at ``version``"""
+        entry = (record.created_at, record_json(record))
+        with self._lock:
+            if version is not None and self.versions[table] != version:
+                return entry
+            previous = self._entries.pop((table, record.id), None)
+            if previous is not None:
+                self.size -= len(previous[1])
+            self._entries[(table, record.id)] = entry
+            self.size += len(entry[1])
+            while self.size > self.max_bytes and self._entries:
+                _, (_, body) = self._entries.popitem(last=False)
+                self.size -= len(body)
+        return entry
+    
+    def evict(self, table: str, record_id: int):
+        with self._lock:
+            self.versions[table] += 1
+            entry = self._entries.pop((table, record_id), None)
+            if entry is not None:
+                self.size -= len(entry[1])
+    
+    def records(self, db, table: str, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                after: Optional[RecordKey] = None, filters: Optional[Dict[str, str]] = None) -> Iterator[Tuple[RecordKey, bytes]]:
+        """((created_at, id), JSON bytes) in list order, same selection as ``db.iter_records``"""
+        if filters:
+            # Filters need the record itself; only cached serialization is saved
+            for record in db.iter_records(table, start, end, after, filters):
+                entry = self.get(table, record.id)
+                yield (record.created_at, record.id), entry[1] if entry is not None else record_json(record)
+            return
+        
+        records = getattr(db, table)
+        for record_id in db.iter_record_ids(table, start, end, after):
+            entry = self.get(table, record_id)
+            if entry is None:
+                version = self.versions[table]
+                record = records.get(record_id)
+                # Skip records deleted while the caller was streaming
+                if record is None:
+                    continue
+                entry = self.put(table, record, version)
+            yield (entry[0], record_id), entry[1]
+    
+    # Listener callbacks
+    
+    def user_saved(self, old: Optional[User], new: User):
+        self.evict("users", new.id)
+    
+    def inventory_saved(self, old: Optional[InventoryItem], new: InventoryItem):
+        self.evict("inventory", new.id)
+    
+    def inventory_deleted(self, item: InventoryItem):
+        self.evict("inventory", item.id)
+    
+    def sale_deleted(self, sale: Sale):
+        self.evict("sales", sale.id)
+    
+    def purchase_deleted(self, purchase: Purchase):
+        self.evict("purchases", purchase.id)
+    
+    def payroll_saved(self, old: Optional[PayrollEntry], new: PayrollEntry):
+        self.evict("payroll", new.id)
+    
+    def payroll_deleted(self, entry: PayrollEntry):
+        self.evict("payroll", entry.id)
+    
+    def table_changed(self, table: str):
+        # Another worker changed the table; we cannot tell which records
+        with self._lock:
+            self.versions[table] += 1
+            for key in [key for key in self._entries if key[0] == table]:
+                self.size -= len(self._entries.pop(key)[1])
@@ -0,0 +1,380 @@
+import heapq
+import threading
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime
+from itertools import repeat
+from typing import Dict, Iterator, List, NamedTuple, Optional, Set, Tuple
+from models import Sale, Purchase, PayrollEntry, TransactionType
+from listeners import DatabaseListener
+
+class Account(NamedTuple):
+    code: str
+    name: str
+    type: str
+
+# Chart of accounts. Inventory is expensed when bought (periodic system), as the
+# financial summary does, so purchases go straight to the Purchases account.
+CASH = "1000"
+PAYROLL_LIABILITIES = "2100"
+RETAINED_EARNINGS = "3000"
+SALES_REVENUE = "4000"
+PURCHASES = "5000"
+WAGES_EXPENSE = "6000"
+
+ACCOUNTS: Dict[str, Account] = {
+    account.code: account for account in (
+        Account(CASH, "Cash", "asset"),
+        Account(PAYROLL_LIABILITIES, "Payroll Deductions Payable", "liability"),
+        Account(RETAINED_EARNINGS, "Retained Earnings", "equity"),
+        Account(SALES_REVENUE, "Sales Revenue", "revenue"),
+        Account(PURCHASES, "Purchases", "expense"),
+        Account(WAGES_EXPENSE, "Wages Expense", "expense"),
+    )
+}
+
+# Account types whose balance is normally a debit; the others are normally credits
+DEBIT_TYPES = ("asset", "expense")
+
+# A posting line: (account code, amount), debits positive and credits negative
+Posting = Tuple[str, float]
+
+def sale_postings(total_amount: float) -> List[Posting]:
+    return [(CASH, total_amount), (SALES_REVENUE, -total_amount)]
+
+def purchase_postings(total_amount: float) -> List[Posting]:
+    return [(PURCHASES, total_amount), (CASH, -total_amount)]
+
+def payroll_postings(gross_pay: float, net_pay: float) -> List[Posting]:
+    # Gross pay is the expense; what is withheld is owed to others until paid over
+    return [
+        (WAGES_EXPENSE, gross_pay),
+        (CASH, -net_pay),
+        (PAYROLL_LIABILITIES, net_pay - gross_pay)
+    ]
+
+# Per ledger table, the record fields its postings are built from
+TABLE_POSTINGS = {
+    "sales": (("total_amount",), sale_postings),
+    "purchases": (("total_amount",), purchase_postings),
+    "payroll": (("gross_pay", "net_pay"), payroll_postings),
+}
+
+def record_amounts(table: str, record) -> Tuple[float, ...]:
+    return tuple(getattr(record, field) for field in TABLE_POSTINGS[table][0])
+
+def record_postings(table: str, record) -> List[Posting]:
+    return TABLE_POSTINGS[table][1](*record_amounts(table, record))
+
+def month_number(moment: datetime) -> int:
+    return moment.year * 12 + moment.month - 1
+
+def month_key(number: int) -> str:
+    return f"{number // 12:04d}-{number % 12 + 1:02d}"
+
+def journal_entry(kind: TransactionType, record) -> dict:
+    """One balanced journal entry for a sale, purchase or payroll entry"""
+    if kind == TransactionType.SALE:
+        postings, description = record_postings("sales", record), f"Sale to {record.customer_name}"
+    elif kind == TransactionType.PURCHASE:
+        postings, description = record_postings("purchases", record), f"Purchase from {record.supplier_name}"
+    else:
+        postings, description = record_postings("payroll", record), f"Payroll for {record.employee_name}"
+    return {
+        "type": kind.value,
+        "reference": record.id,
+        "date": record.created_at,
+        "description": description,
+        "lines": [
+            {"account": account, "name": ACCOUNTS[account].name,
+             "debit": max(0.0, amount), "credit": max(0.0, -amount)}
+            for account, amount in postings
+        ]
+    }
+
+def iter_journal(db, start: Optional[datetime] = None, end: Optional[datetime] = None) -> Iterator[dict]:
+    """Journal entries of the records created within [start, end] in date order, derived from the tables"""
+    def entries(table: str, kind: TransactionType):
+        for record in db.iter_records(table, start, end):
+            yield record.created_at, kind, record
+    
+    streams = [entries("sales", TransactionType.SALE), entries("purchases", TransactionType.PURCHASE),
+               entries("payroll", TransactionType.EXPENSE)]
+    for _, kind, record in heapq.merge(*streams, key=lambda entry: entry[0]):
+        yield journal_entry(kind, record)
+
+class PostedRecords:
+    """Month and amounts of each record a ledger table has posted, in typed columns indexed by id.
+    
+    Ids are allocated in sequence, so the columns stay dense: a record costs
+    a 4-byte month plus 8 bytes per amount, and its postings are rebuilt from
+    them when it has to be reversed.
+    """
+    
+    def __init__(self, width: int):
+        # Month number + 1, or 0 where the id has nothing posted
+        self.months = array("i")
+        self.amounts = [array("d") for _ in range(width)]
+        self.count = 0
+    
+    def __len__(self) -> int:
+        return self.count
+    
+    def __contains__(self, record_id: int) -> bool:
+        return record_id < len(self.months) and self.months[record_id] != 0
+    
+    def get(self, record_id: int) -> Optional[Tuple[int, Tuple[float, ...]]]:
+        if record_id not in self:
+            return None
+        return self.months[record_id] - 1, tuple(column[record_id] for column in self.amounts)
+    
+    def put(self, record_id: int, month: int, amounts: Tuple[float, ...]):
+        missing = record_id + 1 - len(self.months)
+        if missing > 0:
+            self.months.extend(repeat(0, missing))
+            for column in self.amounts:
+                column.extend(repeat(0.0, missing))
+        if not self.months[record_id]:
+            self.count += 1
+        self.months[record_id] = month + 1
+        for column, amount in zip(self.amounts, amounts):
+            column[record_id] = amount
+    
+    def pop(self, record_id: int) -> Optional[Tuple[int, Tuple[float, ...]]]:
+        entry = self.get(record_id)
+        if entry is not None:
+            self.months[record_id] = 0
+            self.count -= 1
+        return entry
+    
+    def ids(self) -> List[int]:
+        return [record_id for record_id, month in enumerate(self.months) if month]
+
+class GeneralLedger(DatabaseListener):
+    """Net balance per account and calendar month, posted as records change.
+    
+    Adding a record posts its entry in the month it was created; deleting
+    it posts the reversal in the same month, so closed months stay in line
+    with the financial reports. Each (month, account) keeps [posting count,
+    net amount] and is dropped when the count returns to zero, so no float
+    residue is left behind. Rows other workers add are read above an id
+    high-water mark and their deletions found by row count; payroll entries
+    are also edited in place, so a payroll change elsewhere re-reads payroll.
+    The tables are only reposted on the first read.
+    """
+    
+    def __init__(self, db):
+        self.db = db
+        self.periods: Dict[str, Dict[str, List]] = {}
+        # Sorted month keys ("YYYY-MM"), for range sums
+        self.period_keys: List[str] = []
+        # What each table has posted, to reverse rows deleted or edited elsewhere
+        self.posted = {table: PostedRecords(len(fields)) for table, (fields, _) in TABLE_POSTINGS.items()}
+        # Highest id read back from each table; local writes do not raise it, so a row
+        # another worker committed just before one of ours is still read
+        self.high_water = {table: 0 for table in TABLE_POSTINGS}
+        # Tables another worker changed since they were last read
+        self.pending: Set[str] = set()
+        self.stale = True
+        self.lock = threading.RLock()
+    
+    def _post(self, month: int, postings: List[Posting], sign: int):
+        key = month_key(month)
+        balances = self.periods.get(key)
+        if balances is None:
+            balances = self.periods[key] = {}
+            insort(self.period_keys, key)
+        for account, amount in postings:
+            balance = balances.get(account)
+            if balance is None:
+                balance = balances[account] = [0, 0.0]
+            balance[0] += sign
+            balance[1] += sign * amount
+            if balance[0] == 0:
+                del balances[account]
+        if not balances:
+            del self.periods[key]
+            del self.period_keys[bisect_left(self.period_keys, key)]
+    
+    def _add(self, table: str, record):
+        posted = self.posted[table]
+        if record.id not in posted:
+            month, amounts = month_number(record.created_at), record_amounts(table, record)
+            posted.put(record.id, month, amounts)
+            self._post(month, TABLE_POSTINGS[table][1](*amounts), 1)
+    
+    def _remove(self, table: str, record_id: int, record=None):
+        """Reverse what is posted under ``record_id``: from ``record`` when known, else from the stored amounts"""
+        entry = self.posted[table].pop(record_id)
+        if entry is None:
+            return
+        if record is not None:
+            self._post(month_number(record.created_at), record_postings(table, record), -1)
+        else:
+            month, amounts = entry
+            self._post(month, TABLE_POSTINGS[table][1](*amounts), -1)
+    
+    def rebuild(self):
+        """Repost every sale, purchase and payroll entry"""
+        with self.lock:
+            self.periods = {}
+            self.period_keys = []
+            self.posted = {table: PostedRecords(len(fields)) for table, (fields, _) in TABLE_POSTINGS.items()}
+            self.pending = set()
+            for table in TABLE_POSTINGS:
+                for record in self.db.iter_records(table):
+                    self._add(table, record)
+                self.high_water[table] = max(self.posted[table].ids(), default=0)
+            self.stale = False
+    
+    def _catch_up(self):
+        """Post what other workers changed: new rows, deletions and edited payroll entries"""
+        if self.stale:
+            self.rebuild()
+            return
+        if not self.pending:
+            return
+        tables, self.pending = self.pending, set()
+        for table in TABLE_POSTINGS:
+            if table not in tables:
+                continue
+            posted = self.posted[table]
+            if table == "payroll":
+                # Edits keep the id and the row count, so compare every entry
+                live = set()
+                for entry in self.db.iter_records("payroll"):
+                    live.add(entry.id)
+                    if posted.get(entry.id) != (month_number(entry.created_at), record_amounts("payroll", entry)):
+                        self._remove("payroll", entry.id)
+                        self._add("payroll", entry)
+                    self.high_water["payroll"] = max(self.high_water["payroll"], entry.id)
+            else:
+                for record in self.db.iter_records_after_id(table, self.high_water[table]):
+                    self._add(table, record)
+                    self.high_water[table] = record.id
+                # Only a deletion leaves fewer rows than this ledger knows of
+                if len(getattr(self.db, table)) == len(posted):
+                    continue
+                live = set(getattr(self.db, table))
+            for record_id in [record_id for record_id in posted.ids() if record_id not in live]:
+                self._remove(table, record_id)
+    
+    def balances(self, first: Optional[str] = None, last: Optional[str] = None) -> Dict[str, float]:
+        """Net (debit positive) balance per account over the months in [first, last]"""
+        with self.lock:
+            self._catch_up()
+            low = 0 if first is None else bisect_left(self.period_keys, first)
+            high = len(self.period_keys) if last is None else bisect_right(self.period_keys, last)
+            totals: Dict[str, float] = {}
+            for key in self.period_keys[low:high]:
+                for account, (_, amount) in self.periods[key].items():
+                    totals[account] = totals.get(account, 0.0) + amount
+            return totals
+    
+    # Listener callbacks; while stale, the coming rebuild reads these changes from the database.
+    # Posting is idempotent by id, so rows a catch-up reads again are not posted twice.
+    
+    def _apply(self, table: str, added=None, removed=None, removed_id: Optional[int] = None):
+        with self.lock:
+            if not self.stale:
+                if removed_id is not None:
+                    self._remove(table, removed_id, removed)
+                if added is not None:
+                    self._add(table, added)
+    
+    def sale_added(self, sale: Sale):
+        self._apply("sales", added=sale)
+    
+    def sale_deleted(self, sale: Sale):
+        self._apply("sales", removed=sale, removed_id=sale.id)
+    
+    def purchase_added(self, purchase: Purchase):
+        self._apply("purchases", added=purchase)
+    
+    def purchase_deleted(self, purchase: Purchase):
+        self._apply("purchases", removed=purchase, removed_id=purchase.id)
+    
+    # Payroll entries are edited in place, and another worker's edit may not be posted yet,
+    # so these reverse the stored amounts rather than the entry they are handed
+    
+    def payroll_saved(self, old: Optional[PayrollEntry], new: PayrollEntry):
+        self._apply("payroll", added=new, removed_id=new.id)
+    
+    def payroll_deleted(self, entry: PayrollEntry):
+        self._apply("payroll", removed_id=entry.id)
+    
+    def table_changed(self, table: str):
+        with self.lock:
+            if table in TABLE_POSTINGS:
+                self.pending.add(table)
+
+def account_balance(code: str, net: float) -> dict:
+    """An account's net balance split into debit/credit columns and in its normal sign"""
+    account = ACCOUNTS[code]
+    # max() keeps its first argument on a tie and -0.0 == 0.0, so zero goes first;
+    # adding 0.0 turns a negated zero back into 0.0
+    return {
+        "account": code, "name": account.name, "type": account.type,
+        "debit": max(0.0, net), "credit": max(0.0, -net),
+        "balance": (net if account.type in DEBIT_TYPES else -net) + 0.0
+    }
+
+def previous_month(key: str) -> str:
+    """The "YYYY-MM" key of the month before ``key``"""
+    year, month = int(key[:4]), int(key[5:7])
+    return f"{year - 1:04d}-12" if month == 1 else f"{year:04d}-{month - 1:02d}"
+
+def trial_balance(ledger: GeneralLedger, first: str, last: str) -> dict:
+    """Net balance per account at the end of month ``last``; debits equal credits.
+    
+    Asset, liability and equity accounts carry their balance through
+    ``last``; revenue and expense accounts cover the months [first, last],
+    and what they netted before ``first`` is closed into retained earnings,
+    as in the balance sheet.
+    """
+    nets = {code: net for code, net in ledger.balances(None, last).items()
+            if ACCOUNTS[code].type not in ("revenue", "expense")}
+    nets.update((code, net) for code, net in ledger.balances(first, last).items()
+                if ACCOUNTS[code].type in ("revenue", "expense"))
+    earlier = ledger.balances(None, previous_month(first))
+    for code, net in earlier.items():
+        if ACCOUNTS[code].type in ("revenue", "expense"):
+            nets[RETAINED_EARNINGS] = nets.get(RETAINED_EARNINGS, 0.0) + net
+    rows = [account_balance(code, net) for code, net in sorted(nets.items())]
+    return {
+        "period_start": first, "period_end": last, "accounts": rows,
+        "total_debit": sum(row["debit"] for row in rows), "total_credit": sum(row["credit"] for row in rows)
+    }
+
+def profit_and_loss(ledger: GeneralLedger, first: str, last: str) -> dict:
+    balances = ledger.balances(first, last)
+    revenue = [account_balance(code, balances.get(code, 0.0)) for code, account in ACCOUNTS.items()
+               if account.type == "revenue"]
+    expenses = [account_balance(code, balances.get(code, 0.0)) for code, account in ACCOUNTS.items()
+                if account.type == "expense"]
+    total_revenue = sum(row["balance"] for row in revenue)
+    total_expenses = sum(row["balance"] for row in expenses)
+    return {
+        "period_start": first, "period_end": last, "revenue": revenue, "expenses": expenses,
+        "total_revenue": total_revenue, "total_expenses": total_expenses, "net_income": total_revenue - total_expenses
+    }
+
+def balance_sheet(ledger: GeneralLedger, as_of: str) -> dict:
+    """Balances at the end of month ``as_of``; revenue and expenses close into retained earnings"""
+    balances = ledger.balances(None, as_of)
+    sections: Dict[str, List[dict]] = {"asset": [], "liability": [], "equity": []}
+    retained_earnings = 0.0
+    for code, account in ACCOUNTS.items():
+        net = balances.get(code, 0.0)
+        if account.type in ("revenue", "expense"):
+            retained_earnings -= net
+        elif code != RETAINED_EARNINGS:
+            sections[account.type].append(account_balance(code, net))
+    sections["equity"].append(account_balance(RETAINED_EARNINGS, balances.get(RETAINED_EARNINGS, 0.0) - retained_earnings))
+    
+    totals = {kind: sum(row["balance"] for row in rows) for kind, rows in sections.items()}
+    return {
+        "as_of": as_of, "assets": sections["asset"], "liabilities": sections["liability"],
+        "equity": sections["equity"], "total_assets": totals["asset"], "total_liabilities": totals["liability"],
+        "total_equity": totals["equity"]
+    }
@@ -0,0 +1,281 @@
+import functools
+import inspect
+import itertools
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Tuple, Union
+from fastapi import HTTPException
+from fastapi.exceptions import RequestValidationError
+from fastapi.routing import APIRoute
+
+# Sample every Nth routed request's stacks for /api/metrics/profile; 0 turns the profiler off
+PROFILE_SAMPLE_EVERY = int(os.environ.get("PROFILE_SAMPLE_EVERY", "0"))
+PROFILE_INTERVAL_SECONDS = float(os.environ.get("PROFILE_INTERVAL_MS", "1")) / 1000
+# Distinct folded stacks kept; samples of new stacks beyond this are dropped
+PROFILE_MAX_STACKS = int(os.environ.get("PROFILE_MAX_STACKS", "20000"))
+
+# Prometheus' defaults, extended down to a millisecond since most routes answer faster
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Phases of a routed request, in order
+PHASES = ("auth", "request", "handler", "serialization")
+
+def escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def format_labels(names: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{escape_label(str(value))}"' for name, value in zip(names, values)) + "}"
+
+class Histogram:
+    """A labelled Prometheus histogram (cumulative buckets, sum and count)"""
+    
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...], buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        # label values -> [count per bucket..., +Inf count, sum]
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+    
+    def observe(self, values: Tuple[str, ...], amount: float):
+        with self._lock:
+            series = self._series.get(values)
+            if series is None:
+                series = self._series[values] = [0] * (len(self.buckets) + 1) + [0.0]
+            for index, bound in enumerate(self.buckets):
+                if amount <= bound:
+                    series[index] += 1
+                    break
+            else:
+                series[len(self.buckets)] += 1
+            series[-1] += amount
+    
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {values: list(counts) for values, counts in self._series.items()}
+        for values, counts in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                labels = format_labels(self.labels + ("le",), values + (le,))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = format_labels(self.labels, values)
+            lines.append(f"{self.name}_sum{labels} {counts[-1]}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+class Gauge:
+    """A gauge read when metrics are scraped; ``collect`` returns one value or {label values: value}"""
+    
+    def __init__(self, name: str, help: str, collect: Callable[[], Union[float, Dict[Tuple[str, ...], float]]],
+                 labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.collect = collect
+        self.labels = labels
+    
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        values = self.collect()
+        if not isinstance(values, dict):
+            values = {(): values}
+        for label_values, value in sorted(values.items()):
+            lines.append(f"{self.name}{format_labels(self.labels, label_values)} {value}")
+        return lines
+
+request_duration = Histogram(
+    "http_request_duration_seconds", "Time from routing to the response object, per route",
+    ("method", "route", "status")
+)
+phase_duration = Histogram(
+    "http_request_phase_seconds",
+    "Time per request phase: auth dependency, request parsing and validation, handler body, "
+    "response validation and serialization",
+    ("method", "route", "phase")
+)
+gauges: List[Gauge] = []
+
+def register_gauge(name: str, help: str, collect: Callable, labels: Tuple[str, ...] = ()):
+    gauges.append(Gauge(name, help, collect, labels))
+
+def render_metrics() -> str:
+    """All metrics in the Prometheus text exposition format"""
+    lines = request_duration.render() + phase_duration.render()
+    for gauge in gauges:
+        lines.extend(gauge.render())
+    return "\n".join(lines) + "\n"
+
+# Phase timings of the request being handled, shared with worker threads it hands off to
+_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_timings", default=None)
+
+@contextmanager
+def timed_phase(phase: str):
+    """Add the time spent in the block to ``phase`` of the current request, if any"""
+    timings = _timings.get()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if timings is not None:
+            timings[phase] = timings.get(phase, 0.0) + time.perf_counter() - started
+
+def timed_endpoint(endpoint: Callable) -> Callable:
+    """Wrap an endpoint to record when its body starts and ends, even if it raises"""
+    if getattr(endpoint, "__instrumented__", False):
+        return endpoint
+    
+    def record(timings, started):
+        if timings is not None:
+            timings["handler_started"] = started
+            timings["handler_finished"] = time.perf_counter()
+    
+    if inspect.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def wrapper(*args, **kwargs):
+            timings = _timings.get()
+            started = time.perf_counter()
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                record(timings, started)
+    else:
+        @functools.wraps(endpoint)
+        def wrapper(*args, **kwargs):
+            timings = _timings.get()
+            started = time.perf_counter()
+            try:
+                return endpoint(*args, **kwargs)
+            finally:
+                record(timings, started)
+    
+    wrapper.__instrumented__ = True
+    return wrapper
+
+class StackSampler:
+    """Folded stacks ("outer;inner count" lines, as flamegraph.pl and speedscope read them).
+    
+    While a sampled request runs, a thread records the stack of the thread
+    serving it every PROFILE_INTERVAL_MS. On the event loop thread, other
+    requests being served concurrently can show up in the samples too.
+    """
+    
+    def __init__(self, every: int = PROFILE_SAMPLE_EVERY, interval: float = PROFILE_INTERVAL_SECONDS,
+                 max_stacks: int = PROFILE_MAX_STACKS):
+        self.every = every
+        self.interval = interval
+        self.max_stacks = max_stacks
+        self.stacks: Counter = Counter()
+        self._requests = itertools.count()
+        self._lock = threading.Lock()
+    
+    def should_sample(self) -> bool:
+        return self.every > 0 and next(self._requests) % self.every == 0
+    
+    def start(self, label: str) -> threading.Event:
+        """Start sampling the calling thread; set the returned event to stop"""
+        stop = threading.Event()
+        target = threading.get_ident()
+        threading.Thread(target=self._run, args=(target, label, stop), daemon=True).start()
+        return stop
+    
+    def _run(self, target: int, label: str, stop: threading.Event):
+        while not stop.wait(self.interval):
+            frame = sys._current_frames().get(target)
+            if frame is None:
+                return
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            stack = label + ";" + ";".join(reversed(names))
+            with self._lock:
+                if stack in self.stacks or len(self.stacks) < self.max_stacks:
+                    self.stacks[stack] += 1
+    
+    def folded(self) -> str:
+        with self._lock:
+            return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+    
+    def reset(self):
+        with self._lock:
+            self.stacks.clear()
+
+sampler = StackSampler()
+
+def route_template(request, route: APIRoute) -> str:
+    """Full path template of the matched route.
+    
+    FastAPI releases that include routers without copying their routes keep
+    the router-local path on the route and the full one on the scope's
+    effective route context.
+    """
+    context = request.scope.get("fastapi", {}).get("effective_route_context")
+    return getattr(context, "path_format", None) or route.path_format
+
+class InstrumentedRoute(APIRoute):
+    """APIRoute that records latency per route and per request phase.
+    
+    Routers opt in with ``APIRouter(route_class=InstrumentedRoute)``. The
+    route label is the path template, so ids do not multiply series.
+    Streaming responses are timed until the response object is returned.
+    """
+    
+    def __init__(self, path: str, endpoint: Callable, **kwargs):
+        super().__init__(path, timed_endpoint(endpoint), **kwargs)
+    
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+        
+        async def instrumented_handler(request):
+            route = route_template(request, self)
+            timings: Dict[str, float] = {}
+            token = _timings.set(timings)
+            stop = sampler.start(f"{request.method} {route}") if sampler.should_sample() else None
+            started = time.perf_counter()
+            status_code = 500
+            completed = False
+            try:
+                response = await handler(request)
+                status_code = response.status_code
+                completed = True
+                return response
+            except HTTPException as exc:
+                status_code = exc.status_code
+                raise
+            except RequestValidationError:
+                status_code = 422
+                raise
+            finally:
+                finished = time.perf_counter()
+                if stop is not None:
+                    stop.set()
+                _timings.reset(token)
+                observe(request.method, route, status_code, started, finished, timings, completed)
+        
+        return instrumented_handler
+
+def observe(method: str, route: str, status_code: int, started: float, finished: float, timings: Dict[str, float],
+            completed: bool):
+    request_duration.observe((method, route, str(status_code)), finished - started)
+    auth = timings.get("auth", 0.0)
+    if "auth" in timings:
+        phase_duration.observe((method, route, "auth"), auth)
+    handler_started = timings.get("handler_started")
+    if handler_started is None:
+        return
+    handler_finished = timings["handler_finished"]
+    phase_duration.observe((method, route, "request"), max(0.0, handler_started - started - auth))
+    phase_duration.observe((method, route, "handler"), handler_finished - handler_started)
+    if completed:
+        phase_duration.observe((method, route, "serialization"), finished - handler_finished)
@@ -0,0 +1,353 @@
+import atexit
+import gc
+import os
+import pickle
+import struct
+import threading
+import zlib
+from typing import Iterator, List, Optional, Tuple
+from pydantic import TypeAdapter
+from models import User, InventoryItem, Sale, Purchase, PayrollEntry
+from listeners import DatabaseListener
+
+# Configuration
+JOURNAL_SYNC_INTERVAL = float(os.environ.get("JOURNAL_SYNC_INTERVAL", "0.05"))
+JOURNAL_SYNC_BATCH = int(os.environ.get("JOURNAL_SYNC_BATCH", "256"))
+JOURNAL_SNAPSHOT_RECORDS = int(os.environ.get("JOURNAL_SNAPSHOT_RECORDS", "100000"))
+
+SNAPSHOT_FILE = "snapshot.pkl"
+SNAPSHOT_VERSION = 1
+
+# Every record is <length, crc32> followed by a protocol 5 pickle of (event, args).
+# Models are stored as plain dicts: pickling those and validating them back in
+# bulk is several times faster than pickling pydantic objects.
+RECORD_HEADER = struct.Struct("<II")
+
+TABLE_ADAPTERS = {
+    "users": TypeAdapter(List[User]),
+    "inventory": TypeAdapter(List[InventoryItem]),
+    "sales": TypeAdapter(List[Sale]),
+    "purchases": TypeAdapter(List[Purchase]),
+    "payroll": TypeAdapter(List[PayrollEntry])
+}
+
+def segment_name(number: int) -> str:
+    return f"journal-{number:08d}.log"
+
+def list_segments(directory: str) -> List[int]:
+    return sorted(
+        int(name[len("journal-"):-len(".log")])
+        for name in os.listdir(directory)
+        if name.startswith("journal-") and name.endswith(".log")
+    )
+
+def encode_record(event: str, args: tuple) -> bytes:
+    payload = pickle.dumps((event, args), protocol=5)
+    return RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+def read_records(path: str) -> Iterator[Tuple[str, tuple]]:
+    """Yield records up to the first torn or corrupt one (a crash mid-write)"""
+    with open(path, "rb") as journal_file:
+        while True:
+            header = journal_file.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                return
+            length, checksum = RECORD_HEADER.unpack(header)
+            payload = journal_file.read(length)
+            if len(payload) < length or zlib.crc32(payload) != checksum:
+                return
+            yield pickle.loads(payload)
+
+def fsync_directory(directory: str):
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+# Recovery
+
+def capture_state(db, next_segment: int) -> dict:
+    """Copy the current tables cheaply; encoding them happens later, off the write path"""
+    return {
+        "version": SNAPSHOT_VERSION,
+        "segment": next_segment,
+        "counters": {
+            "user_counter": db.user_counter,
+            "inventory_counter": db.inventory_counter,
+            "sale_counter": db.sale_counter,
+            "purchase_counter": db.purchase_counter,
+            "payroll_counter": db.payroll_counter
+        },
+        "passwords": dict(db.user_passwords),
+        "tables": {table: getattr(db, table).copy() for table in TABLE_ADAPTERS}
+    }
+
+def restore_state(db, state: dict):
+    """Load a snapshot into an empty InMemoryDB through its normal write methods"""
+    tables = {table: adapter.validate_python(state["tables"][table]) for table, adapter in TABLE_ADAPTERS.items()}
+    for user in tables["users"]:
+        db.add_user(user)
+    for username, hashed_password in state["passwords"].items():
+        db.set_user_password(username, hashed_password)
+    for item in tables["inventory"]:
+        db.save_inventory_item(item)
+    db.add_sales(tables["sales"])
+    db.add_purchases(tables["purchases"])
+    for entry in tables["payroll"]:
+        db.save_payroll_entry(entry)
+    for counter, value in state["counters"].items():
+        setattr(db, counter, value)
+
+def bump_counter(db, counter: str, record_id: int):
+    setattr(db, counter, max(getattr(db, counter), record_id + 1))
+
+def apply_record(db, event: str, args: tuple):
+    """Replay one journal record.
+    
+    Replay is idempotent, because a snapshot can already contain the effect
+    of records journaled just after it was captured.
+    """
+    if event == "user_saved":
+        user = User.model_validate(args[0])
+        existing_user = db.users.get(user.id)
+        if existing_user is None:
+            db.add_user(user)
+        elif existing_user.is_active != user.is_active:
+            # Activation is the only change made to an existing user
+            db.set_user_active(user.id, user.is_active)
+        bump_counter(db, "user_counter", user.id)
+    elif event == "password_saved":
+        db.set_user_password(*args)
+    elif event == "inventory_saved":
+        item = db.save_inventory_item(InventoryItem.model_validate(args[0]))
+        bump_counter(db, "inventory_counter", item.id)
+    elif event == "inventory_deleted":
+        db.delete_inventory_item(args[0])
+        bump_counter(db, "inventory_counter", args[0])
+    elif event == "sale_added":
+        if args[0]["id"] not in db.sales:
+            db.add_sale(Sale.model_validate(args[0]))
+        bump_counter(db, "sale_counter", args[0]["id"])
+    elif event == "sale_deleted":
+        db.delete_sale(args[0])
+        bump_counter(db, "sale_counter", args[0])
+    elif event == "purchase_added":
+        if args[0]["id"] not in db.purchases:
+            db.add_purchase(Purchase.model_validate(args[0]))
+        bump_counter(db, "purchase_counter", args[0]["id"])
+    elif event == "purchase_deleted":
+        db.delete_purchase(args[0])
+        bump_counter(db, "purchase_counter", args[0])
+    elif event == "payroll_saved":
+        entry = db.save_payroll_entry(PayrollEntry.model_validate(args[0]))
+        bump_counter(db, "payroll_counter", entry.id)
+    elif event == "payroll_deleted":
+        db.delete_payroll_entry(args[0])
+        bump_counter(db, "payroll_counter", args[0])
+
+def recover(db, directory: str) -> Tuple[int, int]:
+    """Load the latest snapshot and replay the journal tail.
+    
+    Returns the next segment number and how many records were replayed.
+    """
+    next_segment = 1
+    replayed = 0
+    # Recovery allocates millions of long-lived objects; cyclic GC passes over
+    # them would dominate the load time, so collection is paused until the end
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        snapshot_path = os.path.join(directory, SNAPSHOT_FILE)
+        if os.path.exists(snapshot_path):
+            with open(snapshot_path, "rb") as snapshot_file:
+                state = pickle.load(snapshot_file)
+            restore_state(db, state)
+            next_segment = state["segment"]
+        
+        for number in list_segments(directory):
+            if number < next_segment:
+                continue
+            for event, args in read_records(os.path.join(directory, segment_name(number))):
+                apply_record(db, event, args)
+                replayed += 1
+            next_segment = number + 1
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    # Recovered records live as long as the process; keep them out of future collections
+    gc.freeze()
+    
+    print(f"Journal recovered {len(db.sales)} sales, {len(db.purchases)} purchases; replayed {replayed} records")
+    return next_segment, replayed
+
+class Journal(DatabaseListener):
+    """Append-only log of every committed InMemoryDB mutation, with group commit.
+    
+    Records are buffered and written by a background thread every
+    ``sync_interval`` seconds, or sooner once ``sync_batch`` records are
+    waiting, with one fsync per group; a crash loses at most the last
+    interval. ``sync_interval=0`` writes and fsyncs every record before the
+    mutating call returns. Every ``snapshot_records`` records the state is
+    written to a pickle snapshot and older journal segments are removed.
+    """
+    
+    def __init__(self, db, directory: str, next_segment: int, replayed: int = 0,
+                 sync_interval: float = JOURNAL_SYNC_INTERVAL, sync_batch: int = JOURNAL_SYNC_BATCH,
+                 snapshot_records: int = JOURNAL_SNAPSHOT_RECORDS):
+        self.db = db
+        self.directory = directory
+        self.sync_interval = sync_interval
+        self.sync_batch = sync_batch
+        self.snapshot_records = snapshot_records
+        
+        self._pending: List[bytes] = []
+        self._pending_lock = threading.Lock()
+        self._io_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        # The replayed tail counts towards the next snapshot, so segments do not pile up across restarts
+        self._records_since_snapshot = replayed
+        self._snapshot_thread: Optional[threading.Thread] = None
+        
+        self._segment = next_segment
+        self._file = open(os.path.join(directory, segment_name(self._segment)), "ab")
+        
+        self._flusher: Optional[threading.Thread] = None
+        if sync_interval > 0:
+            self._flusher = threading.Thread(target=self._run_flusher, name="journal-flush", daemon=True)
+            self._flusher.start()
+    
+    @classmethod
+    def open(cls, db, directory: str, **options) -> "Journal":
+        """Recover ``db`` from ``directory`` and start journaling its mutations"""
+        os.makedirs(directory, exist_ok=True)
+        next_segment, replayed = recover(db, directory)
+        journal = cls(db, directory, next_segment, replayed, **options)
+        db.add_listener(journal)
+        atexit.register(journal.close)
+        return journal
+    
+    # Writing
+    
+    def _append(self, event: str, *args):
+        record = encode_record(event, args)
+        if self.sync_interval <= 0:
+            with self._io_lock:
+                self._file.write(record)
+                self._file.flush()
+                os.fsync(self._file.fileno())
+        else:
+            with self._pending_lock:
+                self._pending.append(record)
+                if len(self._pending) >= self.sync_batch:
+                    self._wake.set()
+        
+        self._records_since_snapshot += 1
+        if self._records_since_snapshot >= self.snapshot_records:
+            self.snapshot()
+    
+    def _run_flusher(self):
+        while not self._closed:
+            self._wake.wait(self.sync_interval)
+            self._wake.clear()
+            self.flush()
+    
+    def flush(self):
+        """Write and fsync every buffered record as one group"""
+        with self._io_lock:
+            with self._pending_lock:
+                records, self._pending = self._pending, []
+            if not records:
+                return
+            self._file.write(b"".join(records))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+    
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        if self._flusher is not None:
+            self._flusher.join()
+        if self._snapshot_thread is not None:
+            self._snapshot_thread.join()
+        self.flush()
+        self._file.close()
+    
+    # Snapshots
+    
+    def snapshot(self, wait: bool = False):
+        """Start a new segment and write the current state in the background"""
+        if self._snapshot_thread is not None and self._snapshot_thread.is_alive():
+            return
+        
+        # Listener callbacks are serialised, so no record lands between rotation and capture
+        with self._io_lock:
+            with self._pending_lock:
+                records, self._pending = self._pending, []
+            self._file.write(b"".join(records))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._segment += 1
+            self._file = open(os.path.join(self.directory, segment_name(self._segment)), "ab")
+        
+        state = capture_state(self.db, self._segment)
+        self._records_since_snapshot = 0
+        self._snapshot_thread = threading.Thread(
+            target=self._write_snapshot, args=(state,), name="journal-snapshot", daemon=True
+        )
+        self._snapshot_thread.start()
+        if wait:
+            self._snapshot_thread.join()
+    
+    def _write_snapshot(self, state: dict):
+        state["tables"] = {
+            table: TABLE_ADAPTERS[table].dump_python(list(records.values()))
+            for table, records in state["tables"].items()
+        }
+        path = os.path.join(self.directory, SNAPSHOT_FILE)
+        with open(path + ".tmp", "wb") as snapshot_file:
+            pickle.dump(state, snapshot_file, protocol=5)
+            snapshot_file.flush()
+            os.fsync(snapshot_file.fileno())
+        os.replace(path + ".tmp", path)
+        fsync_directory(self.directory)
+        
+        for number in list_segments(self.directory):
+            if number < state["segment"]:
+                os.remove(os.path.join(self.directory, segment_name(number)))
+    
+    # Listener callbacks
+    
+    def user_saved(self, old: Optional[User], new: User):
+        self._append("user_saved", new.model_dump())
+    
+    def password_saved(self, username: str, hashed_password: str):
+        self._append("password_saved", username, hashed_password)
+    
+    def inventory_saved(self, old: Optional[InventoryItem], new: InventoryItem):
+        self._append("inventory_saved", new.model_dump())
+    
+    def inventory_deleted(self, item: InventoryItem):
+        self._append("inventory_deleted", item.id)
+    
+    def sale_added(self, sale: Sale):
+        self._append("sale_added", sale.model_dump())
+    
+    def sale_deleted(self, sale: Sale):
+        self._append("sale_deleted", sale.id)
+    
+    def purchase_added(self, purchase: Purchase):
+        self._append("purchase_added", purchase.model_dump())
+    
+    def purchase_deleted(self, purchase: Purchase):
+        self._append("purchase_deleted", purchase.id)
+    
+    def payroll_saved(self, old: Optional[PayrollEntry], new: PayrollEntry):
+        self._append("payroll_saved", new.model_dump())
+    
+    def payroll_deleted(self, entry: PayrollEntry):
+        self._append("payroll_deleted", entry.id)
@@ -0,0 +1,44 @@
+from typing import Optional
+from models import User, InventoryItem, Sale, Purchase, PayrollEntry
+
+class DatabaseListener:
+    """Receives a callback after every committed mutation of the database.
+
+    Derived structures (aggregates, caches, feeds) subclass this and override
+    only the callbacks they care about. Callbacks run synchronously inside the
+    mutating call, so they must be cheap and must not raise.
+    """
+    
+    def user_saved(self, old: Optional[User], new: User):
+        pass
+    
+    def password_saved(self, username: str, hashed_password: str):
+        pass
+    
+    def inventory_saved(self, old: Optional[InventoryItem], new: InventoryItem):
+        pass
+    
+    def inventory_deleted(self, item: InventoryItem):
+        pass
+    
+    def sale_added(self, sale: Sale):
+        pass
+    
+    def sale_deleted(self, sale: Sale):
+        pass
+    
+    def purchase_added(self, purchase: Purchase):
+        pass
+    
+    def purchase_deleted(self, purchase: Purchase):
+        pass
+    
+    def payroll_saved(self, old: Optional[PayrollEntry], new: PayrollEntry):
+        pass
+    
+    def payroll_deleted(self, entry: PayrollEntry):
+        pass
+    
+    def table_changed(self, table: str):
+        """Another process sharing the store changed ``table`` without per-record callbacks"""
+        pass
@@ -1,4 +1,7 @@
+import os
+import sys
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
@@ -10,14 +13,26 @@ from routers.purchases import router as purchases_router
 from routers.payroll import router as payroll_router
 from routers.reports import router as reports_router
 from routers.users import router as users_router
-from database import initialize_database
+from routers.events import router as events_router
+from routers.metrics import router as metrics_router
+from database import initialize_database, get_database, DATABASE_BACKEND
+from fast_json import FAST_JSON, FastJSONResponse
+from instrumentation import InstrumentedRoute
+
+# Worker processes (same variable uvicorn's --workers defaults to); more than
+# one needs a store they all share, i.e. DATABASE_BACKEND=sqlite
+WORKERS = int(os.environ.get("WEB_CONCURRENCY", "1"))
 
 # Initialize FastAPI app
 app = FastAPI(
     title="Accounting Management System",
     description="Comprehensive accounting web application for small businesses",
-    version="1.0.0"
+    version="1.0.0",
+    # Opt-in orjson rendering for every JSON response
+    default_response_class=FastJSONResponse if FAST_JSON else JSONResponse
 )
+# Time routes declared on the app itself, like the routers' routes
+app.router.route_class = InstrumentedRoute
 
 # Configure CORS
 app.add_middleware(
@@ -26,11 +41,28 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # Initialize in-memory database
 initialize_database()
 
+class DatabaseSyncMiddleware:
+    """Pick up writes other worker processes made since this worker's last request.
+    
+    Plain ASGI rather than @app.middleware, so responses are not re-wrapped.
+    """
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            get_database().sync()
+        await self.app(scope, receive, send)
+
+app.add_middleware(DatabaseSyncMiddleware)
+
 # Include routers
 app.include_router(auth_router, prefix="/api/auth", tags=["Authentication"])
 app.include_router(inventory_router, prefix="/api/inventory", tags=["Inventory"])
@@ -39,14 +71,18 @@ app.include_router(purchases_router, prefix="/api/purchases", tags=["Purchases"]
 app.include_router(payroll_router, prefix="/api/payroll", tags=["Payroll"])
 app.include_router(reports_router, prefix="/api/reports", tags=["Reports"])
 app.include_router(users_router, prefix="/api/users", tags=["Users"])
-
-# Serve static files
-app.mount("/", StaticFiles(directory="static", html=True), name="static")
+app.include_router(events_router, prefix="/api/events", tags=["Events"])
+app.include_router(metrics_router, prefix="/api/metrics", tags=["Metrics"])
 
 @app.get("/api/health")
 async def health_check():
     """Health check endpoint"""
     return {"status": "healthy", "message": "Accounting Management System is running"}
 
+# Serve static files; mounted last, since "/" matches every path
+app.mount("/", StaticFiles(directory="static", html=True), name="static")
+
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=5000)
+    if WORKERS > 1 and DATABASE_BACKEND != "sqlite":
+        sys.exit("WEB_CONCURRENCY > 1 needs DATABASE_BACKEND=sqlite: in-memory data cannot be shared between workers")
+    uvicorn.run("main:app", host="0.0.0.0", port=5000, workers=WORKERS)
@@ -140,6 +140,25 @@ class PayrollEntry(PayrollEntryBase):
     created_by: int
     created_at: datetime
 
+# Batch Models
+class BatchRowResult(BaseModel):
+    index: int
+    success: bool
+    id: Optional[int] = None
+    total_amount: Optional[float] = None
+    error: Optional[str] = None
+
+class BatchResult(BaseModel):
+    created: int
+    failed: int
+    results: List[BatchRowResult]
+
+class ImportResult(BaseModel):
+    created: int
+    updated: int
+    failed: int
+    results: List[BatchRowResult]
+
 # Report Models
 class FinancialSummary(BaseModel):
     total_revenue: float
@@ -153,9 +172,94 @@ class InventoryReport(BaseModel):
     total_value: float
     low_stock_items: List[InventoryItem]
 
+class ItemValuation(BaseModel):
+    item_id: int
+    name: str
+    sku: str
+    quantity_in_stock: int
+    unit_cost: float
+    value_at_cost: float
+    uncosted_quantity: int
+
+class InventoryValuation(BaseModel):
+    method: str
+    total_value_at_cost: float
+    total_value_at_price: float
+    items: List[ItemValuation]
+
+class ItemMargin(BaseModel):
+    item_id: int
+    name: str
+    quantity_sold: int
+    revenue: float
+    cost_of_goods_sold: float
+    gross_margin: float
+    margin_percent: Optional[float] = None
+    uncosted_quantity_sold: int
+
+class GrossMarginReport(BaseModel):
+    method: str
+    revenue: float
+    cost_of_goods_sold: float
+    gross_margin: float
+    margin_percent: Optional[float] = None
+    items: List[ItemMargin]
+
+class LedgerAccount(BaseModel):
+    code: str
+    name: str
+    type: str
+
+class AccountBalance(BaseModel):
+    account: str
+    name: str
+    type: str
+    debit: float
+    credit: float
+    balance: float
+
+class TrialBalance(BaseModel):
+    period_start: str
+    period_end: str
+    accounts: List[AccountBalance]
+    total_debit: float
+    total_credit: float
+
+class ProfitAndLoss(BaseModel):
+    period_start: str
+    period_end: str
+    revenue: List[AccountBalance]
+    expenses: List[AccountBalance]
+    total_revenue: float
+    total_expenses: float
+    net_income: float
+
+class BalanceSheet(BaseModel):
+    as_of: str
+    assets: List[AccountBalance]
+    liabilities: List[AccountBalance]
+    equity: List[AccountBalance]
+    total_assets: float
+    total_liabilities: float
+    total_equity: float
+
 class SalesReport(BaseModel):
     total_sales: int
     total_revenue: float
     period_start: datetime
     period_end: datetime
     top_selling_items: List[dict]
+
+class TimeSeriesPoint(BaseModel):
+    period_start: datetime
+    revenue: float
+    purchase_cost: float
+    payroll: float
+    expenses: float
+    profit: float
+
+class TimeSeries(BaseModel):
+    granularity: str
+    period_start: datetime
+    period_end: datetime
+    points: List[TimeSeriesPoint]
@@ -0,0 +1,127 @@
+import base64
+from datetime import datetime
+from itertools import islice
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+from fastapi import HTTPException, Query, Response, status
+from fastapi.responses import StreamingResponse
+from database import get_database
+from fast_json import FAST_JSON, RecordJSONCache
+from instrumentation import register_gauge
+
+# Serialized records for the FAST_JSON list path
+record_json_cache = RecordJSONCache()
+get_database().add_listener(record_json_cache)
+register_gauge("record_json_cache_entries", "Records held as serialized JSON", lambda: len(record_json_cache))
+register_gauge("record_json_cache_bytes", "Bytes of records held as serialized JSON", lambda: record_json_cache.size)
+
+MAX_PAGE_SIZE = 1000
+NDJSON_CHUNK_BYTES = 64 * 1024
+
+class ListParams:
+    """Common query parameters for list endpoints.
+    
+    Without ``limit`` the whole (filtered) table is returned, as before.
+    ``cursor`` is the opaque value of the previous page's X-Next-Cursor header.
+    ``format=ndjson`` streams one JSON object per line instead of a JSON array.
+    """
+    
+    def __init__(
+        self,
+        limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+        cursor: Optional[str] = None,
+        format: str = Query("json", pattern="^(json|ndjson)$"),
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None
+    ):
+        self.limit = limit
+        self.after = decode_cursor(cursor) if cursor else None
+        self.format = format
+        self.start = parse_date(start_date) if start_date else None
+        self.end = parse_date(end_date) if end_date else None
+
+def parse_date(value: str) -> datetime:
+    """Parse an ISO date the same way the report endpoints do"""
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00').replace('+00:00', ''))
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid date: {value}"
+        )
+
+def encode_cursor(created_at: datetime, record_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{record_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        created_at, record_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(record_id)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+def list_response(db, table: str, params: ListParams, response: Response, filters: Optional[Dict[str, str]] = None):
+    """List ``table`` in (created_at, id) order with the page size and output format applied.
+    
+    With FAST_JSON the body is assembled from cached per-record JSON and
+    returned as bytes, bypassing response_model re-validation; otherwise
+    the records are returned for FastAPI to validate and serialize.
+    """
+    if FAST_JSON:
+        return fast_list_response(db, table, params, filters)
+    
+    records = db.iter_records(table, params.start, params.end, params.after, filters)
+    headers = {}
+    if params.limit is not None:
+        # Fetch one extra record to learn whether another page exists
+        records = list(islice(records, params.limit + 1))
+        if len(records) > params.limit:
+            records = records[:params.limit]
+            headers["X-Next-Cursor"] = encode_cursor(records[-1].created_at, records[-1].id)
+    
+    if params.format == "ndjson":
+        return StreamingResponse(
+            (record.model_dump_json() + "\n" for record in records),
+            media_type="application/x-ndjson",
+            headers=headers
+        )
+    
+    response.headers.update(headers)
+    
+    return list(records)
+
+def ndjson_chunks(bodies: Iterable[bytes], chunk_size: int = NDJSON_CHUNK_BYTES) -> Iterator[bytes]:
+    """Join JSON lines into chunks, since each streamed chunk costs an ASGI send"""
+    chunk = []
+    size = 0
+    for body in bodies:
+        chunk.append(body)
+        size += len(body) + 1
+        if size >= chunk_size:
+            yield b"\n".join(chunk) + b"\n"
+            chunk = []
+            size = 0
+    if chunk:
+        yield b"\n".join(chunk) + b"\n"
+
+def fast_list_response(db, table: str, params: ListParams, filters: Optional[Dict[str, str]] = None) -> Response:
+    rows = record_json_cache.records(db, table, params.start, params.end, params.after, filters)
+    headers = {}
+    if params.limit is not None:
+        rows = list(islice(rows, params.limit + 1))
+        if len(rows) > params.limit:
+            rows = rows[:params.limit]
+            headers["X-Next-Cursor"] = encode_cursor(*rows[-1][0])
+    
+    if params.format == "ndjson":
+        return StreamingResponse(
+            ndjson_chunks(body for _, body in rows),
+            media_type="application/x-ndjson",
+            headers=headers
+        )
+    
+    body = b"[" + b",".join(body for _, body in rows) + b"]"
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,154 @@
+import hashlib
+import os
+import threading
+from collections import Counter, OrderedDict
+from typing import Callable, Dict, Hashable, Iterable, NamedTuple, Optional, Set, Tuple
+from fastapi import Request, Response, status
+from models import InventoryItem, Sale, Purchase, PayrollEntry
+from listeners import DatabaseListener
+
+REPORT_CACHE_BYTES = int(os.environ.get("REPORT_CACHE_BYTES", str(16 * 2 ** 20)))
+REPORT_CACHE_ENTRIES = int(os.environ.get("REPORT_CACHE_ENTRIES", "1024"))
+
+class CachedReport(NamedTuple):
+    body: bytes
+    etag: str
+
+def make_report(body: bytes) -> CachedReport:
+    return CachedReport(body, '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"')
+
+class ReportCache(DatabaseListener):
+    """LRU cache of serialized report responses, invalidated per table.
+    
+    Entries are keyed by endpoint plus normalised parameters and remember
+    the tables they were computed from. Every mutation bumps its table's
+    version and drops the entries that read that table; other workers'
+    writes arrive the same way through ``table_changed``. The cache is
+    bounded both by entry count and by total body bytes.
+    """
+    
+    def __init__(self, max_bytes: int = REPORT_CACHE_BYTES, max_entries: int = REPORT_CACHE_ENTRIES):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.versions: Counter = Counter()
+        self.size = 0
+        self._entries: "OrderedDict[Hashable, Tuple[CachedReport, Tuple[str, ...]]]" = OrderedDict()
+        self._keys_by_table: Dict[str, Set[Hashable]] = {}
+        self._lock = threading.Lock()
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def get(self, key: Hashable) -> Optional[CachedReport]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+    
+    def table_versions(self, tables: Iterable[str]) -> Tuple[int, ...]:
+        return tuple(self.versions[table] for table in tables)
+    
+    def put(self, key: Hashable, tables: Tuple[str, ...], versions: Tuple[int, ...], body: bytes) -> CachedReport:
+        """Store a report computed when ``tables`` were at ``versions``.
+        
+        If any of them changed while the report was being computed, the
+        result is returned but not cached, since it may already be stale.
+        """
+        report = make_report(body)
+        if len(body) > self.max_bytes:
+            return report
+        
+        with self._lock:
+            if self.table_versions(tables) != versions:
+                return report
+            if key in self._entries:
+                self._evict(key)
+            self._entries[key] = (report, tables)
+            self.size += len(body)
+            for table in tables:
+                self._keys_by_table.setdefault(table, set()).add(key)
+            
+            while len(self._entries) > self.max_entries or self.size > self.max_bytes:
+                self._evict(next(iter(self._entries)))
+        return report
+    
+    def invalidate_table(self, table: str):
+        with self._lock:
+            self.versions[table] += 1
+            for key in self._keys_by_table.pop(table, set()):
+                if key in self._entries:
+                    self._evict(key)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_table.clear()
+            self.size = 0
+    
+    def _evict(self, key: Hashable):
+        report, tables = self._entries.pop(key)
+        self.size -= len(report.body)
+        for table in tables:
+            keys = self._keys_by_table.get(table)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_table[table]
+    
+    # Listener callbacks
+    
+    def inventory_saved(self, old: Optional[InventoryItem], new: InventoryItem):
+        self.invalidate_table("inventory")
+    
+    def inventory_deleted(self, item: InventoryItem):
+        self.invalidate_table("inventory")
+    
+    def sale_added(self, sale: Sale):
+        self.invalidate_table("sales")
+    
+    def sale_deleted(self, sale: Sale):
+        self.invalidate_table("sales")
+    
+    def purchase_added(self, purchase: Purchase):
+        self.invalidate_table("purchases")
+    
+    def purchase_deleted(self, purchase: Purchase):
+        self.invalidate_table("purchases")
+    
+    def payroll_saved(self, old: Optional[PayrollEntry], new: PayrollEntry):
+        self.invalidate_table("payroll")
+    
+    def payroll_deleted(self, entry: PayrollEntry):
+        self.invalidate_table("payroll")
+    
+    def table_changed(self, table: str):
+        self.invalidate_table(table)
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Whether If-None-Match names ``etag`` (weak comparison, as RFC 9110 requires)"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return any(candidate.strip().removeprefix("W/") == etag for candidate in header.split(","))
+
+def cached_report(cache: ReportCache, request: Request, key: Optional[Hashable], tables: Tuple[str, ...],
+                  build: Callable[[], bytes]) -> Response:
+    """Serve a JSON report from the cache, computing it with ``build`` on a miss.
+    
+    ``key`` None means the result is not reusable (e.g. it depends on the
+    current time); it is still given an ETag. Matching If-None-Match gets 304.
+    """
+    report = cache.get(key) if key is not None else None
+    if report is None:
+        versions = cache.table_versions(tables)
+        body = build()
+        report = make_report(body) if key is None else cache.put(key, tables, versions, body)
+    
+    headers = {"ETag": report.etag, "Cache-Control": "no-cache"}
+    if etag_matches(request, report.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=report.body, media_type="application/json", headers=headers)
@@ -0,0 +1,105 @@
+import threading
+from datetime import datetime
+from typing import Dict, Tuple
+import numpy as np
+from columnar import TransactionStore, to_micros
+from listeners import DatabaseListener
+
+class ReportEngine(DatabaseListener):
+    """Period reports for InMemoryDB, vectorized over its columns with NumPy.
+    
+    Period totals come from cumulative sums over the time-ordered header
+    columns, so a [start, end] total is two bisects and a subtraction.
+    The prefix sums are brought up to date lazily: extended over appended
+    rows, and rebuilt after a delete or an out-of-order insert.
+    """
+    
+    def __init__(self, db):
+        self.db = db
+        self.sales: TransactionStore = db.sales
+        self.purchases: TransactionStore = db.purchases
+        self._payroll_version = 0
+        self._prefix_sums: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+    
+    # Listener callbacks; transaction stores carry their own version
+    
+    def payroll_saved(self, existing_entry, entry):
+        self._payroll_version += 1
+    
+    def payroll_deleted(self, entry):
+        self._payroll_version += 1
+    
+    # Prefix sums
+    
+    def _store_sums(self, name: str, store: TransactionStore) -> tuple:
+        """(version, cumulative live count, cumulative total_amount), each with a leading 0.
+        
+        Rows appended since the last call extend the sums in O(new rows);
+        an insert before the end, a delete or a compaction rebuilds them.
+        """
+        with self._lock:
+            cached = self._prefix_sums.get(name)
+            if cached is not None and cached[0] == store.version:
+                return cached[0], cached[3], cached[4]
+            with store._lock:
+                version, layout_version, rows = store.version, store.layout_version, len(store.ids)
+                first = 0 if cached is None or cached[1] != layout_version else cached[2]
+                alive = np.frombuffer(store.alive[first:rows], dtype=np.uint8)
+                amounts = np.array(store.total_amount[first:rows], dtype=np.float64)
+            
+            if first:
+                counts, totals = cached[3], cached[4]
+            else:
+                counts, totals = np.zeros(1, dtype=np.int64), np.zeros(1, dtype=np.float64)
+            if len(counts) <= rows:
+                # Grow geometrically so a run of single appends stays amortized O(1) each
+                capacity = max(rows + 1, 2 * len(counts))
+                counts = np.concatenate((counts[:first + 1], np.zeros(capacity - first - 1, dtype=np.int64)))
+                totals = np.concatenate((totals[:first + 1], np.zeros(capacity - first - 1, dtype=np.float64)))
+            # Readers of an older version only look at positions up to its row count
+            counts[first + 1:rows + 1] = counts[first] + np.cumsum(alive, dtype=np.int64)
+            totals[first + 1:rows + 1] = totals[first] + np.cumsum(np.where(alive, amounts, 0.0))
+            self._prefix_sums[name] = (version, layout_version, rows, counts, totals)
+            return version, counts, totals
+    
+    def _store_range(self, name: str, store: TransactionStore, start: datetime, end: datetime) -> Tuple[int, float]:
+        """(live rows, total_amount) created within [start, end]"""
+        while True:
+            version, counts, totals = self._store_sums(name, store)
+            with store._lock:
+                # A write between building the sums and seeking moves rows; rebuild
+                if store.version != version:
+                    continue
+                low, high = store._seek(start, end)
+            return int(counts[high] - counts[low]), float(totals[high] - totals[low])
+    
+    def _payroll_range(self, start: datetime, end: datetime) -> float:
+        with self._lock:
+            version = self._payroll_version
+            cached = self._prefix_sums.get("payroll")
+            if cached is None or cached[0] != version:
+                # The time index is already in (created_at, id) order; no sort needed
+                keys = list(self.db.payroll_by_time._keys)
+                created_at = np.array([to_micros(moment) for moment, _ in keys], dtype=np.int64)
+                # An entry removed meanwhile has bumped the version, so the next call rebuilds
+                entries = [self.db.payroll.get(record_id) for _, record_id in keys]
+                gross_pay = np.array([entry.gross_pay if entry is not None else 0.0 for entry in entries],
+                                     dtype=np.float64)
+                cached = self._prefix_sums["payroll"] = (
+                    version, created_at, np.concatenate(([0.0], np.cumsum(gross_pay)))
+                )
+        _, created_at, totals = cached
+        low = np.searchsorted(created_at, to_micros(start), side="left")
+        high = max(low, np.searchsorted(created_at, to_micros(end), side="right"))
+        return float(totals[high] - totals[low])
+    
+    # Reports
+    
+    def financial_totals(self, start: datetime, end: datetime) -> Tuple[float, float]:
+        _, total_revenue = self._store_range("sales", self.sales, start, end)
+        _, purchase_total = self._store_range("purchases", self.purchases, start, end)
+        return total_revenue, purchase_total + self._payroll_range(start, end)
+    
+    def sales_totals(self, start: datetime, end: datetime) -> Tuple[int, float]:
+        return self._store_range("sales", self.sales, start, end)
@@ -0,0 +1,154 @@
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+from models import Sale, Purchase, PayrollEntry
+from listeners import DatabaseListener
+
+# Rollup levels, keyed by the length of the ISO timestamp prefix that names a bucket:
+# "2025-03-14T09" (hour), "2025-03-14" (day), "2025-03" (month)
+LEVELS: Dict[str, int] = {"hour": 13, "day": 10, "month": 7}
+
+# The rollup level each chart granularity is read from; weeks add up seven days
+GRANULARITY_LEVELS: Dict[str, str] = {"hour": "hour", "day": "day", "week": "day", "month": "month"}
+
+MAX_POINTS = 5000
+
+# Measures kept per bucket, each with a record count so emptied buckets reset to zero
+MEASURES = ("revenue", "purchase_cost", "payroll")
+
+BucketTotals = Tuple[float, float, float]
+
+def bucket_key(moment: datetime, level: str) -> str:
+    return moment.isoformat()[:LEVELS[level]]
+
+def bucket_start(moment: datetime, granularity: str) -> datetime:
+    """Start of the chart bucket containing ``moment``; weeks start on Monday"""
+    moment = moment.replace(minute=0, second=0, microsecond=0)
+    if granularity == "hour":
+        return moment
+    moment = moment.replace(hour=0)
+    if granularity == "week":
+        return moment - timedelta(days=moment.weekday())
+    if granularity == "month":
+        return moment.replace(day=1)
+    return moment
+
+def next_bucket(moment: datetime, granularity: str) -> datetime:
+    if granularity == "hour":
+        return moment + timedelta(hours=1)
+    if granularity == "day":
+        return moment + timedelta(days=1)
+    if granularity == "week":
+        return moment + timedelta(days=7)
+    if moment.month == 12:
+        return moment.replace(year=moment.year + 1, month=1)
+    return moment.replace(month=moment.month + 1)
+
+def build_timeseries(fetch: Callable[[str, str, str], Dict[str, BucketTotals]],
+                     granularity: str, start: datetime, end: datetime) -> List[dict]:
+    """Chart points for every bucket overlapping [start, end], including empty ones.
+    
+    ``fetch(level, first_key, last_key)`` returns the non-empty rollup buckets
+    of a level with keys in that range, as (revenue, purchase cost, payroll).
+    Buckets are whole: the first one starts at or before ``start``.
+    Raises ValueError if the chart would have more than MAX_POINTS points.
+    """
+    level = GRANULARITY_LEVELS[granularity]
+    starts = []
+    moment = bucket_start(start, granularity)
+    while moment <= end:
+        if len(starts) == MAX_POINTS:
+            raise ValueError(f"More than {MAX_POINTS} {granularity} buckets requested")
+        starts.append(moment)
+        moment = next_bucket(moment, granularity)
+    if not starts:
+        return []
+    # The last bucket is whole too, so read up to its final moment rather than ``end``
+    buckets = fetch(level, bucket_key(starts[0], level), bucket_key(moment - timedelta(microseconds=1), level))
+    
+    points = []
+    for moment in starts:
+        if granularity == "week":
+            keys = [bucket_key(moment + timedelta(days=day), "day") for day in range(7)]
+        else:
+            keys = [bucket_key(moment, level)]
+        
+        revenue = purchase_cost = payroll = 0.0
+        for key in keys:
+            totals = buckets.get(key)
+            if totals is not None:
+                revenue += totals[0]
+                purchase_cost += totals[1]
+                payroll += totals[2]
+        expenses = purchase_cost + payroll
+        points.append({
+            "period_start": moment,
+            "revenue": revenue,
+            "purchase_cost": purchase_cost,
+            "payroll": payroll,
+            "expenses": expenses,
+            "profit": revenue - expenses
+        })
+    return points
+
+class Rollups(DatabaseListener):
+    """Revenue, purchase cost and payroll gross pay pre-aggregated by hour, day and month.
+    
+    Each bucket holds [count, amount] per measure and is updated in O(1)
+    per mutation; a bucket is dropped once every count returns to zero, so
+    add/delete pairs leave no float residue behind.
+    """
+    
+    def __init__(self):
+        self.buckets: Dict[str, Dict[str, List]] = {level: {} for level in LEVELS}
+        # Sorted bucket keys per level, for range lookups
+        self.keys: Dict[str, List[str]] = {level: [] for level in LEVELS}
+    
+    def _add(self, moment: datetime, measure: int, amount: float, sign: int):
+        for level in LEVELS:
+            key = bucket_key(moment, level)
+            buckets = self.buckets[level]
+            bucket = buckets.get(key)
+            if bucket is None:
+                bucket = buckets[key] = [0, 0.0] * len(MEASURES)
+                insort(self.keys[level], key)
+            
+            bucket[2 * measure] += sign
+            bucket[2 * measure + 1] += sign * amount
+            if bucket[2 * measure] == 0:
+                bucket[2 * measure + 1] = 0.0
+                if not any(bucket[0::2]):
+                    del buckets[key]
+                    keys = self.keys[level]
+                    del keys[bisect_left(keys, key)]
+    
+    def sale_added(self, sale: Sale):
+        self._add(sale.created_at, 0, sale.total_amount, 1)
+    
+    def sale_deleted(self, sale: Sale):
+        self._add(sale.created_at, 0, sale.total_amount, -1)
+    
+    def purchase_added(self, purchase: Purchase):
+        self._add(purchase.created_at, 1, purchase.total_amount, 1)
+    
+    def purchase_deleted(self, purchase: Purchase):
+        self._add(purchase.created_at, 1, purchase.total_amount, -1)
+    
+    def payroll_saved(self, old: Optional[PayrollEntry], new: PayrollEntry):
+        if old is not None:
+            self.payroll_deleted(old)
+        self._add(new.created_at, 2, new.gross_pay, 1)
+    
+    def payroll_deleted(self, entry: PayrollEntry):
+        self._add(entry.created_at, 2, entry.gross_pay, -1)
+    
+    def fetch(self, level: str, first_key: str, last_key: str) -> Dict[str, BucketTotals]:
+        keys = self.keys[level]
+        buckets = self.buckets[level]
+        result = {}
+        for key in keys[bisect_left(keys, first_key):bisect_right(keys, last_key)]:
+            bucket = buckets.get(key)
+            # Skip buckets emptied by a concurrent delete
+            if bucket is not None:
+                result[key] = (bucket[1], bucket[3], bucket[5])
+        return result
@@ -2,18 +2,41 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from datetime import timedelta
 from models import UserLogin, Token, User
-from auth import create_access_token, decode_access_token, ACCESS_TOKEN_EXPIRE_MINUTES
-from database import get_user_by_username, verify_user_password
+from auth import create_access_token, decode_access_token_payload, TokenCache, ACCESS_TOKEN_EXPIRE_MINUTES
+from database import get_database, get_user_by_username, verify_user_password_async
+from instrumentation import InstrumentedRoute, timed_phase
 
-router = APIRouter()
+router = APIRouter(route_class=InstrumentedRoute)
 security = HTTPBearer()
 
+# Verified tokens -> users; the database evicts entries when a user changes
+token_cache = TokenCache()
+get_database().add_listener(token_cache)
+
+def resolve_token_user(token: str) -> User:
+    """Verify a bearer token and resolve its user, using the token cache when possible"""
+    user = token_cache.get(token)
+    if user is not None:
+        return user
+    
+    payload = decode_access_token_payload(token)
+    user = get_user_by_username(payload["sub"])
+    
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User not found"
+        )
+    
+    token_cache.put(token, payload["exp"], user)
+    return user
+
 @router.post("/login", response_model=Token)
 async def login(user_credentials: UserLogin):
     """Login endpoint"""
     user = get_user_by_username(user_credentials.username)
     
-    if not user or not verify_user_password(user_credentials.username, user_credentials.password):
+    if not user or not await verify_user_password_async(user_credentials.username, user_credentials.password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -37,27 +60,12 @@ async def login(user_credentials: UserLogin):
 @router.get("/me", response_model=User)
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     """Get current user information"""
-    username = decode_access_token(credentials.credentials)
-    user = get_user_by_username(username)
-    
-    if user is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="User not found"
-        )
-    
-    return user
+    return resolve_token_user(credentials.credentials)
 
 async def get_current_active_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> User:
     """Dependency to get current active user"""
-    username = decode_access_token(credentials.credentials)
-    user = get_user_by_username(username)
-    
-    if user is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="User not found"
-        )
+    with timed_phase("auth"):
+        user = resolve_token_user(credentials.credentials)
     
     if not user.is_active:
         raise HTTPException(
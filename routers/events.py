@@ -0,0 +1,40 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from models import User
+from database import get_database
+from instrumentation import InstrumentedRoute, register_gauge
+from events import TOPICS, DashboardFeed, event_hub, event_stream, snapshot_events
+from routers.auth import get_current_active_user
+
+router = APIRouter(route_class=InstrumentedRoute)
+
+# Publishes every mutation of this process as a dashboard delta
+dashboard_feed = DashboardFeed(get_database())
+get_database().add_listener(dashboard_feed)
+register_gauge("event_stream_subscribers", "Open server-sent event streams", lambda: len(event_hub))
+
+@router.get("/")
+async def stream_events(
+    request: Request,
+    topics: str = Query(",".join(TOPICS), description="Comma-separated topics: dashboard, low-stock"),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Server-sent events with live updates, replacing polling.
+    
+    Each topic opens with a "snapshot" event of its current state, followed
+    by one incremental event per change.
+    """
+    requested = [topic.strip() for topic in topics.split(",") if topic.strip()]
+    unknown = [topic for topic in requested if topic not in TOPICS]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown topics: {', '.join(unknown)}"
+        )
+    if not requested:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="No topics requested"
+        )
+    
+    db = get_database()
+    return event_stream(request, requested, lambda: snapshot_events(db, requested))
@@ -1,17 +1,36 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from typing import Dict, List, Optional
 from datetime import datetime
-from models import InventoryItem, InventoryItemCreate, User
-from database import get_database
+from pydantic import TypeAdapter
+from models import InventoryItem, InventoryItemCreate, User, BatchRowResult, ImportResult
+from database import get_database, get_inventory_item_by_sku
+from instrumentation import InstrumentedRoute
 from routers.auth import get_current_active_user
+from pagination import ListParams, list_response
+from batch import read_csv_rows, read_csv_upload, validate_rows
+from events import LOW_STOCK_TOPIC, LowStockAlerts, event_stream, snapshot_events
 
-router = APIRouter()
+router = APIRouter(route_class=InstrumentedRoute)
+
+# CSV rows validated and looked up per round trip of a catalogue import
+IMPORT_BATCH_ROWS = 1000
+item_list_adapter = TypeAdapter(List[InventoryItemCreate])
+
+# Pushes items crossing their reorder level to /low-stock/stream subscribers
+low_stock_alerts = LowStockAlerts(get_database())
+get_database().add_listener(low_stock_alerts)
 
 @router.get("/", response_model=List[InventoryItem])
-async def get_inventory(current_user: User = Depends(get_current_active_user)):
-    """Get all inventory items"""
+async def get_inventory(
+    response: Response,
+    params: ListParams = Depends(),
+    category: Optional[str] = None,
+    current_user: User = Depends(get_current_active_user)
+):
+    """Get all inventory items (supports keyset pagination, filters and NDJSON streaming)"""
     db = get_database()
-    return list(db.inventory.values())
+    filters = {"category": category} if category else {}
+    return list_response(db, "inventory", params, response, filters)
 
 @router.post("/", response_model=InventoryItem)
 async def create_inventory_item(
@@ -21,32 +40,104 @@ async def create_inventory_item(
     """Create a new inventory item"""
     db = get_database()
     
-    # Check if SKU already exists
-    for existing_item in db.inventory.values():
-        if existing_item.sku == item.sku:
+    # Check the SKU, allocate the id and save in one transaction
+    with db.transaction():
+        # Check if SKU already exists
+        if get_inventory_item_by_sku(item.sku):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="SKU already exists"
             )
+        
+        item_id = db.get_next_inventory_id()
+        now = datetime.now()
+        
+        inventory_item = InventoryItem(
+            id=item_id,
+            name=item.name,
+            description=item.description,
+            sku=item.sku,
+            unit_price=item.unit_price,
+            quantity_in_stock=item.quantity_in_stock,
+            reorder_level=item.reorder_level,
+            category=item.category,
+            created_at=now,
+            updated_at=now
+        )
+        
+        db.save_inventory_item(inventory_item)
+    return inventory_item
+
+@router.post("/import", response_model=ImportResult)
+async def import_inventory(
+    request: Request,
+    upsert: bool = True,
+    current_user: User = Depends(get_current_active_user)
+):
+    """Create or update inventory items from a CSV catalogue.
+    
+    The CSV comes as the 'file' field of a multipart upload or as a text/csv
+    body, with a header row naming InventoryItemCreate fields. Rows are
+    validated in batches; a SKU repeated in the file is rejected after its
+    first row, and a SKU already in stock updates that item (or is rejected
+    when ``upsert`` is false). Once the file is read, SKUs are looked up and
+    every accepted row is saved in one transaction. ``index`` in the results
+    counts data rows from 0.
+    """
+    db = get_database()
+    required = [name for name, field in InventoryItemCreate.model_fields.items() if field.is_required()]
+    rows = read_csv_rows(await read_csv_upload(request), required)
     
-    item_id = db.get_next_inventory_id()
-    now = datetime.now()
+    results: List[BatchRowResult] = []
+    valid_items = []
+    first_rows: Dict[str, int] = {}
+    while True:
+        batch = [row for _, row in zip(range(IMPORT_BATCH_ROWS), rows)]
+        if not batch:
+            break
+        valid, invalid = validate_rows(item_list_adapter, batch)
+        for index, error in invalid:
+            results.append(BatchRowResult(index=index, success=False, error=error))
+        for index, item in valid:
+            if item.sku in first_rows:
+                results.append(BatchRowResult(
+                    index=index, success=False,
+                    error=f"Duplicate SKU {item.sku} (first seen in row {first_rows[item.sku]})"
+                ))
+                continue
+            first_rows[item.sku] = index
+            valid_items.append((index, item))
     
-    inventory_item = InventoryItem(
-        id=item_id,
-        name=item.name,
-        description=item.description,
-        sku=item.sku,
-        unit_price=item.unit_price,
-        quantity_in_stock=item.quantity_in_stock,
-        reorder_level=item.reorder_level,
-        category=item.category,
-        created_at=now,
-        updated_at=now
-    )
+    # Resolve SKUs and save in one transaction, so no other writer can create
+    # one of them or change an item's stock in between
+    accepted = []
+    with db.transaction():
+        existing_items = db.find_inventory_items_by_sku(first_rows.keys())
+        for index, item in valid_items:
+            if item.sku in existing_items and not upsert:
+                results.append(BatchRowResult(index=index, success=False, error="SKU already exists"))
+                continue
+            results.append(BatchRowResult(index=index, success=True))
+            accepted.append((results[-1], item, existing_items.get(item.sku)))
+        
+        # One id allocation for the new items, then a single save of everything accepted
+        now = datetime.now()
+        new_ids = iter(db.allocate_ids("inventory", sum(existing is None for _, _, existing in accepted)))
+        items = []
+        for result, item, existing in accepted:
+            result.id = existing.id if existing is not None else next(new_ids)
+            items.append(InventoryItem(
+                id=result.id,
+                **item.model_dump(),
+                created_at=existing.created_at if existing is not None else now,
+                updated_at=now
+            ))
+        db.save_inventory_items(items)
     
-    db.inventory[item_id] = inventory_item
-    return inventory_item
+    results.sort(key=lambda result: result.index)
+    created = sum(existing is None for _, _, existing in accepted)
+    return ImportResult(created=created, updated=len(accepted) - created, failed=len(results) - len(accepted),
+                        results=results)
 
 @router.get("/{item_id}", response_model=InventoryItem)
 async def get_inventory_item(
@@ -73,36 +164,40 @@ async def update_inventory_item(
 ):
     """Update an inventory item"""
     db = get_database()
-    existing_item = db.inventory.get(item_id)
     
-    if not existing_item:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Inventory item not found"
-        )
-    
-    # Check if SKU already exists for a different item
-    for other_item in db.inventory.values():
-        if other_item.id != item_id and other_item.sku == item_update.sku:
+    # Load, check the SKU and save in one transaction, so stock changes and
+    # SKU checks from other requests cannot interleave with this update
+    with db.transaction():
+        existing_item = db.inventory.get(item_id)
+        
+        if not existing_item:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Inventory item not found"
+            )
+        
+        # Check if SKU already exists for a different item
+        other_item = get_inventory_item_by_sku(item_update.sku)
+        if other_item and other_item.id != item_id:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="SKU already exists"
             )
-    
-    updated_item = InventoryItem(
-        id=item_id,
-        name=item_update.name,
-        description=item_update.description,
-        sku=item_update.sku,
-        unit_price=item_update.unit_price,
-        quantity_in_stock=item_update.quantity_in_stock,
-        reorder_level=item_update.reorder_level,
-        category=item_update.category,
-        created_at=existing_item.created_at,
-        updated_at=datetime.now()
-    )
-    
-    db.inventory[item_id] = updated_item
+        
+        updated_item = InventoryItem(
+            id=item_id,
+            name=item_update.name,
+            description=item_update.description,
+            sku=item_update.sku,
+            unit_price=item_update.unit_price,
+            quantity_in_stock=item_update.quantity_in_stock,
+            reorder_level=item_update.reorder_level,
+            category=item_update.category,
+            created_at=existing_item.created_at,
+            updated_at=datetime.now()
+        )
+        
+        db.save_inventory_item(updated_item)
     return updated_item
 
 @router.delete("/{item_id}")
@@ -124,17 +219,21 @@ async def delete_inventory_item(
             detail="Inventory item not found"
         )
     
-    del db.inventory[item_id]
+    db.delete_inventory_item(item_id)
     return {"message": "Inventory item deleted successfully"}
 
 @router.get("/low-stock/items", response_model=List[InventoryItem])
 async def get_low_stock_items(current_user: User = Depends(get_current_active_user)):
     """Get items that are at or below reorder level"""
     db = get_database()
-    low_stock_items = []
-    
-    for item in db.inventory.values():
-        if item.quantity_in_stock <= item.reorder_level:
-            low_stock_items.append(item)
+    return db.low_stock_items()
+
+@router.get("/low-stock/stream")
+async def stream_low_stock_alerts(request: Request, current_user: User = Depends(get_current_active_user)):
+    """Server-sent events for items crossing their reorder level.
     
-    return low_stock_items
+    The stream opens with a "snapshot" of the current low-stock items, then
+    sends "low", "restocked" and "removed" events as stock changes.
+    """
+    db = get_database()
+    return event_stream(request, [LOW_STOCK_TOPIC], lambda: snapshot_events(db, [LOW_STOCK_TOPIC]))
@@ -0,0 +1,54 @@
+import os
+import secrets
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import PlainTextResponse
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from database import get_database
+from instrumentation import InstrumentedRoute, register_gauge, render_metrics, sampler
+from routers.auth import get_current_active_user
+
+# Bearer token scrapers must send; unset, the endpoints take a user's access token like the rest of the API
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+
+router = APIRouter(route_class=InstrumentedRoute)
+security = HTTPBearer(auto_error=False)
+
+register_gauge(
+    "db_table_rows", "Rows per table", lambda: {(table, ): rows for table, rows in get_database().table_sizes().items()},
+    labels=("table",)
+)
+
+async def check_metrics_token(credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)):
+    """Dependency requiring METRICS_TOKEN, or a signed-in active user when none is configured"""
+    if credentials is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    if METRICS_TOKEN is None:
+        await get_current_active_user(credentials)
+        return
+    if not secrets.compare_digest(credentials.credentials, METRICS_TOKEN):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid metrics token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+@router.get("", response_class=PlainTextResponse, dependencies=[Depends(check_metrics_token)])
+async def get_metrics():
+    """Prometheus metrics: route latency histograms, request phase timings and table sizes"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+@router.get("/profile", response_class=PlainTextResponse, dependencies=[Depends(check_metrics_token)])
+async def get_profile(reset: bool = Query(False, description="Clear the collected samples after reading them")):
+    """Stacks sampled while profiled requests ran, in folded format for flamegraph.pl or speedscope.
+    
+    Empty unless PROFILE_SAMPLE_EVERY is set.
+    """
+    folded = sampler.folded()
+    if reset:
+        sampler.reset()
+    return PlainTextResponse(folded)
@@ -1,17 +1,25 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from typing import List, Optional
 from datetime import datetime
 from models import PayrollEntry, PayrollEntryCreate, User
 from database import get_database
+from instrumentation import InstrumentedRoute
 from routers.auth import get_current_active_user
+from pagination import ListParams, list_response
 
-router = APIRouter()
+router = APIRouter(route_class=InstrumentedRoute)
 
 @router.get("/", response_model=List[PayrollEntry])
-async def get_payroll_entries(current_user: User = Depends(get_current_active_user)):
-    """Get all payroll entries"""
+async def get_payroll_entries(
+    response: Response,
+    params: ListParams = Depends(),
+    employee_id: Optional[str] = None,
+    current_user: User = Depends(get_current_active_user)
+):
+    """Get all payroll entries (supports keyset pagination, filters and NDJSON streaming)"""
     db = get_database()
-    return list(db.payroll.values())
+    filters = {"employee_id": employee_id} if employee_id else {}
+    return list_response(db, "payroll", params, response, filters)
 
 @router.post("/", response_model=PayrollEntry)
 async def create_payroll_entry(
@@ -32,25 +40,27 @@ async def create_payroll_entry(
     gross_pay = payroll.base_salary + overtime_pay + payroll.bonus
     net_pay = gross_pay - payroll.deductions
     
-    payroll_id = db.get_next_payroll_id()
-    payroll_entry = PayrollEntry(
-        id=payroll_id,
-        employee_name=payroll.employee_name,
-        employee_id=payroll.employee_id,
-        base_salary=payroll.base_salary,
-        overtime_hours=payroll.overtime_hours,
-        overtime_rate=payroll.overtime_rate,
-        bonus=payroll.bonus,
-        deductions=payroll.deductions,
-        pay_period_start=payroll.pay_period_start,
-        pay_period_end=payroll.pay_period_end,
-        gross_pay=gross_pay,
-        net_pay=net_pay,
-        created_by=current_user.id,
-        created_at=datetime.now()
-    )
-    
-    db.payroll[payroll_id] = payroll_entry
+    # Allocate the id and save in one transaction, so ids become visible in order
+    with db.transaction():
+        payroll_id = db.get_next_payroll_id()
+        payroll_entry = PayrollEntry(
+            id=payroll_id,
+            employee_name=payroll.employee_name,
+            employee_id=payroll.employee_id,
+            base_salary=payroll.base_salary,
+            overtime_hours=payroll.overtime_hours,
+            overtime_rate=payroll.overtime_rate,
+            bonus=payroll.bonus,
+            deductions=payroll.deductions,
+            pay_period_start=payroll.pay_period_start,
+            pay_period_end=payroll.pay_period_end,
+            gross_pay=gross_pay,
+            net_pay=net_pay,
+            created_by=current_user.id,
+            created_at=datetime.now()
+        )
+        
+        db.save_payroll_entry(payroll_entry)
     return payroll_entry
 
 @router.get("/{payroll_id}", response_model=PayrollEntry)
@@ -114,7 +124,7 @@ async def update_payroll_entry(
         created_at=existing_entry.created_at
     )
     
-    db.payroll[payroll_id] = updated_entry
+    db.save_payroll_entry(updated_entry)
     return updated_entry
 
 @router.delete("/{payroll_id}")
@@ -136,5 +146,5 @@ async def delete_payroll_entry(
             detail="Payroll entry not found"
         )
     
-    del db.payroll[payroll_id]
+    db.delete_payroll_entry(payroll_id)
     return {"message": "Payroll entry deleted successfully"}
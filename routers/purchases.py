@@ -1,17 +1,30 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from typing import Dict, List, Optional
+from collections import Counter
 from datetime import datetime
-from models import Purchase, PurchaseCreate, PurchaseItem, User
+from pydantic import ValidationError
+from models import Purchase, PurchaseCreate, PurchaseItem, User, BatchResult, BatchRowResult
 from database import get_database
+from instrumentation import InstrumentedRoute
+from storage import StockError
 from routers.auth import get_current_active_user
+from pagination import ListParams, list_response, parse_date
+from exports import EXPORT_FORMAT_PATTERN, ledger_export
+from batch import read_batch_rows, row_error
 
-router = APIRouter()
+router = APIRouter(route_class=InstrumentedRoute)
 
 @router.get("/", response_model=List[Purchase])
-async def get_purchases(current_user: User = Depends(get_current_active_user)):
-    """Get all purchases"""
+async def get_purchases(
+    response: Response,
+    params: ListParams = Depends(),
+    supplier: Optional[str] = None,
+    current_user: User = Depends(get_current_active_user)
+):
+    """Get all purchases (supports keyset pagination, filters and NDJSON streaming)"""
     db = get_database()
-    return list(db.purchases.values())
+    filters = {"supplier_name": supplier} if supplier else {}
+    return list_response(db, "purchases", params, response, filters)
 
 @router.post("/", response_model=Purchase)
 async def create_purchase(
@@ -43,28 +56,136 @@ async def create_purchase(
         purchase_items.append(purchase_item)
         total_amount += item.quantity * item.unit_cost
     
-    # Create purchase
-    purchase_id = db.get_next_purchase_id()
-    new_purchase = Purchase(
-        id=purchase_id,
-        supplier_name=purchase.supplier_name,
-        supplier_email=purchase.supplier_email,
-        items=purchase_items,
-        total_amount=total_amount,
-        created_by=current_user.id,
-        created_at=datetime.now(),
-        notes=purchase.notes
-    )
-    
     # Update inventory quantities
+    received = Counter()
     for item in purchase.items:
-        inventory_item = db.inventory[item.inventory_item_id]
-        inventory_item.quantity_in_stock += item.quantity
-        inventory_item.updated_at = datetime.now()
-    
-    db.purchases[purchase_id] = new_purchase
+        received[item.inventory_item_id] += item.quantity
+    # The stock change and the record commit together, or neither does
+    with db.transaction():
+        try:
+            db.change_stock(dict(received))
+        except StockError as error:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(error)
+            )
+        
+        # Create purchase
+        purchase_id = db.get_next_purchase_id()
+        new_purchase = Purchase(
+            id=purchase_id,
+            supplier_name=purchase.supplier_name,
+            supplier_email=purchase.supplier_email,
+            items=purchase_items,
+            total_amount=total_amount,
+            created_by=current_user.id,
+            created_at=datetime.now(),
+            notes=purchase.notes
+        )
+        
+        db.add_purchase(new_purchase)
     return new_purchase
 
+@router.post("/batch", response_model=BatchResult)
+async def create_purchases_batch(
+    request: Request,
+    current_user: User = Depends(get_current_active_user)
+):
+    """Create many purchases from a JSON array or an NDJSON stream of PurchaseCreate rows.
+    
+    Rows referencing unknown items are rejected individually; inventory is
+    updated once per item for all accepted rows.
+    """
+    db = get_database()
+    
+    results: List[BatchRowResult] = []
+    parsed = []
+    async for index, payload in read_batch_rows(request):
+        try:
+            parsed.append((index, PurchaseCreate.model_validate(payload)))
+        except ValidationError as error:
+            results.append(BatchRowResult(index=index, success=False, error=row_error(payload, error)))
+    
+    # Check items only once the body is read, so none can vanish before the stock update
+    accepted = []
+    received = Counter()
+    item_names: Dict[int, str] = {}
+    
+    for index, purchase in parsed:
+        error = None
+        for item in purchase.items:
+            item_id = item.inventory_item_id
+            if item_id not in item_names:
+                inventory_item = db.inventory.get(item_id)
+                if not inventory_item:
+                    error = f"Inventory item with ID {item_id} not found"
+                    break
+                item_names[item_id] = inventory_item.name
+        
+        if error is not None:
+            results.append(BatchRowResult(index=index, success=False, error=error))
+            continue
+        
+        for item in purchase.items:
+            received[item.inventory_item_id] += item.quantity
+        results.append(BatchRowResult(index=index, success=True))
+        accepted.append((results[-1], purchase))
+    
+    # Ids, the stock change and the records commit together, so ids become visible in order
+    with db.transaction():
+        # Create all accepted purchases with one id allocation and one stock update per item
+        now = datetime.now()
+        new_purchases = []
+        for (result, purchase), purchase_id in zip(accepted, db.allocate_ids("purchases", len(accepted))):
+            purchase_items = [
+                PurchaseItem(
+                    id=line_number,
+                    inventory_item_id=item.inventory_item_id,
+                    inventory_item_name=item_names[item.inventory_item_id],
+                    quantity=item.quantity,
+                    unit_cost=item.unit_cost
+                )
+                for line_number, item in enumerate(purchase.items, start=1)
+            ]
+            total_amount = sum(item.quantity * item.unit_cost for item in purchase.items)
+            new_purchases.append(Purchase(
+                id=purchase_id,
+                supplier_name=purchase.supplier_name,
+                supplier_email=purchase.supplier_email,
+                items=purchase_items,
+                total_amount=total_amount,
+                created_by=current_user.id,
+                created_at=now,
+                notes=purchase.notes
+            ))
+            result.id = purchase_id
+            result.total_amount = total_amount
+        
+        try:
+            db.change_stock(dict(received))
+        except StockError as error:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=str(error)
+            )
+        db.add_purchases(new_purchases)
+    
+    results.sort(key=lambda result: result.index)
+    return BatchResult(created=len(new_purchases), failed=len(results) - len(new_purchases), results=results)
+
+@router.get("/export")
+async def export_purchases(
+    format: str = Query("csv", pattern=EXPORT_FORMAT_PATTERN),
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    gzip: bool = False,
+    current_user: User = Depends(get_current_active_user)
+):
+    """Stream the purchase ledger as a file, one row per line item"""
+    start = parse_date(start_date) if start_date else None
+    end = parse_date(end_date) if end_date else None
+    return ledger_export(get_database(), "purchases", format, start, end, gzip)
+
 @router.get("/{purchase_id}", response_model=Purchase)
 async def get_purchase(
     purchase_id: int,
@@ -95,20 +216,27 @@ async def delete_purchase(
         )
     
     db = get_database()
-    purchase = db.purchases.get(purchase_id)
-    
-    if not purchase:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Purchase not found"
-        )
-    
-    # Reduce inventory quantities
-    for item in purchase.items:
-        if item.inventory_item_id in db.inventory:
-            inventory_item = db.inventory[item.inventory_item_id]
-            inventory_item.quantity_in_stock -= item.quantity
-            inventory_item.updated_at = datetime.now()
-    
-    del db.purchases[purchase_id]
+    # Load, change the stock and delete in one transaction, so two deletes cannot both apply
+    with db.transaction():
+        purchase = db.purchases.get(purchase_id)
+        
+        if not purchase:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Purchase not found"
+            )
+        
+        # Reduce inventory quantities, refusing if the received stock has already been sold
+        removed = Counter()
+        for item in purchase.items:
+            removed[item.inventory_item_id] -= item.quantity
+        try:
+            db.change_stock(dict(removed), skip_missing=True)
+        except StockError as error:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Cannot delete purchase: {error}"
+            )
+        
+        db.delete_purchase(purchase_id)
     return {"message": "Purchase deleted successfully"}
@@ -1,14 +1,55 @@
-from fastapi import APIRouter, Depends, HTTPException
-from typing import List
+import json
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
+from typing import List, Optional
 from datetime import datetime, timedelta
-from models import FinancialSummary, InventoryReport, SalesReport, User, InventoryItem
+from models import (
+    FinancialSummary, InventoryReport, SalesReport, TimeSeries, User, InventoryItem, InventoryValuation,
+    GrossMarginReport, LedgerAccount, TrialBalance, ProfitAndLoss, BalanceSheet
+)
 from database import get_database
+from instrumentation import InstrumentedRoute, register_gauge
+from report_cache import ReportCache, cached_report
+from costing import CostLedger, gross_margin, inventory_valuation
+from fast_json import dumps
+from general_ledger import ACCOUNTS, GeneralLedger, balance_sheet, iter_journal, profit_and_loss, trial_balance
+from pagination import ndjson_chunks, parse_date
 from routers.auth import get_current_active_user
 
-router = APIRouter()
+router = APIRouter(route_class=InstrumentedRoute)
+
+# Serialized report bodies; the database drops entries when a table they read changes
+report_cache = ReportCache()
+get_database().add_listener(report_cache)
+register_gauge("report_cache_entries", "Cached report responses", lambda: len(report_cache))
+register_gauge("report_cache_bytes", "Bytes of cached report responses", lambda: report_cache.size)
+
+# FIFO and weighted-average cost layers per item, fed by purchases and consumed by sales
+cost_ledger = CostLedger(get_database())
+get_database().add_listener(cost_ledger)
+
+# Double-entry postings of every sale, purchase and payroll entry, balanced per account and month
+general_ledger = GeneralLedger(get_database())
+get_database().add_listener(general_ledger)
+
+# Ledger periods are calendar months
+PERIOD_PATTERN = r"^\d{4}-(0[1-9]|1[0-2])$"
+LEDGER_TABLES = ("sales", "purchases", "payroll")
+
+def ledger_periods(start: Optional[str], end: Optional[str]):
+    """Resolve a start..end month range; a missing start is this month, a missing end is start"""
+    start = start or datetime.now().strftime("%Y-%m")
+    end = end or start
+    if start > end:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="start must not be after end"
+        )
+    return start, end
 
 @router.get("/financial-summary", response_model=FinancialSummary)
 async def get_financial_summary(
+    request: Request,
     start_date: str = None,
     end_date: str = None,
     current_user: User = Depends(get_current_active_user)
@@ -17,6 +58,7 @@ async def get_financial_summary(
     db = get_database()
     
     # Default to current month if no dates provided
+    cacheable = bool(start_date and end_date)
     if not start_date or not end_date:
         now = datetime.now()
         start_date = now.replace(day=1).isoformat()
@@ -25,63 +67,54 @@ async def get_financial_summary(
     start_dt = datetime.fromisoformat(start_date.replace('Z', '+00:00').replace('+00:00', ''))
     end_dt = datetime.fromisoformat(end_date.replace('Z', '+00:00').replace('+00:00', ''))
     
-    total_revenue = 0
-    total_expenses = 0
-    
-    # Calculate revenue from sales
-    for sale in db.sales.values():
-        if start_dt <= sale.created_at <= end_dt:
-            total_revenue += sale.total_amount
-    
-    # Calculate expenses from purchases and payroll
-    for purchase in db.purchases.values():
-        if start_dt <= purchase.created_at <= end_dt:
-            total_expenses += purchase.total_amount
-    
-    for payroll_entry in db.payroll.values():
-        if start_dt <= payroll_entry.created_at <= end_dt:
-            total_expenses += payroll_entry.gross_pay
+    # A default period ends now, so its result cannot be reused
+    cache_key = ("financial-summary", start_dt, end_dt) if cacheable else None
     
-    net_income = total_revenue - total_expenses
+    def build() -> bytes:
+        # Revenue from sales; expenses from purchases and payroll
+        total_revenue, total_expenses = db.financial_totals(start_dt, end_dt)
+        
+        net_income = total_revenue - total_expenses
+        
+        return FinancialSummary(
+            total_revenue=total_revenue,
+            total_expenses=total_expenses,
+            net_income=net_income,
+            period_start=start_dt,
+            period_end=end_dt
+        ).model_dump_json().encode()
     
-    return FinancialSummary(
-        total_revenue=total_revenue,
-        total_expenses=total_expenses,
-        net_income=net_income,
-        period_start=start_dt,
-        period_end=end_dt
-    )
+    return cached_report(report_cache, request, cache_key, ("sales", "purchases", "payroll"), build)
 
 @router.get("/inventory-report", response_model=InventoryReport)
-async def get_inventory_report(current_user: User = Depends(get_current_active_user)):
+async def get_inventory_report(request: Request, current_user: User = Depends(get_current_active_user)):
     """Get inventory report"""
     db = get_database()
     
-    total_items = len(db.inventory)
-    total_value = 0
-    low_stock_items = []
-    
-    for item in db.inventory.values():
-        total_value += item.quantity_in_stock * item.unit_price
-        if item.quantity_in_stock <= item.reorder_level:
-            low_stock_items.append(item)
+    def build() -> bytes:
+        total_items, total_value, low_stock_items = db.inventory_summary()
+        
+        return InventoryReport(
+            total_items=total_items,
+            total_value=total_value,
+            low_stock_items=low_stock_items
+        ).model_dump_json().encode()
     
-    return InventoryReport(
-        total_items=total_items,
-        total_value=total_value,
-        low_stock_items=low_stock_items
-    )
+    return cached_report(report_cache, request, ("inventory-report",), ("inventory",), build)
 
 @router.get("/sales-report", response_model=SalesReport)
 async def get_sales_report(
+    request: Request,
     start_date: str = None,
     end_date: str = None,
+    top_n: int = Query(5, ge=1, le=100),
     current_user: User = Depends(get_current_active_user)
 ):
     """Get sales report"""
     db = get_database()
     
     # Default to current month if no dates provided
+    cacheable = bool(start_date and end_date)
     if not start_date or not end_date:
         now = datetime.now()
         start_date = now.replace(day=1).isoformat()
@@ -90,79 +123,171 @@ async def get_sales_report(
     start_dt = datetime.fromisoformat(start_date.replace('Z', '+00:00').replace('+00:00', ''))
     end_dt = datetime.fromisoformat(end_date.replace('Z', '+00:00').replace('+00:00', ''))
     
-    sales_in_period = []
-    total_revenue = 0
-    item_sales = {}
-    
-    for sale in db.sales.values():
-        if start_dt <= sale.created_at <= end_dt:
-            sales_in_period.append(sale)
-            total_revenue += sale.total_amount
-            
-            # Track item sales for top selling items
-            for item in sale.items:
-                if item.inventory_item_name not in item_sales:
-                    item_sales[item.inventory_item_name] = 0
-                item_sales[item.inventory_item_name] += item.quantity
-    
-    # Get top 5 selling items
-    top_selling_items = sorted(
-        [{"item": name, "quantity_sold": qty} for name, qty in item_sales.items()],
-        key=lambda x: x["quantity_sold"],
-        reverse=True
-    )[:5]
-    
-    return SalesReport(
-        total_sales=len(sales_in_period),
-        total_revenue=total_revenue,
-        period_start=start_dt,
-        period_end=end_dt,
-        top_selling_items=top_selling_items
-    )
+    # A default period ends now, so its result cannot be reused
+    cache_key = ("sales-report", start_dt, end_dt, top_n) if cacheable else None
+    
+    def build() -> bytes:
+        total_sales, total_revenue = db.sales_totals(start_dt, end_dt)
+        
+        # Top sellers by inventory item, so renamed items are counted once
+        top_selling_items = [
+            {"inventory_item_id": item_id, "item": name, "quantity_sold": qty}
+            for item_id, name, qty in db.top_selling_items(start_dt, end_dt, top_n)
+        ]
+        
+        return SalesReport(
+            total_sales=total_sales,
+            total_revenue=total_revenue,
+            period_start=start_dt,
+            period_end=end_dt,
+            top_selling_items=top_selling_items
+        ).model_dump_json().encode()
+    
+    # Item names come from inventory, so renames invalidate too
+    return cached_report(report_cache, request, cache_key, ("sales", "inventory"), build)
+
+@router.get("/timeseries", response_model=TimeSeries)
+async def get_timeseries(
+    request: Request,
+    granularity: str = Query("day", pattern="^(hour|day|week|month)$"),
+    start_date: str = None,
+    end_date: str = None,
+    current_user: User = Depends(get_current_active_user)
+):
+    """Get revenue, expenses and profit per hour, day, week or month"""
+    db = get_database()
+    
+    # Default to current month if no dates provided
+    cacheable = bool(start_date and end_date)
+    if not start_date or not end_date:
+        now = datetime.now()
+        start_date = now.replace(day=1).isoformat()
+        end_date = now.isoformat()
+    
+    start_dt = datetime.fromisoformat(start_date.replace('Z', '+00:00').replace('+00:00', ''))
+    end_dt = datetime.fromisoformat(end_date.replace('Z', '+00:00').replace('+00:00', ''))
+    
+    # A default period ends now, so its result cannot be reused
+    cache_key = ("timeseries", granularity, start_dt, end_dt) if cacheable else None
+    
+    def build() -> bytes:
+        # Served from pre-aggregated rollups, not from the transactions
+        try:
+            points = db.timeseries(granularity, start_dt, end_dt)
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
+        
+        return TimeSeries(
+            granularity=granularity,
+            period_start=start_dt,
+            period_end=end_dt,
+            points=points
+        ).model_dump_json().encode()
+    
+    return cached_report(report_cache, request, cache_key, ("sales", "purchases", "payroll"), build)
 
 @router.get("/dashboard-stats")
-async def get_dashboard_stats(current_user: User = Depends(get_current_active_user)):
+async def get_dashboard_stats(request: Request, current_user: User = Depends(get_current_active_user)):
     """Get dashboard statistics"""
     db = get_database()
-    
-    # Current month stats
     now = datetime.now()
-    month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    
-    monthly_sales = 0
-    monthly_revenue = 0
-    for sale in db.sales.values():
-        if sale.created_at >= month_start:
-            monthly_sales += 1
-            monthly_revenue += sale.total_amount
-    
-    monthly_expenses = 0
-    for purchase in db.purchases.values():
-        if purchase.created_at >= month_start:
-            monthly_expenses += purchase.total_amount
-    
-    for payroll_entry in db.payroll.values():
-        if payroll_entry.created_at >= month_start:
-            monthly_expenses += payroll_entry.gross_pay
-    
-    # Inventory stats
-    total_inventory_value = sum(
-        item.quantity_in_stock * item.unit_price 
-        for item in db.inventory.values()
-    )
     
-    low_stock_count = sum(
-        1 for item in db.inventory.values() 
-        if item.quantity_in_stock <= item.reorder_level
+    # The payload covers the calendar month of now, so the month is the whole key
+    return cached_report(
+        report_cache, request, ("dashboard-stats", now.year, now.month),
+        ("inventory", "sales", "purchases", "payroll"),
+        lambda: json.dumps(db.dashboard_stats(now)).encode()
     )
+
+@router.get("/inventory-valuation", response_model=InventoryValuation)
+async def get_inventory_valuation(
+    request: Request,
+    method: str = Query("fifo", pattern="^(fifo|average)$"),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Stock valued at cost (FIFO or weighted average) rather than at selling price"""
+    db = get_database()
+    
+    def build() -> bytes:
+        valuation = inventory_valuation(cost_ledger, sorted(db.inventory.values(), key=lambda item: item.id), method)
+        return InventoryValuation(**valuation).model_dump_json().encode()
+    
+    return cached_report(report_cache, request, ("inventory-valuation", method), ("inventory", "sales", "purchases"), build)
+
+@router.get("/gross-margin", response_model=GrossMarginReport)
+async def get_gross_margin(
+    request: Request,
+    method: str = Query("fifo", pattern="^(fifo|average)$"),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Revenue, cost of goods sold and gross margin per item, costed FIFO or by weighted average"""
+    def build() -> bytes:
+        return GrossMarginReport(**gross_margin(cost_ledger, method)).model_dump_json().encode()
+    
+    return cached_report(report_cache, request, ("gross-margin", method), ("inventory", "sales", "purchases"), build)
+
+@router.get("/accounts", response_model=List[LedgerAccount])
+async def get_accounts(current_user: User = Depends(get_current_active_user)):
+    """Chart of accounts the general ledger posts to"""
+    return [LedgerAccount(**account._asdict()) for account in ACCOUNTS.values()]
+
+@router.get("/trial-balance", response_model=TrialBalance)
+async def get_trial_balance(
+    request: Request,
+    start: Optional[str] = Query(None, pattern=PERIOD_PATTERN),
+    end: Optional[str] = Query(None, pattern=PERIOD_PATTERN),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Account balances at the end of month end, with revenue and expenses for the months start..end (YYYY-MM, default this month)"""
+    start, end = ledger_periods(start, end)
     
-    return {
-        "monthly_sales": monthly_sales,
-        "monthly_revenue": monthly_revenue,
-        "monthly_expenses": monthly_expenses,
-        "monthly_profit": monthly_revenue - monthly_expenses,
-        "total_inventory_items": len(db.inventory),
-        "total_inventory_value": total_inventory_value,
-        "low_stock_items": low_stock_count,
-        "total_employees": len(set(entry.employee_id for entry in db.payroll.values()))
-    }
+    def build() -> bytes:
+        return TrialBalance(**trial_balance(general_ledger, start, end)).model_dump_json().encode()
+    
+    return cached_report(report_cache, request, ("trial-balance", start, end), LEDGER_TABLES, build)
+
+@router.get("/profit-and-loss", response_model=ProfitAndLoss)
+async def get_profit_and_loss(
+    request: Request,
+    start: Optional[str] = Query(None, pattern=PERIOD_PATTERN),
+    end: Optional[str] = Query(None, pattern=PERIOD_PATTERN),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Revenue and expense accounts for the months start..end (YYYY-MM, default this month)"""
+    start, end = ledger_periods(start, end)
+    
+    def build() -> bytes:
+        return ProfitAndLoss(**profit_and_loss(general_ledger, start, end)).model_dump_json().encode()
+    
+    return cached_report(report_cache, request, ("profit-and-loss", start, end), LEDGER_TABLES, build)
+
+@router.get("/balance-sheet", response_model=BalanceSheet)
+async def get_balance_sheet(
+    request: Request,
+    as_of: Optional[str] = Query(None, pattern=PERIOD_PATTERN),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Assets, liabilities and equity at the end of month as_of (YYYY-MM, default this month)"""
+    as_of = as_of or datetime.now().strftime("%Y-%m")
+    
+    def build() -> bytes:
+        return BalanceSheet(**balance_sheet(general_ledger, as_of)).model_dump_json().encode()
+    
+    return cached_report(report_cache, request, ("balance-sheet", as_of), LEDGER_TABLES, build)
+
+@router.get("/journal")
+async def get_journal(
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    current_user: User = Depends(get_current_active_user)
+):
+    """Journal entries of the period in date order, streamed as NDJSON"""
+    entries = iter_journal(
+        get_database(),
+        parse_date(start_date) if start_date else None,
+        parse_date(end_date) if end_date else None
+    )
+    return StreamingResponse(ndjson_chunks(dumps(entry) for entry in entries), media_type="application/x-ndjson")
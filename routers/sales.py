@@ -1,17 +1,30 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from typing import Dict, List, Optional
+from collections import Counter
 from datetime import datetime
-from models import Sale, SaleCreate, SaleItem, User
+from pydantic import ValidationError
+from models import Sale, SaleCreate, SaleItem, User, BatchResult, BatchRowResult
 from database import get_database
+from instrumentation import InstrumentedRoute
+from storage import StockError
 from routers.auth import get_current_active_user
+from pagination import ListParams, list_response, parse_date
+from exports import EXPORT_FORMAT_PATTERN, ledger_export
+from batch import read_batch_rows, row_error
 
-router = APIRouter()
+router = APIRouter(route_class=InstrumentedRoute)
 
 @router.get("/", response_model=List[Sale])
-async def get_sales(current_user: User = Depends(get_current_active_user)):
-    """Get all sales"""
+async def get_sales(
+    response: Response,
+    params: ListParams = Depends(),
+    customer: Optional[str] = None,
+    current_user: User = Depends(get_current_active_user)
+):
+    """Get all sales (supports keyset pagination, filters and NDJSON streaming)"""
     db = get_database()
-    return list(db.sales.values())
+    filters = {"customer_name": customer} if customer else {}
+    return list_response(db, "sales", params, response, filters)
 
 @router.post("/", response_model=Sale)
 async def create_sale(
@@ -33,12 +46,6 @@ async def create_sale(
                 detail=f"Inventory item with ID {item.inventory_item_id} not found"
             )
         
-        if inventory_item.quantity_in_stock < item.quantity:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Insufficient stock for {inventory_item.name}. Available: {inventory_item.quantity_in_stock}"
-            )
-        
         sale_item = SaleItem(
             id=len(sale_items) + 1,
             inventory_item_id=item.inventory_item_id,
@@ -49,28 +56,153 @@ async def create_sale(
         sale_items.append(sale_item)
         total_amount += item.quantity * item.unit_price
     
-    # Create sale
-    sale_id = db.get_next_sale_id()
-    new_sale = Sale(
-        id=sale_id,
-        customer_name=sale.customer_name,
-        customer_email=sale.customer_email,
-        items=sale_items,
-        total_amount=total_amount,
-        created_by=current_user.id,
-        created_at=datetime.now(),
-        notes=sale.notes
-    )
-    
-    # Update inventory quantities
+    # Take the stock for every line at once; repeated items are summed first
+    demand = Counter()
     for item in sale.items:
-        inventory_item = db.inventory[item.inventory_item_id]
-        inventory_item.quantity_in_stock -= item.quantity
-        inventory_item.updated_at = datetime.now()
-    
-    db.sales[sale_id] = new_sale
+        demand[item.inventory_item_id] -= item.quantity
+    # The stock change and the record commit together, or neither does
+    with db.transaction():
+        try:
+            db.change_stock(dict(demand))
+        except StockError as error:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(error)
+            )
+        
+        # Create sale
+        sale_id = db.get_next_sale_id()
+        new_sale = Sale(
+            id=sale_id,
+            customer_name=sale.customer_name,
+            customer_email=sale.customer_email,
+            items=sale_items,
+            total_amount=total_amount,
+            created_by=current_user.id,
+            created_at=datetime.now(),
+            notes=sale.notes
+        )
+        
+        db.add_sale(new_sale)
     return new_sale
 
+@router.post("/batch", response_model=BatchResult)
+async def create_sales_batch(
+    request: Request,
+    current_user: User = Depends(get_current_active_user)
+):
+    """Create many sales from a JSON array or an NDJSON stream of SaleCreate rows.
+    
+    Stock is checked across the whole batch in one pass: each row only sees
+    the stock left after the rows accepted before it. Rejected rows do not
+    affect the others, and inventory is updated once per item at the end.
+    """
+    db = get_database()
+    
+    results: List[BatchRowResult] = []
+    parsed = []
+    async for index, payload in read_batch_rows(request):
+        try:
+            parsed.append((index, SaleCreate.model_validate(payload)))
+        except ValidationError as error:
+            results.append(BatchRowResult(index=index, success=False, error=row_error(payload, error)))
+    
+    # Check stock only once the body is read, so it is not stale by the time it is taken
+    accepted = []
+    initial_stock: Dict[int, int] = {}
+    remaining_stock: Dict[int, int] = {}
+    item_names: Dict[int, str] = {}
+    
+    for index, sale in parsed:
+        # Total quantity per item for this row, so repeated lines are checked together
+        demand = Counter()
+        error = None
+        for item in sale.items:
+            item_id = item.inventory_item_id
+            if item_id not in remaining_stock:
+                inventory_item = db.inventory.get(item_id)
+                if not inventory_item:
+                    error = f"Inventory item with ID {item_id} not found"
+                    break
+                initial_stock[item_id] = remaining_stock[item_id] = inventory_item.quantity_in_stock
+                item_names[item_id] = inventory_item.name
+            demand[item_id] += item.quantity
+        
+        if error is None:
+            for item_id, quantity in demand.items():
+                if remaining_stock[item_id] < quantity:
+                    error = f"Insufficient stock for {item_names[item_id]}. Available: {remaining_stock[item_id]}"
+                    break
+        
+        if error is not None:
+            results.append(BatchRowResult(index=index, success=False, error=error))
+            continue
+        
+        for item_id, quantity in demand.items():
+            remaining_stock[item_id] -= quantity
+        results.append(BatchRowResult(index=index, success=True))
+        accepted.append((results[-1], sale))
+    
+    # Ids, the stock change and the records commit together, so ids become visible in order
+    with db.transaction():
+        # Create all accepted sales with one id allocation and one stock update per item
+        now = datetime.now()
+        new_sales = []
+        for (result, sale), sale_id in zip(accepted, db.allocate_ids("sales", len(accepted))):
+            sale_items = [
+                SaleItem(
+                    id=line_number,
+                    inventory_item_id=item.inventory_item_id,
+                    inventory_item_name=item_names[item.inventory_item_id],
+                    quantity=item.quantity,
+                    unit_price=item.unit_price
+                )
+                for line_number, item in enumerate(sale.items, start=1)
+            ]
+            total_amount = sum(item.quantity * item.unit_price for item in sale.items)
+            new_sales.append(Sale(
+                id=sale_id,
+                customer_name=sale.customer_name,
+                customer_email=sale.customer_email,
+                items=sale_items,
+                total_amount=total_amount,
+                created_by=current_user.id,
+                created_at=now,
+                notes=sale.notes
+            ))
+            result.id = sale_id
+            result.total_amount = total_amount
+        
+        try:
+            db.change_stock({
+                item_id: remaining_stock[item_id] - initial_stock[item_id]
+                for item_id in remaining_stock
+                if remaining_stock[item_id] != initial_stock[item_id]
+            })
+        except StockError as error:
+            # Another worker changed stock since the check above; nothing was created
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=str(error)
+            )
+        db.add_sales(new_sales)
+    
+    results.sort(key=lambda result: result.index)
+    return BatchResult(created=len(new_sales), failed=len(results) - len(new_sales), results=results)
+
+@router.get("/export")
+async def export_sales(
+    format: str = Query("csv", pattern=EXPORT_FORMAT_PATTERN),
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    gzip: bool = False,
+    current_user: User = Depends(get_current_active_user)
+):
+    """Stream the sale ledger as a file, one row per line item"""
+    start = parse_date(start_date) if start_date else None
+    end = parse_date(end_date) if end_date else None
+    return ledger_export(get_database(), "sales", format, start, end, gzip)
+
 @router.get("/{sale_id}", response_model=Sale)
 async def get_sale(
     sale_id: int,
@@ -101,20 +233,21 @@ async def delete_sale(
         )
     
     db = get_database()
-    sale = db.sales.get(sale_id)
-    
-    if not sale:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Sale not found"
-        )
-    
-    # Restore inventory quantities
-    for item in sale.items:
-        if item.inventory_item_id in db.inventory:
-            inventory_item = db.inventory[item.inventory_item_id]
-            inventory_item.quantity_in_stock += item.quantity
-            inventory_item.updated_at = datetime.now()
-    
-    del db.sales[sale_id]
+    # Load, return the stock and delete in one transaction, so two deletes cannot both apply
+    with db.transaction():
+        sale = db.sales.get(sale_id)
+        
+        if not sale:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Sale not found"
+            )
+        
+        # Restore inventory quantities (items deleted since the sale are skipped)
+        returned = Counter()
+        for item in sale.items:
+            returned[item.inventory_item_id] += item.quantity
+        db.change_stock(dict(returned), skip_missing=True)
+        
+        db.delete_sale(sale_id)
     return {"message": "Sale deleted successfully"}
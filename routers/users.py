@@ -1,14 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from typing import List, Optional
 from models import User, UserCreate, UserRole
 from database import get_database, create_user, get_user_by_username
+from instrumentation import InstrumentedRoute
+from auth import get_password_hash_async
 from routers.auth import get_current_active_user
+from pagination import ListParams, list_response
 
-router = APIRouter()
+router = APIRouter(route_class=InstrumentedRoute)
 
 @router.get("/", response_model=List[User])
-async def get_users(current_user: User = Depends(get_current_active_user)):
-    """Get all users (manager only)"""
+async def get_users(
+    response: Response,
+    params: ListParams = Depends(),
+    role: Optional[UserRole] = None,
+    current_user: User = Depends(get_current_active_user)
+):
+    """Get all users (manager only, supports keyset pagination and NDJSON streaming)"""
     if current_user.role != "manager":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -16,7 +24,8 @@ async def get_users(current_user: User = Depends(get_current_active_user)):
         )
     
     db = get_database()
-    return list(db.users.values())
+    filters = {"role": role.value} if role else {}
+    return list_response(db, "users", params, response, filters)
 
 @router.post("/", response_model=User)
 async def create_new_user(
@@ -30,6 +39,9 @@ async def create_new_user(
             detail="Only managers can create new users"
         )
     
+    # Hash off the event loop first, so nothing awaits between the check and the insert
+    hashed_password = await get_password_hash_async(user_data.password)
+    
     # Check if username already exists
     existing_user = get_user_by_username(user_data.username)
     if existing_user:
@@ -44,7 +56,7 @@ async def create_new_user(
         "email": user_data.email,
         "full_name": user_data.full_name,
         "role": user_data.role,
-        "password": user_data.password
+        "hashed_password": hashed_password
     })
     
     return user
@@ -91,7 +103,7 @@ async def deactivate_user(
         )
     
     db = get_database()
-    user = db.users.get(user_id)
+    user = db.set_user_active(user_id, False)
     
     if not user:
         raise HTTPException(
@@ -99,7 +111,6 @@ async def deactivate_user(
             detail="User not found"
         )
     
-    user.is_active = False
     return {"message": "User deactivated successfully"}
 
 @router.put("/{user_id}/activate")
@@ -115,7 +126,7 @@ async def activate_user(
         )
     
     db = get_database()
-    user = db.users.get(user_id)
+    user = db.set_user_active(user_id, True)
     
     if not user:
         raise HTTPException(
@@ -123,5 +134,4 @@ async def activate_user(
             detail="User not found"
         )
     
-    user.is_active = True
     return {"message": "User activated successfully"}
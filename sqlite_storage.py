@@ -0,0 +1,955 @@
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from models import User, InventoryItem, Sale, SaleItem, Purchase, PurchaseItem, PayrollEntry
+from storage import StorageBackend, FILTERABLE_FIELDS, LEDGER_COLUMNS, InsufficientStockError, InventoryItemNotFoundError
+from aggregates import split_days
+from rollups import LEVELS, BucketTotals, bucket_key
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sequences (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+
+-- Bumped by every write transaction, so other processes can tell what changed
+CREATE TABLE IF NOT EXISTS table_versions (
+    name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO table_versions (name, version)
+VALUES ('users', 0), ('inventory', 0), ('sales', 0), ('purchases', 0), ('payroll', 0);
+
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY,
+    username TEXT NOT NULL UNIQUE,
+    email TEXT NOT NULL,
+    full_name TEXT NOT NULL,
+    role TEXT NOT NULL,
+    is_active INTEGER NOT NULL,
+    created_at TEXT NOT NULL,
+    password_hash TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_users_created_at ON users (created_at, id);
+
+CREATE TABLE IF NOT EXISTS inventory (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    description TEXT,
+    sku TEXT NOT NULL UNIQUE,
+    unit_price REAL NOT NULL,
+    quantity_in_stock INTEGER NOT NULL,
+    reorder_level INTEGER NOT NULL,
+    category TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_inventory_created_at ON inventory (created_at, id);
+CREATE INDEX IF NOT EXISTS idx_inventory_category ON inventory (category COLLATE NOCASE);
+-- Stock left above the reorder level; low-stock queries filter on the same expression to use it
+CREATE INDEX IF NOT EXISTS idx_inventory_headroom ON inventory (quantity_in_stock - reorder_level);
+
+CREATE TABLE IF NOT EXISTS sales (
+    id INTEGER PRIMARY KEY,
+    customer_name TEXT NOT NULL,
+    customer_email TEXT,
+    total_amount REAL NOT NULL,
+    created_by INTEGER NOT NULL,
+    created_at TEXT NOT NULL,
+    notes TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_sales_created_at ON sales (created_at, id);
+
+CREATE TABLE IF NOT EXISTS sale_items (
+    sale_id INTEGER NOT NULL REFERENCES sales (id) ON DELETE CASCADE,
+    line_id INTEGER NOT NULL,
+    inventory_item_id INTEGER NOT NULL,
+    inventory_item_name TEXT NOT NULL,
+    quantity INTEGER NOT NULL,
+    unit_price REAL NOT NULL,
+    PRIMARY KEY (sale_id, line_id)
+);
+CREATE INDEX IF NOT EXISTS idx_sale_items_item ON sale_items (inventory_item_id);
+
+-- Quantity sold per item and calendar day, maintained by add_sales/delete_sale
+CREATE TABLE IF NOT EXISTS sale_item_days (
+    day TEXT NOT NULL,
+    inventory_item_id INTEGER NOT NULL,
+    quantity INTEGER NOT NULL,
+    PRIMARY KEY (day, inventory_item_id)
+) WITHOUT ROWID;
+-- Fills the table once for databases created before it existed
+INSERT INTO sale_item_days (day, inventory_item_id, quantity)
+SELECT substr(s.created_at, 1, 10), si.inventory_item_id, SUM(si.quantity)
+FROM sale_items si JOIN sales s ON s.id = si.sale_id
+WHERE NOT EXISTS (SELECT 1 FROM sale_item_days)
+GROUP BY 1, 2;
+
+CREATE TABLE IF NOT EXISTS purchases (
+    id INTEGER PRIMARY KEY,
+    supplier_name TEXT NOT NULL,
+    supplier_email TEXT,
+    total_amount REAL NOT NULL,
+    created_by INTEGER NOT NULL,
+    created_at TEXT NOT NULL,
+    notes TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_purchases_created_at ON purchases (created_at, id);
+
+CREATE TABLE IF NOT EXISTS purchase_items (
+    purchase_id INTEGER NOT NULL REFERENCES purchases (id) ON DELETE CASCADE,
+    line_id INTEGER NOT NULL,
+    inventory_item_id INTEGER NOT NULL,
+    inventory_item_name TEXT NOT NULL,
+    quantity INTEGER NOT NULL,
+    unit_cost REAL NOT NULL,
+    PRIMARY KEY (purchase_id, line_id)
+);
+CREATE INDEX IF NOT EXISTS idx_purchase_items_item ON purchase_items (inventory_item_id);
+
+CREATE TABLE IF NOT EXISTS payroll (
+    id INTEGER PRIMARY KEY,
+    employee_name TEXT NOT NULL,
+    employee_id TEXT NOT NULL,
+    base_salary REAL NOT NULL,
+    overtime_hours REAL NOT NULL,
+    overtime_rate REAL NOT NULL,
+    bonus REAL NOT NULL,
+    deductions REAL NOT NULL,
+    pay_period_start TEXT NOT NULL,
+    pay_period_end TEXT NOT NULL,
+    gross_pay REAL NOT NULL,
+    net_pay REAL NOT NULL,
+    created_by INTEGER NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_payroll_created_at ON payroll (created_at, id);
+CREATE INDEX IF NOT EXISTS idx_payroll_employee_id ON payroll (employee_id);
+
+-- Revenue, purchase cost and payroll per hour/day/month bucket, named by created_at prefix
+CREATE TABLE IF NOT EXISTS rollups (
+    level TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    sales_count INTEGER NOT NULL DEFAULT 0,
+    revenue REAL NOT NULL DEFAULT 0,
+    purchases_count INTEGER NOT NULL DEFAULT 0,
+    purchase_cost REAL NOT NULL DEFAULT 0,
+    payroll_count INTEGER NOT NULL DEFAULT 0,
+    payroll REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (level, bucket)
+) WITHOUT ROWID;
+-- Fills the table once for databases created before it existed
+INSERT INTO rollups (level, bucket, sales_count, revenue, purchases_count, purchase_cost, payroll_count, payroll)
+SELECT l.level, substr(t.created_at, 1, l.width),
+       SUM(t.sales_count), SUM(t.revenue), SUM(t.purchases_count), SUM(t.purchase_cost),
+       SUM(t.payroll_count), SUM(t.payroll)
+FROM (
+    SELECT created_at, 1 AS sales_count, total_amount AS revenue, 0 AS purchases_count,
+           0.0 AS purchase_cost, 0 AS payroll_count, 0.0 AS payroll FROM sales
+    UNION ALL SELECT created_at, 0, 0.0, 1, total_amount, 0, 0.0 FROM purchases
+    UNION ALL SELECT created_at, 0, 0.0, 0, 0.0, 1, gross_pay FROM payroll
+) t CROSS JOIN (SELECT 'hour' AS level, 13 AS width UNION ALL SELECT 'day', 10 UNION ALL SELECT 'month', 7) l
+WHERE NOT EXISTS (SELECT 1 FROM rollups)
+GROUP BY 1, 2;
+"""
+
+# Timestamps are stored as fixed-width ISO strings so they sort chronologically
+MIN_TIMESTAMP = "0000-01-01T00:00:00.000000"
+MAX_TIMESTAMP = "9999-12-31T23:59:59.999999"
+
+# Values bound per IN (...) list, well under SQLite's variable limit
+SQL_PARAMETER_BATCH = 500
+
+def to_timestamp(moment: datetime) -> str:
+    return moment.isoformat(timespec="microseconds")
+
+def from_timestamp(value: str) -> datetime:
+    return datetime.fromisoformat(value)
+
+def timestamp_range(start: Optional[datetime], end: Optional[datetime]) -> Tuple[str, str]:
+    return (
+        MIN_TIMESTAMP if start is None else to_timestamp(start),
+        MAX_TIMESTAMP if end is None else to_timestamp(end)
+    )
+
+# Row <-> model conversion
+
+def user_from_row(row: sqlite3.Row) -> User:
+    return User(
+        id=row["id"],
+        username=row["username"],
+        email=row["email"],
+        full_name=row["full_name"],
+        role=row["role"],
+        is_active=bool(row["is_active"]),
+        created_at=from_timestamp(row["created_at"])
+    )
+
+def inventory_from_row(row: sqlite3.Row) -> InventoryItem:
+    return InventoryItem(
+        id=row["id"],
+        name=row["name"],
+        description=row["description"],
+        sku=row["sku"],
+        unit_price=row["unit_price"],
+        quantity_in_stock=row["quantity_in_stock"],
+        reorder_level=row["reorder_level"],
+        category=row["category"],
+        created_at=from_timestamp(row["created_at"]),
+        updated_at=from_timestamp(row["updated_at"])
+    )
+
+def sale_from_rows(row: sqlite3.Row, item_rows: List[sqlite3.Row]) -> Sale:
+    return Sale(
+        id=row["id"],
+        customer_name=row["customer_name"],
+        customer_email=row["customer_email"],
+        items=[
+            SaleItem(
+                id=item["line_id"],
+                inventory_item_id=item["inventory_item_id"],
+                inventory_item_name=item["inventory_item_name"],
+                quantity=item["quantity"],
+                unit_price=item["unit_price"]
+            )
+            for item in item_rows
+        ],
+        total_amount=row["total_amount"],
+        created_by=row["created_by"],
+        created_at=from_timestamp(row["created_at"]),
+        notes=row["notes"]
+    )
+
+def purchase_from_rows(row: sqlite3.Row, item_rows: List[sqlite3.Row]) -> Purchase:
+    return Purchase(
+        id=row["id"],
+        supplier_name=row["supplier_name"],
+        supplier_email=row["supplier_email"],
+        items=[
+            PurchaseItem(
+                id=item["line_id"],
+                inventory_item_id=item["inventory_item_id"],
+                inventory_item_name=item["inventory_item_name"],
+                quantity=item["quantity"],
+                unit_cost=item["unit_cost"]
+            )
+            for item in item_rows
+        ],
+        total_amount=row["total_amount"],
+        created_by=row["created_by"],
+        created_at=from_timestamp(row["created_at"]),
+        notes=row["notes"]
+    )
+
+def payroll_from_row(row: sqlite3.Row) -> PayrollEntry:
+    return PayrollEntry(
+        id=row["id"],
+        employee_name=row["employee_name"],
+        employee_id=row["employee_id"],
+        base_salary=row["base_salary"],
+        overtime_hours=row["overtime_hours"],
+        overtime_rate=row["overtime_rate"],
+        bonus=row["bonus"],
+        deductions=row["deductions"],
+        pay_period_start=from_timestamp(row["pay_period_start"]),
+        pay_period_end=from_timestamp(row["pay_period_end"]),
+        gross_pay=row["gross_pay"],
+        net_pay=row["net_pay"],
+        created_by=row["created_by"],
+        created_at=from_timestamp(row["created_at"])
+    )
+
+class SQLiteTable:
+    """Read-only mapping view of a table, mirroring the dict API routers use"""
+    
+    def __init__(self, db: "SQLiteDB", table: str, load: Callable[[int], Optional[object]],
+                 scan: Callable[[], Iterator[object]]):
+        self._db = db
+        self._table = table
+        self._load = load
+        self._scan = scan
+    
+    def get(self, record_id: int, default=None):
+        record = self._load(record_id)
+        return default if record is None else record
+    
+    def __getitem__(self, record_id: int):
+        record = self._load(record_id)
+        if record is None:
+            raise KeyError(record_id)
+        return record
+    
+    def __contains__(self, record_id: int) -> bool:
+        return self._db._query_one(f"SELECT 1 FROM {self._table} WHERE id = ?", (record_id,)) is not None
+    
+    def __len__(self) -> int:
+        return self._db._query_one(f"SELECT COUNT(*) FROM {self._table}")[0]
+    
+    def __iter__(self) -> Iterator[int]:
+        return (row[0] for row in self._db._query(f"SELECT id FROM {self._table} ORDER BY id"))
+    
+    def values(self) -> Iterator[object]:
+        return self._scan()
+
+class SQLiteDB(StorageBackend):
+    """Persistent storage engine on a single SQLite file in WAL mode.
+    
+    Statements use fixed SQL text with ``?`` parameters, so sqlite3's
+    statement cache keeps them prepared. Writes run in ``BEGIN IMMEDIATE``
+    transactions and listeners are notified only after commit. Report queries
+    are answered with SQL aggregates over the created_at indexes.
+    
+    Several processes may open the same file. Each write transaction bumps the
+    versions of the tables it touches, and ``sync`` reports tables changed by
+    other processes to listeners through ``table_changed``.
+    """
+    
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, cached_statements=256)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.executescript(SCHEMA)
+        self._transaction_depth = 0
+        self._transaction_tables: Set[str] = set()
+        self._data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        self._seen_versions = self._read_table_versions()
+        self._changed_elsewhere: Set[str] = set()
+        
+        self.users = SQLiteTable(self, "users", self._load_user, self._scan_users)
+        self.inventory = SQLiteTable(self, "inventory", self._load_inventory_item, self._scan_inventory)
+        self.sales = SQLiteTable(self, "sales", self._load_sale, lambda: self.iter_records("sales"))
+        self.purchases = SQLiteTable(self, "purchases", self._load_purchase, lambda: self.iter_records("purchases"))
+        self.payroll = SQLiteTable(self, "payroll", self._load_payroll_entry, lambda: self.iter_records("payroll"))
+    
+    def close(self):
+        self._conn.close()
+    
+    # Low-level helpers
+    
+    def _query(self, sql: str, params: tuple = ()) -> List[sqlite3.Row]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+    
+    def _query_one(self, sql: str, params: tuple = ()) -> Optional[sqlite3.Row]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchone()
+    
+    def _iterate(self, sql: str, params: tuple = (), batch_size: int = 500) -> Iterator[sqlite3.Row]:
+        """Stream rows in batches without holding the lock between batches"""
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+        while True:
+            with self._lock:
+                rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            yield from rows
+    
+    def _read_table_versions(self) -> Dict[str, int]:
+        return dict(self._conn.execute("SELECT name, version FROM table_versions").fetchall())
+    
+    def _absorb_table_versions(self):
+        versions = self._read_table_versions()
+        self._changed_elsewhere.update(
+            table for table, version in versions.items() if version != self._seen_versions.get(table)
+        )
+        self._seen_versions = versions
+    
+    @contextmanager
+    def _transaction(self, *tables: str):
+        """Run a write transaction that changes ``tables``; nested calls join the outer one"""
+        with self._lock:
+            if self._transaction_depth:
+                self._transaction_tables.update(tables)
+                self._transaction_depth += 1
+                try:
+                    yield self._conn
+                finally:
+                    self._transaction_depth -= 1
+                return
+            
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._transaction_depth = 1
+            self._transaction_tables = set(tables)
+            try:
+                # Holding the write lock, any version we have not seen is another process's write
+                self._absorb_table_versions()
+                yield self._conn
+                for table in self._transaction_tables:
+                    self._conn.execute("UPDATE table_versions SET version = version + 1 WHERE name = ?", (table,))
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                # Listeners already saw the writes made before the failure; resync them
+                self._changed_elsewhere.update(self._transaction_tables)
+                raise
+            finally:
+                self._transaction_depth = 0
+            self._conn.execute("COMMIT")
+            for table in self._transaction_tables:
+                self._seen_versions[table] += 1
+    
+    @contextmanager
+    def transaction(self):
+        with self._transaction():
+            yield
+    
+    def sync(self):
+        # data_version only moves when another connection commits, so this is cheap when idle
+        with self._lock:
+            data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            if data_version != self._data_version:
+                self._data_version = data_version
+                self._absorb_table_versions()
+            changed, self._changed_elsewhere = self._changed_elsewhere, set()
+        
+        for table in sorted(changed):
+            self._notify("table_changed", table)
+    
+    def allocate_ids(self, table: str, count: int) -> range:
+        with self._transaction() as conn:
+            row = conn.execute(
+                "UPDATE sequences SET value = value + ? WHERE name = ? RETURNING value", (count, table)
+            ).fetchone()
+            if row is None:
+                # First ids for this sequence continue after any rows already stored
+                first_id = conn.execute(f"SELECT COALESCE(MAX(id), 0) + 1 FROM {table}").fetchone()[0]
+                conn.execute("INSERT INTO sequences (name, value) VALUES (?, ?)", (table, first_id + count - 1))
+                return range(first_id, first_id + count)
+            return range(row[0] - count + 1, row[0] + 1)
+    
+    def _next_id(self, name: str) -> int:
+        return self.allocate_ids(name, 1)[0]
+    
+    def get_next_user_id(self) -> int:
+        return self._next_id("users")
+    
+    def get_next_inventory_id(self) -> int:
+        return self._next_id("inventory")
+    
+    def get_next_sale_id(self) -> int:
+        return self._next_id("sales")
+    
+    def get_next_purchase_id(self) -> int:
+        return self._next_id("purchases")
+    
+    def get_next_payroll_id(self) -> int:
+        return self._next_id("payroll")
+    
+    # Users
+    
+    def _load_user(self, user_id: int) -> Optional[User]:
+        row = self._query_one("SELECT * FROM users WHERE id = ?", (user_id,))
+        return user_from_row(row) if row else None
+    
+    def _scan_users(self) -> Iterator[User]:
+        return (user_from_row(row) for row in self._iterate("SELECT * FROM users ORDER BY id"))
+    
+    def add_user(self, user: User) -> User:
+        with self._transaction("users") as conn:
+            conn.execute(
+                "INSERT INTO users (id, username, email, full_name, role, is_active, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (user.id, user.username, user.email, user.full_name, user.role.value,
+                 int(user.is_active), to_timestamp(user.created_at))
+            )
+        self._notify("user_saved", None, user)
+        return user
+    
+    def set_user_active(self, user_id: int, is_active: bool) -> Optional[User]:
+        with self._transaction("users") as conn:
+            existing_user = self._load_user(user_id)
+            if existing_user is None:
+                return None
+            conn.execute("UPDATE users SET is_active = ? WHERE id = ?", (int(is_active), user_id))
+        
+        updated_user = existing_user.model_copy(update={"is_active": is_active})
+        self._notify("user_saved", existing_user, updated_user)
+        return updated_user
+    
+    def find_user_by_username(self, username: str) -> Optional[User]:
+        row = self._query_one("SELECT * FROM users WHERE username = ?", (username,))
+        return user_from_row(row) if row else None
+    
+    def get_user_password(self, username: str) -> Optional[str]:
+        row = self._query_one("SELECT password_hash FROM users WHERE username = ?", (username,))
+        return row[0] if row else None
+    
+    def set_user_password(self, username: str, hashed_password: str):
+        with self._transaction("users") as conn:
+            conn.execute("UPDATE users SET password_hash = ? WHERE username = ?", (hashed_password, username))
+        self._notify("password_saved", username, hashed_password)
+    
+    # Inventory
+    
+    def _load_inventory_item(self, item_id: int) -> Optional[InventoryItem]:
+        row = self._query_one("SELECT * FROM inventory WHERE id = ?", (item_id,))
+        return inventory_from_row(row) if row else None
+    
+    def _scan_inventory(self) -> Iterator[InventoryItem]:
+        return (inventory_from_row(row) for row in self._iterate("SELECT * FROM inventory ORDER BY id"))
+    
+    def save_inventory_item(self, item: InventoryItem) -> InventoryItem:
+        with self._transaction("inventory") as conn:
+            existing_item = self._load_inventory_item(item.id)
+            conn.execute(
+                "INSERT OR REPLACE INTO inventory (id, name, description, sku, unit_price, quantity_in_stock, "
+                "reorder_level, category, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (item.id, item.name, item.description, item.sku, item.unit_price, item.quantity_in_stock,
+                 item.reorder_level, item.category, to_timestamp(item.created_at), to_timestamp(item.updated_at))
+            )
+        self._notify("inventory_saved", existing_item, item)
+        return item
+    
+    def save_inventory_items(self, items: List[InventoryItem]) -> List[InventoryItem]:
+        """Upsert items by SKU; an item whose SKU is already stored keeps that row's id and created_at"""
+        saved = []
+        with self._transaction("inventory") as conn:
+            existing_items = self.find_inventory_items_by_sku(item.sku for item in items)
+            for item in items:
+                existing_item = existing_items.get(item.sku)
+                if existing_item is not None and (existing_item.id, existing_item.created_at) != (item.id, item.created_at):
+                    item = item.model_copy(update={"id": existing_item.id, "created_at": existing_item.created_at})
+                saved.append((existing_item, item))
+            # Updating on the SKU never deletes another row, unlike INSERT OR REPLACE
+            conn.executemany(
+                "INSERT INTO inventory (id, name, description, sku, unit_price, quantity_in_stock, "
+                "reorder_level, category, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (sku) DO UPDATE SET name = excluded.name, description = excluded.description, "
+                "unit_price = excluded.unit_price, quantity_in_stock = excluded.quantity_in_stock, "
+                "reorder_level = excluded.reorder_level, category = excluded.category, updated_at = excluded.updated_at",
+                [(item.id, item.name, item.description, item.sku, item.unit_price, item.quantity_in_stock,
+                  item.reorder_level, item.category, to_timestamp(item.created_at), to_timestamp(item.updated_at))
+                 for _, item in saved]
+            )
+        for existing_item, item in saved:
+            self._notify("inventory_saved", existing_item, item)
+        return [item for _, item in saved]
+    
+    def change_stock(self, deltas: Dict[int, int], skip_missing: bool = False) -> List[InventoryItem]:
+        changes = []
+        # BEGIN IMMEDIATE takes the write lock, so other processes cannot interleave;
+        # the conditional UPDATE still refuses to go negative on its own
+        with self._transaction("inventory") as conn:
+            now = datetime.now()
+            for item_id in sorted(deltas):
+                delta = deltas[item_id]
+                existing_item = self._load_inventory_item(item_id)
+                if existing_item is None:
+                    if skip_missing:
+                        continue
+                    raise InventoryItemNotFoundError(item_id)
+                cursor = conn.execute(
+                    "UPDATE inventory SET quantity_in_stock = quantity_in_stock + ?, updated_at = ? "
+                    "WHERE id = ? AND (? >= 0 OR quantity_in_stock + ? >= 0)",
+                    (delta, to_timestamp(now), item_id, delta, delta)
+                )
+                if cursor.rowcount == 0:
+                    raise InsufficientStockError(existing_item, -delta)
+                changes.append((existing_item, existing_item.model_copy(update={
+                    "quantity_in_stock": existing_item.quantity_in_stock + delta,
+                    "updated_at": now
+                })))
+        
+        for existing_item, updated_item in changes:
+            self._notify("inventory_saved", existing_item, updated_item)
+        return [updated_item for _, updated_item in changes]
+    
+    def delete_inventory_item(self, item_id: int) -> Optional[InventoryItem]:
+        with self._transaction("inventory") as conn:
+            item = self._load_inventory_item(item_id)
+            if item is None:
+                return None
+            conn.execute("DELETE FROM inventory WHERE id = ?", (item_id,))
+        self._notify("inventory_deleted", item)
+        return item
+    
+    def find_inventory_item_by_sku(self, sku: str) -> Optional[InventoryItem]:
+        row = self._query_one("SELECT * FROM inventory WHERE sku = ?", (sku,))
+        return inventory_from_row(row) if row else None
+    
+    def find_inventory_items_by_sku(self, skus: Iterable[str]) -> Dict[str, InventoryItem]:
+        skus = list(skus)
+        items = {}
+        for first in range(0, len(skus), SQL_PARAMETER_BATCH):
+            chunk = skus[first:first + SQL_PARAMETER_BATCH]
+            rows = self._query(f"SELECT * FROM inventory WHERE sku IN ({', '.join('?' * len(chunk))})", tuple(chunk))
+            items.update((row["sku"], inventory_from_row(row)) for row in rows)
+        return items
+    
+    # Sales
+    
+    def _load_sale(self, sale_id: int) -> Optional[Sale]:
+        row = self._query_one("SELECT * FROM sales WHERE id = ?", (sale_id,))
+        if row is None:
+            return None
+        item_rows = self._query("SELECT * FROM sale_items WHERE sale_id = ? ORDER BY line_id", (sale_id,))
+        return sale_from_rows(row, item_rows)
+    
+    def add_sale(self, sale: Sale) -> Sale:
+        return self.add_sales([sale])[0]
+    
+    def add_sales(self, sales: List[Sale]) -> List[Sale]:
+        with self._transaction("sales") as conn:
+            conn.executemany(
+                "INSERT INTO sales (id, customer_name, customer_email, total_amount, created_by, created_at, notes) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(sale.id, sale.customer_name, sale.customer_email, sale.total_amount, sale.created_by,
+                  to_timestamp(sale.created_at), sale.notes)
+                 for sale in sales]
+            )
+            conn.executemany(
+                "INSERT INTO sale_items (sale_id, line_id, inventory_item_id, inventory_item_name, quantity, unit_price) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(sale.id, item.id, item.inventory_item_id, item.inventory_item_name, item.quantity, item.unit_price)
+                 for sale in sales for item in sale.items]
+            )
+            self._count_item_days(conn, sales, 1)
+            self._roll_up(conn, "sales", [(sale.created_at, sale.total_amount) for sale in sales], 1)
+        for sale in sales:
+            self._notify("sale_added", sale)
+        return sales
+    
+    def delete_sale(self, sale_id: int) -> Optional[Sale]:
+        with self._transaction("sales") as conn:
+            sale = self._load_sale(sale_id)
+            if sale is None:
+                return None
+            conn.execute("DELETE FROM sales WHERE id = ?", (sale_id,))
+            self._count_item_days(conn, [sale], -1)
+            self._roll_up(conn, "sales", [(sale.created_at, sale.total_amount)], -1)
+        self._notify("sale_deleted", sale)
+        return sale
+    
+    def _count_item_days(self, conn: sqlite3.Connection, sales: List[Sale], sign: int):
+        rows = [
+            (sale.created_at.date().isoformat(), item.inventory_item_id, sign * item.quantity)
+            for sale in sales for item in sale.items
+        ]
+        conn.executemany(
+            "INSERT INTO sale_item_days (day, inventory_item_id, quantity) VALUES (?, ?, ?) "
+            "ON CONFLICT (day, inventory_item_id) DO UPDATE SET quantity = quantity + excluded.quantity",
+            rows
+        )
+        if sign < 0:
+            conn.executemany(
+                "DELETE FROM sale_item_days WHERE day = ? AND inventory_item_id = ? AND quantity = 0",
+                [row[:2] for row in rows]
+            )
+    
+    def sales_between(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> Iterator[Sale]:
+        """Sales created within [start, end], oldest first, streamed from the created_at index"""
+        return self.iter_records("sales", start, end)
+    
+    # Purchases
+    
+    def _load_purchase(self, purchase_id: int) -> Optional[Purchase]:
+        row = self._query_one("SELECT * FROM purchases WHERE id = ?", (purchase_id,))
+        if row is None:
+            return None
+        item_rows = self._query("SELECT * FROM purchase_items WHERE purchase_id = ? ORDER BY line_id", (purchase_id,))
+        return purchase_from_rows(row, item_rows)
+    
+    def add_purchase(self, purchase: Purchase) -> Purchase:
+        return self.add_purchases([purchase])[0]
+    
+    def add_purchases(self, purchases: List[Purchase]) -> List[Purchase]:
+        with self._transaction("purchases") as conn:
+            conn.executemany(
+                "INSERT INTO purchases (id, supplier_name, supplier_email, total_amount, created_by, created_at, notes) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(purchase.id, purchase.supplier_name, purchase.supplier_email, purchase.total_amount,
+                  purchase.created_by, to_timestamp(purchase.created_at), purchase.notes)
+                 for purchase in purchases]
+            )
+            conn.executemany(
+                "INSERT INTO purchase_items (purchase_id, line_id, inventory_item_id, inventory_item_name, quantity, unit_cost) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(purchase.id, item.id, item.inventory_item_id, item.inventory_item_name, item.quantity, item.unit_cost)
+                 for purchase in purchases for item in purchase.items]
+            )
+            self._roll_up(conn, "purchases", [(purchase.created_at, purchase.total_amount) for purchase in purchases], 1)
+        for purchase in purchases:
+            self._notify("purchase_added", purchase)
+        return purchases
+    
+    def delete_purchase(self, purchase_id: int) -> Optional[Purchase]:
+        with self._transaction("purchases") as conn:
+            purchase = self._load_purchase(purchase_id)
+            if purchase is None:
+                return None
+            conn.execute("DELETE FROM purchases WHERE id = ?", (purchase_id,))
+            self._roll_up(conn, "purchases", [(purchase.created_at, purchase.total_amount)], -1)
+        self._notify("purchase_deleted", purchase)
+        return purchase
+    
+    def purchases_between(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> Iterator[Purchase]:
+        """Purchases created within [start, end], oldest first, streamed from the created_at index"""
+        return self.iter_records("purchases", start, end)
+    
+    # Payroll
+    
+    def _load_payroll_entry(self, payroll_id: int) -> Optional[PayrollEntry]:
+        row = self._query_one("SELECT * FROM payroll WHERE id = ?", (payroll_id,))
+        return payroll_from_row(row) if row else None
+    
+    def save_payroll_entry(self, entry: PayrollEntry) -> PayrollEntry:
+        with self._transaction("payroll") as conn:
+            existing_entry = self._load_payroll_entry(entry.id)
+            conn.execute(
+                "INSERT OR REPLACE INTO payroll (id, employee_name, employee_id, base_salary, overtime_hours, "
+                "overtime_rate, bonus, deductions, pay_period_start, pay_period_end, gross_pay, net_pay, "
+                "created_by, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (entry.id, entry.employee_name, entry.employee_id, entry.base_salary, entry.overtime_hours,
+                 entry.overtime_rate, entry.bonus, entry.deductions, to_timestamp(entry.pay_period_start),
+                 to_timestamp(entry.pay_period_end), entry.gross_pay, entry.net_pay, entry.created_by,
+                 to_timestamp(entry.created_at))
+            )
+            if existing_entry is not None:
+                self._roll_up(conn, "payroll", [(existing_entry.created_at, existing_entry.gross_pay)], -1)
+            self._roll_up(conn, "payroll", [(entry.created_at, entry.gross_pay)], 1)
+        self._notify("payroll_saved", existing_entry, entry)
+        return entry
+    
+    def delete_payroll_entry(self, payroll_id: int) -> Optional[PayrollEntry]:
+        with self._transaction("payroll") as conn:
+            entry = self._load_payroll_entry(payroll_id)
+            if entry is None:
+                return None
+            conn.execute("DELETE FROM payroll WHERE id = ?", (payroll_id,))
+            self._roll_up(conn, "payroll", [(entry.created_at, entry.gross_pay)], -1)
+        self._notify("payroll_deleted", entry)
+        return entry
+    
+    def payroll_between(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> Iterator[PayrollEntry]:
+        """Payroll entries created within [start, end], oldest first"""
+        return self.iter_records("payroll", start, end)
+    
+    # Rollups
+    
+    def _roll_up(self, conn: sqlite3.Connection, table: str, amounts: List[Tuple[datetime, float]], sign: int):
+        """Add (created_at, amount) pairs to every rollup level, or take them away"""
+        # Column names are fixed by the table, never taken from input
+        count, amount = {"sales": ("sales_count", "revenue"), "purchases": ("purchases_count", "purchase_cost"),
+                         "payroll": ("payroll_count", "payroll")}[table]
+        rows = [
+            (level, bucket_key(created_at, level), sign, sign * value)
+            for created_at, value in amounts for level in LEVELS
+        ]
+        conn.executemany(
+            f"INSERT INTO rollups (level, bucket, {count}, {amount}) VALUES (?, ?, ?, ?) "
+            f"ON CONFLICT (level, bucket) DO UPDATE SET {count} = {count} + excluded.{count}, "
+            # Reset instead of keeping float residue from add/subtract pairs
+            f"{amount} = CASE WHEN {count} + excluded.{count} = 0 THEN 0 ELSE {amount} + excluded.{amount} END",
+            rows
+        )
+        if sign < 0:
+            conn.executemany(
+                "DELETE FROM rollups WHERE level = ? AND bucket = ? "
+                "AND sales_count = 0 AND purchases_count = 0 AND payroll_count = 0",
+                [row[:2] for row in rows]
+            )
+    
+    def rollup_buckets(self, level: str, first_key: str, last_key: str) -> Dict[str, BucketTotals]:
+        rows = self._query(
+            "SELECT bucket, revenue, purchase_cost, payroll FROM rollups WHERE level = ? AND bucket BETWEEN ? AND ?",
+            (level, first_key, last_key)
+        )
+        return {row[0]: (row[1], row[2], row[3]) for row in rows}
+    
+    # Keyset-paginated streaming
+    
+    def iter_record_ids(self, table: str, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                        after: Optional[Tuple[datetime, int]] = None) -> Iterator[int]:
+        if table not in FILTERABLE_FIELDS:
+            raise ValueError(f"Unknown table {table}")
+        conditions = "created_at BETWEEN ? AND ?"
+        params = list(timestamp_range(start, end))
+        if after is not None:
+            conditions += " AND (created_at, id) > (?, ?)"
+            params.extend([to_timestamp(after[0]), after[1]])
+        rows = self._iterate(f"SELECT id FROM {table} WHERE {conditions} ORDER BY created_at, id", tuple(params))
+        return (row["id"] for row in rows)
+    
+    def iter_records_after_id(self, table: str, after_id: int) -> Iterator:
+        if table not in FILTERABLE_FIELDS:
+            raise ValueError(f"Unknown table {table}")
+        headers = self._iterate(f"SELECT * FROM {table} WHERE id > ? ORDER BY id", (after_id,))
+        if table in ("sales", "purchases"):
+            key = f"{table[:-1]}_id"
+            items = self._iterate(
+                f"SELECT * FROM {table[:-1]}_items WHERE {key} > ? ORDER BY {key}, line_id", (after_id,)
+            )
+            return merge_line_items(headers, items, key, sale_from_rows if table == "sales" else purchase_from_rows)
+        
+        build = {"users": user_from_row, "inventory": inventory_from_row, "payroll": payroll_from_row}[table]
+        return (build(row) for row in headers)
+    
+    def iter_ledger_lines(self, table: str, start: Optional[datetime] = None,
+                          end: Optional[datetime] = None) -> Iterator[tuple]:
+        if table not in LEDGER_COLUMNS:
+            raise ValueError(f"No ledger for {table}")
+        party, key, price = ("customer", "sale_id", "unit_price") if table == "sales" else ("supplier", "purchase_id", "unit_cost")
+        rows = self._iterate(
+            f"SELECT t.id, t.created_at, t.{party}_name, t.{party}_email, t.created_by, t.notes, t.total_amount, "
+            f"i.line_id, i.inventory_item_id, i.inventory_item_name, i.quantity, i.{price} "
+            f"FROM {table} t JOIN {table[:-1]}_items i ON i.{key} = t.id "
+            f"WHERE t.created_at BETWEEN ? AND ? ORDER BY t.created_at, t.id, i.line_id",
+            timestamp_range(start, end)
+        )
+        for row in rows:
+            yield (row[0], from_timestamp(row[1])) + tuple(row)[2:]
+    
+    def iter_records(self, table: str, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                     after: Optional[Tuple[datetime, int]] = None, filters: Optional[Dict[str, str]] = None) -> Iterator:
+        conditions = ["t.created_at BETWEEN ? AND ?"]
+        params = list(timestamp_range(start, end))
+        if after is not None:
+            conditions.append("(t.created_at, t.id) > (?, ?)")
+            params.extend([to_timestamp(after[0]), after[1]])
+        for field, value in (filters or {}).items():
+            # Column names come from a fixed whitelist; values are always bound
+            if field not in FILTERABLE_FIELDS[table]:
+                raise ValueError(f"Cannot filter {table} on {field}")
+            conditions.append(f"t.{field} = ? COLLATE NOCASE")
+            params.append(value)
+        where = " AND ".join(conditions)
+        params = tuple(params)
+        
+        headers = self._iterate(f"SELECT t.* FROM {table} t WHERE {where} ORDER BY t.created_at, t.id", params)
+        if table == "sales":
+            items = self._iterate(
+                f"SELECT si.* FROM sale_items si JOIN sales t ON t.id = si.sale_id "
+                f"WHERE {where} ORDER BY t.created_at, t.id, si.line_id", params
+            )
+            return merge_line_items(headers, items, "sale_id", sale_from_rows)
+        if table == "purchases":
+            items = self._iterate(
+                f"SELECT pi.* FROM purchase_items pi JOIN purchases t ON t.id = pi.purchase_id "
+                f"WHERE {where} ORDER BY t.created_at, t.id, pi.line_id", params
+            )
+            return merge_line_items(headers, items, "purchase_id", purchase_from_rows)
+        
+        build = {"users": user_from_row, "inventory": inventory_from_row, "payroll": payroll_from_row}[table]
+        return (build(row) for row in headers)
+    
+    # Report queries, pushed down as SQL aggregates
+    
+    def financial_totals(self, start: datetime, end: datetime) -> Tuple[float, float]:
+        params = timestamp_range(start, end)
+        row = self._query_one(
+            "SELECT "
+            "(SELECT COALESCE(SUM(total_amount), 0) FROM sales WHERE created_at BETWEEN ?1 AND ?2), "
+            "(SELECT COALESCE(SUM(total_amount), 0) FROM purchases WHERE created_at BETWEEN ?1 AND ?2), "
+            "(SELECT COALESCE(SUM(gross_pay), 0) FROM payroll WHERE created_at BETWEEN ?1 AND ?2)",
+            params
+        )
+        return row[0], row[1] + row[2]
+    
+    def sales_totals(self, start: datetime, end: datetime) -> Tuple[int, float]:
+        row = self._query_one(
+            "SELECT COUNT(*), COALESCE(SUM(total_amount), 0) FROM sales WHERE created_at BETWEEN ? AND ?",
+            timestamp_range(start, end)
+        )
+        return row[0], row[1]
+    
+    def top_selling_items(self, start: datetime, end: datetime, limit: int) -> List[Tuple[int, str, int]]:
+        # Whole days come from the per-day counters, partial days from the sales themselves
+        first_day, last_day, partial = split_days(start, end)
+        parts, params = [], []
+        if first_day is not None:
+            parts.append("SELECT inventory_item_id, quantity FROM sale_item_days WHERE day BETWEEN ? AND ?")
+            params += [first_day.isoformat(), last_day.isoformat()]
+        for range_start, range_end in partial:
+            parts.append(
+                "SELECT si.inventory_item_id, si.quantity "
+                "FROM sale_items si JOIN sales s ON s.id = si.sale_id WHERE s.created_at BETWEEN ? AND ?"
+            )
+            params += timestamp_range(range_start, range_end)
+        if not parts:
+            return []
+        
+        rows = self._query(
+            "SELECT t.inventory_item_id, SUM(t.quantity) AS quantity_sold "
+            f"FROM ({' UNION ALL '.join(parts)}) t "
+            "GROUP BY t.inventory_item_id ORDER BY quantity_sold DESC LIMIT ?",
+            tuple(params) + (limit,)
+        )
+        return [(row[0], self._item_name(row[0]), row[1]) for row in rows]
+    
+    def _item_name(self, item_id: int) -> str:
+        """Current inventory name, or the latest name the item was sold under"""
+        row = self._query_one(
+            "SELECT COALESCE((SELECT name FROM inventory WHERE id = ?1), "
+            "(SELECT inventory_item_name FROM sale_items WHERE inventory_item_id = ?1 ORDER BY rowid DESC LIMIT 1))",
+            (item_id,)
+        )
+        return row[0]
+    
+    def low_stock_items(self) -> List[InventoryItem]:
+        # Without the hint, ORDER BY id makes the planner walk the whole table in rowid order
+        rows = self._query(
+            "SELECT * FROM inventory INDEXED BY idx_inventory_headroom "
+            "WHERE quantity_in_stock - reorder_level <= 0 ORDER BY id"
+        )
+        return [inventory_from_row(row) for row in rows]
+    
+    def table_sizes(self) -> Dict[str, int]:
+        tables = ("users", "inventory", "sales", "purchases", "payroll")
+        row = self._query_one("SELECT " + ", ".join(f"(SELECT COUNT(*) FROM {table})" for table in tables))
+        return dict(zip(tables, row))
+    
+    def inventory_summary(self) -> Tuple[int, float, List[InventoryItem]]:
+        row = self._query_one("SELECT COUNT(*), COALESCE(SUM(quantity_in_stock * unit_price), 0) FROM inventory")
+        return row[0], row[1], self.low_stock_items()
+    
+    def dashboard_stats(self, now: datetime) -> dict:
+        month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        if month_start.month == 12:
+            next_month = month_start.replace(year=month_start.year + 1, month=1)
+        else:
+            next_month = month_start.replace(month=month_start.month + 1)
+        period = (to_timestamp(month_start), to_timestamp(next_month))
+        
+        row = self._query_one(
+            "SELECT "
+            "(SELECT COUNT(*) FROM sales WHERE created_at >= ?1 AND created_at < ?2), "
+            "(SELECT COALESCE(SUM(total_amount), 0) FROM sales WHERE created_at >= ?1 AND created_at < ?2), "
+            "(SELECT COALESCE(SUM(total_amount), 0) FROM purchases WHERE created_at >= ?1 AND created_at < ?2), "
+            "(SELECT COALESCE(SUM(gross_pay), 0) FROM payroll WHERE created_at >= ?1 AND created_at < ?2), "
+            "(SELECT COUNT(*) FROM inventory), "
+            "(SELECT COALESCE(SUM(quantity_in_stock * unit_price), 0) FROM inventory), "
+            "(SELECT COUNT(*) FROM inventory WHERE quantity_in_stock - reorder_level <= 0), "
+            "(SELECT COUNT(DISTINCT employee_id) FROM payroll)",
+            period
+        )
+        monthly_expenses = row[2] + row[3]
+        
+        return {
+            "monthly_sales": row[0],
+            "monthly_revenue": row[1],
+            "monthly_expenses": monthly_expenses,
+            "monthly_profit": row[1] - monthly_expenses,
+            "total_inventory_items": row[4],
+            "total_inventory_value": row[5],
+            "low_stock_items": row[6],
+            "total_employees": row[7]
+        }
+
+def merge_line_items(headers: Iterator[sqlite3.Row], items: Iterator[sqlite3.Row], key: str, build) -> Iterator:
+    """Merge-join header rows with their line item rows; both are in the same order"""
+    pending = next(items, None)
+    for header in headers:
+        item_rows = []
+        while pending is not None and pending[key] == header["id"]:
+            item_rows.append(pending)
+            pending = next(items, None)
+        yield build(header, item_rows)
@@ -2,7 +2,11 @@
 window.AppState = {
     user: null,
     token: null,
-    currentTab: 'dashboard'
+    currentTab: 'dashboard',
+    // Kept current by the live feed once loaded
+    dashboardStats: null,
+    dashboardMonth: null,
+    recentActivity: null
 };
 
 // API configuration
@@ -26,6 +30,7 @@ function initializeApp() {
 
     // Initialize event listeners
     initializeEventListeners();
+    window.LiveFeed.on('dashboard', applyDashboardEvent);
 }
 
 function initializeEventListeners() {
@@ -88,6 +93,9 @@ function showMainApp() {
     // Show/hide manager-only features
     updateUIForUserRole();
     
+    // One event stream replaces refetching the dashboard
+    window.LiveFeed.start(['dashboard']);
+    
     // Load dashboard
     switchTab('dashboard');
     
@@ -131,8 +139,11 @@ async function handleLogin(event) {
 }
 
 function handleLogout() {
+    window.LiveFeed.stop();
     AppState.user = null;
     AppState.token = null;
+    AppState.dashboardStats = null;
+    AppState.recentActivity = null;
     localStorage.removeItem('token');
     delete axios.defaults.headers.common['Authorization'];
     showLoginScreen();
@@ -222,136 +233,216 @@ async function loadTabContent(tabName) {
 
 async function loadDashboard() {
     try {
-        const statsResponse = await axios.get('/reports/dashboard-stats');
-        const stats = statsResponse.data;
+        if (!AppState.dashboardStats) {
+            const statsResponse = await axios.get('/reports/dashboard-stats');
+            AppState.dashboardStats = statsResponse.data;
+        }
+        renderDashboardStats(AppState.dashboardStats);
         
-        const statsContainer = document.getElementById('dashboardStats');
-        statsContainer.innerHTML = `
-            <div class="bg-white overflow-hidden shadow rounded-lg">
-                <div class="p-5">
-                    <div class="flex items-center">
-                        <div class="flex-shrink-0">
-                            <i data-feather="shopping-cart" class="h-6 w-6 text-gray-400"></i>
-                        </div>
-                        <div class="ml-5 w-0 flex-1">
-                            <dl>
-                                <dt class="text-sm font-medium text-gray-500 truncate">Monthly Sales</dt>
-                                <dd class="text-lg font-medium text-gray-900">${stats.monthly_sales}</dd>
-                            </dl>
-                        </div>
+        // Load recent activity
+        await loadRecentActivity();
+        
+        feather.replace();
+    } catch (error) {
+        console.error('Error loading dashboard:', error);
+        showError('Failed to load dashboard data');
+    }
+}
+
+function renderDashboardStats(stats) {
+    const statsContainer = document.getElementById('dashboardStats');
+    statsContainer.innerHTML = `
+        <div class="bg-white overflow-hidden shadow rounded-lg">
+            <div class="p-5">
+                <div class="flex items-center">
+                    <div class="flex-shrink-0">
+                        <i data-feather="shopping-cart" class="h-6 w-6 text-gray-400"></i>
+                    </div>
+                    <div class="ml-5 w-0 flex-1">
+                        <dl>
+                            <dt class="text-sm font-medium text-gray-500 truncate">Monthly Sales</dt>
+                            <dd class="text-lg font-medium text-gray-900">${stats.monthly_sales}</dd>
+                        </dl>
                     </div>
                 </div>
             </div>
-            
-            <div class="bg-white overflow-hidden shadow rounded-lg">
-                <div class="p-5">
-                    <div class="flex items-center">
-                        <div class="flex-shrink-0">
-                            <i data-feather="dollar-sign" class="h-6 w-6 text-gray-400"></i>
-                        </div>
-                        <div class="ml-5 w-0 flex-1">
-                            <dl>
-                                <dt class="text-sm font-medium text-gray-500 truncate">Monthly Revenue</dt>
-                                <dd class="text-lg font-medium text-gray-900">$${stats.monthly_revenue.toFixed(2)}</dd>
-                            </dl>
-                        </div>
+        </div>
+        
+        <div class="bg-white overflow-hidden shadow rounded-lg">
+            <div class="p-5">
+                <div class="flex items-center">
+                    <div class="flex-shrink-0">
+                        <i data-feather="dollar-sign" class="h-6 w-6 text-gray-400"></i>
+                    </div>
+                    <div class="ml-5 w-0 flex-1">
+                        <dl>
+                            <dt class="text-sm font-medium text-gray-500 truncate">Monthly Revenue</dt>
+                            <dd class="text-lg font-medium text-gray-900">$${stats.monthly_revenue.toFixed(2)}</dd>
+                        </dl>
                     </div>
                 </div>
             </div>
-            
-            <div class="bg-white overflow-hidden shadow rounded-lg">
-                <div class="p-5">
-                    <div class="flex items-center">
-                        <div class="flex-shrink-0">
-                            <i data-feather="package" class="h-6 w-6 text-gray-400"></i>
-                        </div>
-                        <div class="ml-5 w-0 flex-1">
-                            <dl>
-                                <dt class="text-sm font-medium text-gray-500 truncate">Inventory Items</dt>
-                                <dd class="text-lg font-medium text-gray-900">${stats.total_inventory_items}</dd>
-                            </dl>
-                        </div>
+        </div>
+        
+        <div class="bg-white overflow-hidden shadow rounded-lg">
+            <div class="p-5">
+                <div class="flex items-center">
+                    <div class="flex-shrink-0">
+                        <i data-feather="package" class="h-6 w-6 text-gray-400"></i>
+                    </div>
+                    <div class="ml-5 w-0 flex-1">
+                        <dl>
+                            <dt class="text-sm font-medium text-gray-500 truncate">Inventory Items</dt>
+                            <dd class="text-lg font-medium text-gray-900">${stats.total_inventory_items}</dd>
+                        </dl>
                     </div>
                 </div>
             </div>
-            
-            <div class="bg-white overflow-hidden shadow rounded-lg">
-                <div class="p-5">
-                    <div class="flex items-center">
-                        <div class="flex-shrink-0">
-                            <i data-feather="trending-up" class="h-6 w-6 text-gray-400"></i>
-                        </div>
-                        <div class="ml-5 w-0 flex-1">
-                            <dl>
-                                <dt class="text-sm font-medium text-gray-500 truncate">Monthly Profit</dt>
-                                <dd class="text-lg font-medium ${stats.monthly_profit >= 0 ? 'text-green-600' : 'text-red-600'}">
-                                    $${stats.monthly_profit.toFixed(2)}
-                                </dd>
-                            </dl>
-                        </div>
+        </div>
+        
+        <div class="bg-white overflow-hidden shadow rounded-lg">
+            <div class="p-5">
+                <div class="flex items-center">
+                    <div class="flex-shrink-0">
+                        <i data-feather="trending-up" class="h-6 w-6 text-gray-400"></i>
+                    </div>
+                    <div class="ml-5 w-0 flex-1">
+                        <dl>
+                            <dt class="text-sm font-medium text-gray-500 truncate">Monthly Profit</dt>
+                            <dd class="text-lg font-medium ${stats.monthly_profit >= 0 ? 'text-green-600' : 'text-red-600'}">
+                                $${stats.monthly_profit.toFixed(2)}
+                            </dd>
+                        </dl>
                     </div>
                 </div>
             </div>
-        `;
-        
-        // Load recent activity
-        await loadRecentActivity();
-        
-        feather.replace();
-    } catch (error) {
-        console.error('Error loading dashboard:', error);
-        showError('Failed to load dashboard data');
-    }
+        </div>
+    `;
 }
 
 async function loadRecentActivity() {
     try {
-        const recentActivityDiv = document.getElementById('recentActivity');
-        
-        // Get recent sales and purchases (simplified for now)
-        const salesResponse = await axios.get('/sales');
-        const purchasesResponse = await axios.get('/purchases');
-        
-        const recentSales = salesResponse.data.slice(-3);
-        const recentPurchases = purchasesResponse.data.slice(-3);
-        
-        let activityHTML = '';
-        
-        if (recentSales.length === 0 && recentPurchases.length === 0) {
-            activityHTML = '<p class="text-gray-500 text-center py-4">No recent activity</p>';
-        } else {
-            recentSales.forEach(sale => {
-                activityHTML += `
-                    <div class="flex items-center justify-between py-2 border-b border-gray-100">
-                        <div class="flex items-center">
-                            <i data-feather="shopping-cart" class="w-4 h-4 text-green-500 mr-3"></i>
-                            <span class="text-sm">Sale to ${sale.customer_name} - $${sale.total_amount.toFixed(2)}</span>
-                        </div>
-                        <span class="text-xs text-gray-500">${new Date(sale.created_at).toLocaleDateString()}</span>
-                    </div>
-                `;
-            });
+        if (!AppState.recentActivity) {
+            // Get recent sales and purchases (simplified for now)
+            const salesResponse = await axios.get('/sales');
+            const purchasesResponse = await axios.get('/purchases');
             
-            recentPurchases.forEach(purchase => {
-                activityHTML += `
-                    <div class="flex items-center justify-between py-2 border-b border-gray-100">
-                        <div class="flex items-center">
-                            <i data-feather="truck" class="w-4 h-4 text-blue-500 mr-3"></i>
-                            <span class="text-sm">Purchase from ${purchase.supplier_name} - $${purchase.total_amount.toFixed(2)}</span>
-                        </div>
-                        <span class="text-xs text-gray-500">${new Date(purchase.created_at).toLocaleDateString()}</span>
-                    </div>
-                `;
-            });
+            AppState.recentActivity = {
+                sales: salesResponse.data.slice(-3),
+                purchases: purchasesResponse.data.slice(-3)
+            };
         }
-        
-        recentActivityDiv.innerHTML = activityHTML;
-        feather.replace();
+        renderRecentActivity(AppState.recentActivity);
     } catch (error) {
         console.error('Error loading recent activity:', error);
     }
 }
 
+function renderRecentActivity({ sales: recentSales, purchases: recentPurchases }) {
+    const recentActivityDiv = document.getElementById('recentActivity');
+    let activityHTML = '';
+    
+    if (recentSales.length === 0 && recentPurchases.length === 0) {
+        activityHTML = '<p class="text-gray-500 text-center py-4">No recent activity</p>';
+    } else {
+        recentSales.forEach(sale => {
+            activityHTML += `
+                <div class="flex items-center justify-between py-2 border-b border-gray-100">
+                    <div class="flex items-center">
+                        <i data-feather="shopping-cart" class="w-4 h-4 text-green-500 mr-3"></i>
+                        <span class="text-sm">Sale to ${sale.customer_name} - $${sale.total_amount.toFixed(2)}</span>
+                    </div>
+                    <span class="text-xs text-gray-500">${new Date(sale.created_at).toLocaleDateString()}</span>
+                </div>
+            `;
+        });
+        
+        recentPurchases.forEach(purchase => {
+            activityHTML += `
+                <div class="flex items-center justify-between py-2 border-b border-gray-100">
+                    <div class="flex items-center">
+                        <i data-feather="truck" class="w-4 h-4 text-blue-500 mr-3"></i>
+                        <span class="text-sm">Purchase from ${purchase.supplier_name} - $${purchase.total_amount.toFixed(2)}</span>
+                    </div>
+                    <span class="text-xs text-gray-500">${new Date(purchase.created_at).toLocaleDateString()}</span>
+                </div>
+            `;
+        });
+    }
+    
+    recentActivityDiv.innerHTML = activityHTML;
+    feather.replace();
+}
+
+// Live dashboard: apply the deltas pushed on the "dashboard" topic
+let dashboardResyncTimer = null;
+
+function applyDashboardEvent(event) {
+    if (event.type === 'snapshot') {
+        AppState.dashboardStats = event.stats;
+        AppState.dashboardMonth = event.month;
+    } else if (event.type === 'resync') {
+        scheduleDashboardResync();
+        return;
+    } else if (AppState.dashboardStats) {
+        const stats = AppState.dashboardStats;
+        event.deltas.forEach(delta => {
+            // Monthly figures only move for the month on display
+            if (delta.month && delta.month !== AppState.dashboardMonth) {
+                if (delta.month > AppState.dashboardMonth) {
+                    AppState.dashboardMonth = delta.month;
+                    scheduleDashboardResync();
+                }
+                return;
+            }
+            Object.entries(delta).forEach(([field, value]) => {
+                if (field !== 'month') {
+                    stats[field] += value;
+                }
+            });
+        });
+        Object.assign(stats, event.totals || {});
+        updateRecentActivity(event);
+    }
+    
+    if (AppState.currentTab === 'dashboard' && AppState.dashboardStats) {
+        renderDashboardStats(AppState.dashboardStats);
+        feather.replace();
+    }
+}
+
+function updateRecentActivity(event) {
+    const activity = AppState.recentActivity;
+    if (!activity || !event.record) {
+        return;
+    }
+    
+    const list = event.type.startsWith('sale') ? 'sales' : 'purchases';
+    if (event.type.endsWith('_added')) {
+        activity[list] = activity[list].concat([event.record]).slice(-3);
+    } else {
+        activity[list] = activity[list].filter(record => record.id !== event.record.id);
+    }
+    if (AppState.currentTab === 'dashboard') {
+        renderRecentActivity(activity);
+    }
+}
+
+function scheduleDashboardResync() {
+    // Another server process changed data; refetch once even if many changes arrive together
+    if (dashboardResyncTimer) {
+        return;
+    }
+    dashboardResyncTimer = setTimeout(() => {
+        dashboardResyncTimer = null;
+        AppState.dashboardStats = null;
+        AppState.recentActivity = null;
+        if (AppState.currentTab === 'dashboard') {
+            loadDashboard();
+        }
+    }, 1000);
+}
+
 // Utility functions
 function showError(message) {
     // Simple error display - could be enhanced with a proper notification system
@@ -0,0 +1,98 @@
+// Live updates from /api/events (server-sent events).
+// EventSource cannot send the Authorization header, so the stream is read with fetch.
+window.LiveFeed = {
+    controller: null,
+    handlers: {},
+    retryDelay: 1000,
+
+    on(topic, handler) {
+        (this.handlers[topic] = this.handlers[topic] || []).push(handler);
+    },
+
+    start(topics) {
+        this.stop();
+        this.topics = topics;
+        this.retryDelay = 1000;
+        this.controller = new AbortController();
+        this.connect(this.controller);
+    },
+
+    stop() {
+        if (this.controller) {
+            this.controller.abort();
+            this.controller = null;
+        }
+    },
+
+    async connect(controller) {
+        try {
+            const response = await fetch(`/api/events/?topics=${this.topics.join(',')}`, {
+                headers: { 'Authorization': `Bearer ${AppState.token}` },
+                signal: controller.signal
+            });
+            if (response.status === 401) {
+                window.AuthUtils.logout();
+                return;
+            }
+            if (!response.ok) {
+                throw new Error(`Event stream failed with status ${response.status}`);
+            }
+            this.retryDelay = 1000;
+
+            const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+            let buffer = '';
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) {
+                    break;
+                }
+                buffer += value;
+                let boundary;
+                while ((boundary = buffer.indexOf('\n\n')) >= 0) {
+                    this.dispatch(buffer.slice(0, boundary));
+                    buffer = buffer.slice(boundary + 2);
+                }
+            }
+        } catch (error) {
+            if (controller.signal.aborted) {
+                return;
+            }
+            console.error('Event stream error:', error);
+        }
+
+        // The server ended the stream (restart, or this client fell behind): reconnect and resync
+        if (!controller.signal.aborted) {
+            setTimeout(() => {
+                if (this.controller === controller) {
+                    this.connect(controller);
+                }
+            }, this.retryDelay);
+            this.retryDelay = Math.min(this.retryDelay * 2, 30000);
+        }
+    },
+
+    dispatch(block) {
+        let topic = 'message';
+        const data = [];
+        block.split('\n').forEach(line => {
+            if (line.startsWith('event: ')) {
+                topic = line.slice(7);
+            } else if (line.startsWith('data: ')) {
+                data.push(line.slice(6));
+            }
+        });
+        // Comments (heartbeats) and retry hints carry no data
+        if (data.length === 0) {
+            return;
+        }
+
+        const payload = JSON.parse(data.join('\n'));
+        (this.handlers[topic] || []).forEach(handler => {
+            try {
+                handler(payload);
+            } catch (error) {
+                console.error(`Error handling ${topic} event:`, error);
+            }
+        });
+    }
+};
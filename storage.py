@@ -0,0 +1,306 @@
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import ContextManager, Dict, Iterable, Iterator, List, Optional, Tuple
+from models import User, InventoryItem, Sale, Purchase, PayrollEntry
+from listeners import DatabaseListener
+from rollups import BucketTotals, build_timeseries
+
+# Fields list endpoints may filter on, per table
+FILTERABLE_FIELDS = {
+    "users": {"role"},
+    "inventory": {"category"},
+    "sales": {"customer_name"},
+    "purchases": {"supplier_name"},
+    "payroll": {"employee_id"}
+}
+
+# Ledger export columns: one row per line item, repeating its transaction's fields
+LEDGER_COLUMNS = {
+    "sales": ("sale_id", "created_at", "customer_name", "customer_email", "created_by", "notes", "total_amount",
+              "line_id", "inventory_item_id", "inventory_item_name", "quantity", "unit_price"),
+    "purchases": ("purchase_id", "created_at", "supplier_name", "supplier_email", "created_by", "notes", "total_amount",
+                  "line_id", "inventory_item_id", "inventory_item_name", "quantity", "unit_cost")
+}
+
+class StockError(Exception):
+    """A stock change was refused; none of its lines were applied"""
+
+class InventoryItemNotFoundError(StockError):
+    def __init__(self, item_id: int):
+        super().__init__(f"Inventory item with ID {item_id} not found")
+        self.item_id = item_id
+
+class InsufficientStockError(StockError):
+    def __init__(self, item: InventoryItem, requested: int):
+        super().__init__(f"Insufficient stock for {item.name}. Available: {item.quantity_in_stock}")
+        self.item = item
+        self.requested = requested
+
+class StorageBackend(ABC):
+    """Access surface shared by every storage engine.
+    
+    Routers read through the ``users``, ``inventory``, ``sales``, ``purchases``
+    and ``payroll`` mappings (``get``, ``values``, ``in``, ``len``) and write
+    only through the methods below, so that indexes, aggregates and listeners
+    stay consistent whichever engine is configured. Engines must implement
+    every abstract method; an incomplete one fails when it is constructed.
+    """
+    
+    users: Dict[int, User]
+    inventory: Dict[int, InventoryItem]
+    sales: Dict[int, Sale]
+    purchases: Dict[int, Purchase]
+    payroll: Dict[int, PayrollEntry]
+    
+    def __init__(self):
+        self.listeners: List[DatabaseListener] = []
+        # Writers may run on several threads; listeners see one event at a time
+        self._notify_lock = threading.RLock()
+    
+    def add_listener(self, listener: DatabaseListener):
+        self.listeners.append(listener)
+    
+    def _notify(self, event: str, *args):
+        with self._notify_lock:
+            for listener in self.listeners:
+                getattr(listener, event)(*args)
+    
+    @abstractmethod
+    def transaction(self) -> ContextManager:
+        """Group several writes so that other threads and processes see all or none.
+        
+        Listeners are still notified as each write completes; if the group
+        rolls back, shared engines report its tables through ``table_changed``
+        at the next ``sync``.
+        """
+        raise NotImplementedError
+    
+    def sync(self):
+        """Catch up with writes made by other processes sharing the store.
+        
+        Called at the start of every request. Engines private to one process
+        have nothing to do; shared ones call ``table_changed`` on listeners.
+        """
+    
+    # ID allocation
+    
+    @abstractmethod
+    def allocate_ids(self, table: str, count: int) -> range:
+        """Reserve ``count`` consecutive ids for a bulk insert"""
+        raise NotImplementedError
+    
+    @abstractmethod
+    def get_next_user_id(self) -> int:
+        raise NotImplementedError
+    
+    @abstractmethod
+    def get_next_inventory_id(self) -> int:
+        raise NotImplementedError
+    
+    @abstractmethod
+    def get_next_sale_id(self) -> int:
+        raise NotImplementedError
+    
+    @abstractmethod
+    def get_next_purchase_id(self) -> int:
+        raise NotImplementedError
+    
+    @abstractmethod
+    def get_next_payroll_id(self) -> int:
+        raise NotImplementedError
+    
+    # Users
+    
+    @abstractmethod
+    def add_user(self, user: User) -> User:
+        raise NotImplementedError
+    
+    @abstractmethod
+    def set_user_active(self, user_id: int, is_active: bool) -> Optional[User]:
+        raise NotImplementedError
+    
+    @abstractmethod
+    def find_user_by_username(self, username: str) -> Optional[User]:
+        raise NotImplementedError
+    
+    @abstractmethod
+    def get_user_password(self, username: str) -> Optional[str]:
+        raise NotImplementedError
+    
+    @abstractmethod
+    def set_user_password(self, username: str, hashed_password: str):
+        raise NotImplementedError
+    
+    # Inventory
+    
+    @abstractmethod
+    def save_inventory_item(self, item: InventoryItem) -> InventoryItem:
+        raise NotImplementedError
+    
+    @abstractmethod
+    def save_inventory_items(self, items: List[InventoryItem]) -> List[InventoryItem]:
+        """Insert or update many items in one pass, notifying listeners of each.
+        
+        Items are matched on SKU: one whose SKU is already stored updates that
+        row, keeping its id and created_at. Returns the items as saved.
+        """
+        raise NotImplementedError
+    
+    @abstractmethod
+    def change_stock(self, deltas: Dict[int, int], skip_missing: bool = False) -> List[InventoryItem]:
+        """Apply stock deltas to several items atomically.
+        
+        Either every delta is applied or none is. Raises InsufficientStockError
+        if a negative delta would take an item below zero, and
+        InventoryItemNotFoundError for unknown ids unless ``skip_missing``.
+        Safe against concurrent callers on other threads.
+        """
+        raise NotImplementedError
+    
+    @abstractmethod
+    def delete_inventory_item(self, item_id: int) -> Optional[InventoryItem]:
+        raise NotImplementedError
+    
+    @abstractmethod
+    def find_inventory_item_by_sku(self, sku: str) -> Optional[InventoryItem]:
+        raise NotImplementedError
+    
+    @abstractmethod
+    def find_inventory_items_by_sku(self, skus: Iterable[str]) -> Dict[str, InventoryItem]:
+        """Existing items among ``skus``, keyed by SKU"""
+        raise NotImplementedError
+    
+    # Transactions
+    
+    @abstractmethod
+    def add_sale(self, sale: Sale) -> Sale:
+        raise NotImplementedError
+    
+    @abstractmethod
+    def add_sales(self, sales: List[Sale]) -> List[Sale]:
+        raise NotImplementedError
+    
+    @abstractmethod
+    def delete_sale(self, sale_id: int) -> Optional[Sale]:
+        raise NotImplementedError
+    
+    @abstractmethod
+    def add_purchase(self, purchase: Purchase) -> Purchase:
+        raise NotImplementedError
+    
+    @abstractmethod
+    def add_purchases(self, purchases: List[Purchase]) -> List[Purchase]:
+        raise NotImplementedError
+    
+    @abstractmethod
+    def delete_purchase(self, purchase_id: int) -> Optional[Purchase]:
+        raise NotImplementedError
+    
+    @abstractmethod
+    def save_payroll_entry(self, entry: PayrollEntry) -> PayrollEntry:
+        raise NotImplementedError
+    
+    @abstractmethod
+    def delete_payroll_entry(self, payroll_id: int) -> Optional[PayrollEntry]:
+        raise NotImplementedError
+    
+    @abstractmethod
+    def sales_between(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> Iterable[Sale]:
+        raise NotImplementedError
+    
+    @abstractmethod
+    def purchases_between(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> Iterable[Purchase]:
+        raise NotImplementedError
+    
+    @abstractmethod
+    def payroll_between(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> Iterable[PayrollEntry]:
+        raise NotImplementedError
+    
+    @abstractmethod
+    def iter_records(self, table: str, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                     after: Optional[Tuple[datetime, int]] = None, filters: Optional[Dict[str, str]] = None) -> Iterator:
+        """Stream a table in (created_at, id) order.
+        
+        ``after`` is an exclusive keyset cursor, ``start``/``end`` bound
+        created_at inclusively and ``filters`` maps FILTERABLE_FIELDS to
+        case-insensitive exact values. Memory use is independent of table size.
+        """
+        raise NotImplementedError
+    
+    @abstractmethod
+    def iter_record_ids(self, table: str, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                        after: Optional[Tuple[datetime, int]] = None) -> Iterator[int]:
+        """Ids that ``iter_records`` would yield without filters, without loading the records"""
+        raise NotImplementedError
+    
+    def iter_records_after_id(self, table: str, after_id: int) -> Iterator:
+        """Records of ``table`` with an id above ``after_id``, in id order.
+        
+        Ids are allocated in the transaction that stores the record, so this
+        is how a listener picks up rows another worker added since it last
+        looked. Shared engines override it to seek on the primary key.
+        """
+        records = getattr(self, table)
+        return (records[record_id] for record_id in sorted(record_id for record_id in records if record_id > after_id))
+    
+    def iter_ledger_lines(self, table: str, start: Optional[datetime] = None,
+                          end: Optional[datetime] = None) -> Iterator[tuple]:
+        """Line items of sales or purchases created within [start, end] as LEDGER_COLUMNS tuples.
+        
+        Ordered like ``iter_records``, and just as independent of table size.
+        Engines override this to skip building the models.
+        """
+        party, price = ("customer", "unit_price") if table == "sales" else ("supplier", "unit_cost")
+        for record in self.iter_records(table, start, end):
+            header = (record.id, record.created_at, getattr(record, f"{party}_name"), getattr(record, f"{party}_email"),
+                      record.created_by, record.notes, record.total_amount)
+            for item in record.items:
+                yield header + (item.id, item.inventory_item_id, item.inventory_item_name, item.quantity,
+                                getattr(item, price))
+    
+    # Report queries
+    
+    @abstractmethod
+    def financial_totals(self, start: datetime, end: datetime) -> Tuple[float, float]:
+        """(revenue, expenses) for records created within [start, end]"""
+        raise NotImplementedError
+    
+    @abstractmethod
+    def sales_totals(self, start: datetime, end: datetime) -> Tuple[int, float]:
+        """(number of sales, revenue) within [start, end]"""
+        raise NotImplementedError
+    
+    @abstractmethod
+    def top_selling_items(self, start: datetime, end: datetime, limit: int) -> List[Tuple[int, str, int]]:
+        """(item id, current item name, quantity sold) within [start, end], best sellers first"""
+        raise NotImplementedError
+    
+    @abstractmethod
+    def low_stock_items(self) -> List[InventoryItem]:
+        """Items at or below their reorder level, by id"""
+        raise NotImplementedError
+    
+    @abstractmethod
+    def table_sizes(self) -> Dict[str, int]:
+        """Row count of each table (users, inventory, sales, purchases, payroll)"""
+        raise NotImplementedError
+    
+    @abstractmethod
+    def inventory_summary(self) -> Tuple[int, float, List[InventoryItem]]:
+        """(item count, stock value at unit price, low-stock items)"""
+        raise NotImplementedError
+    
+    @abstractmethod
+    def dashboard_stats(self, now: datetime) -> dict:
+        """Dashboard payload for the calendar month containing ``now``"""
+        raise NotImplementedError
+    
+    @abstractmethod
+    def rollup_buckets(self, level: str, first_key: str, last_key: str) -> Dict[str, BucketTotals]:
+        """Non-empty rollup buckets of a level (see rollups.LEVELS) with keys in [first_key, last_key]"""
+        raise NotImplementedError
+    
+    def timeseries(self, granularity: str, start: datetime, end: datetime) -> List[dict]:
+        """Revenue, expense and profit per hour/day/week/month bucket overlapping [start, end]"""
+        return build_timeseries(self.rollup_buckets, granularity, start, end)